@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Cubo de Agregados de Clasificación
+Conteos materializados por día × clasificación × carpeta × código de agente ×
+estado del SLIP (con la suma de confianza para promedios). Se construye al
+clasificar, se actualiza de forma incremental al reclasificar o reprocesar y
+responde agregaciones arbitrarias (por semana y carpeta, por agente, ...) sobre
+las celdas del cubo, cuyo número no depende del tamaño del corpus sino de las
+combinaciones distintas
+Uso: python aggregate_cube.py output --group-by week,folder --classification renovacion
+"""
+
+import argparse
+import json
+import os
+import re
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from dashboard_snapshot import build_dashboard_rows
+
+# Archivo del cubo dentro de output/classification
+CUBE_FILENAME = "aggregate_cube.npz"
+
+# Versión del formato del cubo
+CUBE_FORMAT_VERSION = 1
+
+# Dimensiones almacenadas (orden de las coordenadas de cada celda)
+CUBE_DIMENSIONS = ('day', 'classification', 'folder', 'agent', 'slip_status')
+
+# Granularidades de tiempo derivadas del día
+TIME_DIMENSIONS = ('day', 'week', 'month', 'year')
+
+# Dimensiones disponibles para agrupar y filtrar
+GROUP_DIMENSIONS = TIME_DIMENSIONS + CUBE_DIMENSIONS[1:]
+
+# Etiqueta de los emails sin fecha de entrega válida
+NO_DATE = ''
+
+ISO_DAY = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def slip_status(has_slip, slip_complete):
+    """Estado del SLIP: sin_slip, incompleto o completo"""
+    if not has_slip:
+        return 'sin_slip'
+    return 'completo' if slip_complete else 'incompleto'
+
+
+def cell_key(row):
+    """Coordenadas de una fila del dashboard en el cubo"""
+    delivery_time = row.get('delivery_time') or ''
+    day = delivery_time[:10] if ISO_DAY.match(delivery_time) else NO_DATE
+    return (
+        day,
+        row.get('classification_type') or 'sin_clasificar',
+        row.get('folder') or '',
+        row.get('agente_code') or '',
+        slip_status(row.get('has_slip'), row.get('slip_complete'))
+    )
+
+
+def time_bucket(day, granularity):
+    """Etiqueta de un día en la granularidad pedida (AAAA-MM-DD, AAAA-Www, AAAA-MM, AAAA)"""
+    if day == NO_DATE or granularity == 'day':
+        return day
+    if granularity == 'month':
+        return day[:7]
+    if granularity == 'year':
+        return day[:4]
+    iso_year, iso_week, _ = date.fromisoformat(day).isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+class AggregateCube:
+    """Celdas {(día, clasificación, carpeta, agente, SLIP): [emails, suma de confianza]}"""
+
+    def __init__(self, cells=None):
+        self.cells = cells if cells is not None else {}
+        self._arrays = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        cube = cls()
+        for row in rows:
+            cube.add_row(row)
+        return cube
+
+    @classmethod
+    def from_results(cls, emails):
+        """Cubo completo a partir de resultados de classify_email"""
+        return cls.from_rows(build_dashboard_rows({'emails': emails}))
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Cubo a partir de las columnas del dashboard (snapshot o DataFrame)"""
+        cube = cls()
+        count = len(columns['email_id'])
+        if count == 0:
+            return cube
+        values = {name: columns[name] for name in (
+            'delivery_time', 'classification_type', 'folder', 'agente_code', 'has_slip', 'slip_complete', 'confidence'
+        )}
+        for position in range(count):
+            cube.add_row({name: column[position] for name, column in values.items()})
+        return cube
+
+    def add_row(self, row, sign=1):
+        key = cell_key(row)
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = [0, 0]
+        cell[0] += sign
+        cell[1] += sign * int(row.get('confidence') or 0)
+        if cell[0] <= 0:
+            del self.cells[key]
+        self._arrays = None
+
+    def update(self, old_emails, new_emails):
+        """Aplicar un cambio incremental: restar las filas anteriores y sumar las nuevas
+
+        Devuelve el número de emails que cambiaron de celda o de confianza.
+        """
+        old_rows = {row['email_id']: row for row in build_dashboard_rows({'emails': old_emails})}
+        changed = 0
+        for row in build_dashboard_rows({'emails': new_emails}):
+            old_row = old_rows.pop(row['email_id'], None)
+            if old_row is not None:
+                if cell_key(old_row) == cell_key(row) and old_row['confidence'] == row['confidence']:
+                    continue
+                self.add_row(old_row, -1)
+            self.add_row(row)
+            changed += 1
+
+        # Emails anteriores sin versión nueva: eliminados
+        for old_row in old_rows.values():
+            self.add_row(old_row, -1)
+            changed += 1
+        return changed
+
+    @property
+    def total(self):
+        return sum(cell[0] for cell in self.cells.values())
+
+    def to_arrays(self):
+        """Etiquetas por dimensión, coordenadas enteras por celda, conteos y sumas de confianza"""
+        if self._arrays is None:
+            keys = sorted(self.cells)
+            labels = {}
+            coordinates = np.zeros((len(keys), len(CUBE_DIMENSIONS)), dtype=np.int32)
+            for axis, dimension in enumerate(CUBE_DIMENSIONS):
+                values = sorted({key[axis] for key in keys})
+                codes = {value: code for code, value in enumerate(values)}
+                labels[dimension] = values
+                coordinates[:, axis] = [codes[key[axis]] for key in keys]
+            counts = np.array([self.cells[key][0] for key in keys], dtype=np.int64)
+            confidence = np.array([self.cells[key][1] for key in keys], dtype=np.int64)
+            self._arrays = (labels, coordinates, counts, confidence)
+        return self._arrays
+
+    def save(self, classification_dir):
+        """Escribir aggregate_cube.npz (reemplazo atómico)"""
+        labels, coordinates, counts, confidence = self.to_arrays()
+        cube_file = Path(classification_dir) / CUBE_FILENAME
+        tmp_file = cube_file.with_name(cube_file.stem + '.tmp.npz')
+        np.savez(
+            tmp_file,
+            format_version=np.array(CUBE_FORMAT_VERSION),
+            coordinates=coordinates,
+            counts=counts,
+            confidence=confidence,
+            **{f"labels_{dimension}": np.array(labels[dimension], dtype=str) for dimension in CUBE_DIMENSIONS}
+        )
+        os.replace(tmp_file, cube_file)
+        return cube_file
+
+    @classmethod
+    def load(cls, classification_dir):
+        """Cubo guardado, o None si no existe o es de otro formato"""
+        cube_file = Path(classification_dir) / CUBE_FILENAME
+        if not cube_file.exists():
+            return None
+        with np.load(cube_file) as data:
+            if int(data['format_version']) != CUBE_FORMAT_VERSION:
+                return None
+            labels = {dimension: [str(value) for value in data[f"labels_{dimension}"]] for dimension in CUBE_DIMENSIONS}
+            coordinates = data['coordinates']
+            counts = data['counts']
+            confidence = data['confidence']
+
+        cells = {}
+        for row, coordinate in enumerate(coordinates):
+            key = tuple(labels[dimension][code] for dimension, code in zip(CUBE_DIMENSIONS, coordinate))
+            cells[key] = [int(counts[row]), int(confidence[row])]
+
+        cube = cls(cells)
+        cube._arrays = (labels, coordinates, counts, confidence)
+        return cube
+
+    def dimension_codes(self, dimension):
+        """(código por celda, etiquetas) de una dimensión de agrupación"""
+        labels, coordinates, _, _ = self.to_arrays()
+        if dimension in TIME_DIMENSIONS:
+            buckets = [time_bucket(day, dimension) for day in labels['day']]
+            bucket_labels = sorted(set(buckets))
+            bucket_codes = {bucket: code for code, bucket in enumerate(bucket_labels)}
+            day_to_bucket = np.array([bucket_codes[bucket] for bucket in buckets], dtype=np.int64)
+            return day_to_bucket[coordinates[:, 0]], bucket_labels
+        axis = CUBE_DIMENSIONS.index(dimension)
+        return coordinates[:, axis].astype(np.int64), labels[dimension]
+
+    def query(self, group_by=(), filters=None, since=None, until=None, order='key', limit=None):
+        """Agregar las celdas que cumplen los filtros por las dimensiones de group_by
+
+        filters: {dimensión: [valores]} sobre classification, folder, agent y
+        slip_status; since/until: días ISO inclusivos (excluyen los emails sin fecha).
+        Devuelve filas {dimensión: etiqueta, ..., 'emails', 'avg_confidence'}.
+        """
+        for dimension in group_by:
+            if dimension not in GROUP_DIMENSIONS:
+                raise ValueError(f"Dimensión desconocida: {dimension}")
+
+        labels, coordinates, counts, confidence = self.to_arrays()
+        mask = np.ones(len(counts), dtype=bool)
+
+        for dimension, values in (filters or {}).items():
+            if dimension not in CUBE_DIMENSIONS[1:]:
+                raise ValueError(f"Filtro desconocido: {dimension}")
+            allowed = [code for code, label in enumerate(labels[dimension]) if label in set(values)]
+            mask &= np.isin(coordinates[:, CUBE_DIMENSIONS.index(dimension)], allowed)
+
+        if since or until:
+            day_ok = np.array([
+                day != NO_DATE and (not since or day >= since) and (not until or day <= until)
+                for day in labels['day']
+            ], dtype=bool)
+            if len(day_ok):
+                mask &= day_ok[coordinates[:, 0]]
+
+        if not group_by:
+            total = int(counts[mask].sum())
+            return [{
+                'emails': total,
+                'avg_confidence': round(float(confidence[mask].sum()) / total, 2) if total else None
+            }]
+
+        # Clave combinada de las dimensiones agrupadas (índice mixto) y una sola pasada de bincount
+        group_codes = [self.dimension_codes(dimension) for dimension in group_by]
+        shape = tuple(max(len(group_labels), 1) for _, group_labels in group_codes)
+        flat = np.ravel_multi_index([codes[mask] for codes, _ in group_codes], shape)
+        keys, inverse = np.unique(flat, return_inverse=True)
+        group_counts = np.bincount(inverse, weights=counts[mask], minlength=len(keys))
+        group_confidence = np.bincount(inverse, weights=confidence[mask], minlength=len(keys))
+
+        columns = [
+            [group_labels[code] for code in codes.tolist()]
+            for codes, (_, group_labels) in zip(np.unravel_index(keys, shape), group_codes)
+        ]
+        rows = []
+        for position, (emails, confidence_sum) in enumerate(zip(group_counts.tolist(), group_confidence.tolist())):
+            row = {dimension: column[position] for dimension, column in zip(group_by, columns)}
+            row['emails'] = int(emails)
+            row['avg_confidence'] = round(confidence_sum / emails, 2) if emails else None
+            rows.append(row)
+
+        if order == 'emails':
+            rows.sort(key=lambda row: row['emails'], reverse=True)
+        if limit:
+            rows = rows[:limit]
+        return rows
+
+
+def save_cube_for_results(classification_dir, emails):
+    """Construir y guardar el cubo completo de una ejecución de clasificación"""
+    return AggregateCube.from_results(emails).save(classification_dir)
+
+
+def update_cube(classification_dir, old_emails, new_emails, all_emails=None):
+    """Actualizar el cubo guardado con los emails que cambiaron
+
+    Si todavía no hay cubo se construye completo a partir de all_emails
+    (o de new_emails). Devuelve el número de emails aplicados.
+    """
+    cube = AggregateCube.load(classification_dir)
+    if cube is None:
+        emails = all_emails if all_emails is not None else new_emails
+        AggregateCube.from_results(emails).save(classification_dir)
+        return len(emails)
+
+    changed = cube.update(old_emails, new_emails)
+    if changed:
+        cube.save(classification_dir)
+    return changed
+
+
+def parse_group_by(value):
+    """'week,folder' → ['week', 'folder']"""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultar el cubo de agregados de clasificación")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--group-by', default='classification',
+                        help=f"Dimensiones separadas por comas: {', '.join(GROUP_DIMENSIONS)}")
+    parser.add_argument('--classification', action='append', help="Repetible para varios valores")
+    parser.add_argument('--folder', action='append')
+    parser.add_argument('--agent', action='append')
+    parser.add_argument('--slip-status', action='append')
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    parser.add_argument('--order', choices=['key', 'emails'], default='key')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--rebuild', action='store_true', help="Reconstruir desde classification_results.json")
+    args = parser.parse_args()
+
+    classification_dir = Path(args.output_dir) / "classification"
+    cube = None if args.rebuild else AggregateCube.load(classification_dir)
+    if cube is None:
+        results_file = classification_dir / "classification_results.json"
+        if not results_file.exists():
+            print(f"❌ No existe {results_file}")
+            return
+        with open(results_file, 'r', encoding='utf-8') as f:
+            cube = AggregateCube.from_results(json.load(f).get('emails', []))
+        cube.save(classification_dir)
+        print(f"🧊 Cubo reconstruido: {len(cube.cells)} celdas, {cube.total} emails")
+
+    filters = {
+        dimension: values for dimension, values in (
+            ('classification', args.classification),
+            ('folder', args.folder),
+            ('agent', args.agent),
+            ('slip_status', args.slip_status)
+        ) if values
+    }
+    group_by = parse_group_by(args.group_by)
+    rows = cube.query(group_by, filters, args.since, args.until, args.order, args.limit)
+
+    for row in rows:
+        labels = '  '.join(f"{row[dimension] or '(vacío)':<22}" for dimension in group_by)
+        print(f"  {labels}{row['emails']:>8}  {row['avg_confidence'] if row['avg_confidence'] is not None else '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
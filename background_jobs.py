@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""
+Trabajos en Segundo Plano del Dashboard
+Re-clasificación, reportes y exportaciones masivas lanzados desde el dashboard.
+Cada trabajo es una fila de output/classification/jobs.sqlite (estado, progreso,
+resultado) y se ejecuta en su propio proceso (python background_jobs.py --job, que
+no importa el dashboard): los workers web solo insertan la fila y leen el
+progreso, nunca esperan al trabajo. La cancelación es cooperativa
+(el trabajo la revisa cada vez que reporta progreso) y los trabajos que quedaron
+a medias por un reinicio se vuelven a encolar al arrancar.
+
+Uso:
+    python background_jobs.py output                   # listar los últimos trabajos
+    python background_jobs.py output --run reclassify  # ejecutar un trabajo en primer plano
+    python background_jobs.py output --cancel <job_id> # solicitar la cancelación de un trabajo
+    python background_jobs.py output --job <job_id>    # ejecutar un trabajo encolado (lo usa el dashboard)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+JOBS_FILENAME = "jobs.sqlite"
+JOB_LOGS_DIRNAME = "jobs"
+JOB_SCHEMA_VERSION = 1
+
+# Trabajos simultáneos, cada uno en su proceso (la re-clasificación ocupa un núcleo completo)
+JOB_WORKERS = int(os.environ.get('DASHBOARD_JOB_WORKERS', '2'))
+
+# Tipos de trabajo; los que reescriben classification_results.json no corren en paralelo
+JOB_KINDS = ('reclassify', 'report', 'export')
+EXCLUSIVE_KINDS = ('reclassify', 'report')
+
+ACTIVE_STATUSES = ('pending', 'running')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Progreso: como máximo una escritura (y una revisión de cancelación) cada PROGRESS_INTERVAL
+PROGRESS_INTERVAL = 0.5
+
+# Latido del proceso que ejecuta el trabajo; sin latido por STALE_AFTER el proceso murió
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 30.0
+
+# Intentos antes de dar por fallido un trabajo que se interrumpe una y otra vez
+MAX_ATTEMPTS = 3
+
+# Formatos ya comprimidos: se almacenan sin recomprimir dentro del ZIP
+STORED_EXTENSIONS = {
+    '.pdf', '.xlsx', '.xlsm', '.docx', '.pptx', '.zip', '.rar', '.7z', '.gz',
+    '.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mp3'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    payload TEXT,
+    total INTEGER,
+    processed INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    heartbeat REAL,
+    created TEXT NOT NULL,
+    started TEXT,
+    finished TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created);
+"""
+
+# Columnas visibles de un trabajo (payload puede pesar varios MB)
+JOB_COLUMNS = ('job_id', 'kind', 'status', 'params', 'total', 'processed', 'message', 'result', 'error',
+               'attempts', 'cancel_requested', 'created', 'started', 'finished')
+
+
+class JobCancelled(Exception):
+    """El usuario canceló el trabajo mientras se ejecutaba"""
+
+
+class JobConflict(Exception):
+    """Ya hay un trabajo activo que reescribe los resultados"""
+
+    def __init__(self, job):
+        super().__init__(f"Ya hay un trabajo en curso: {job['kind']} {job['job_id']}")
+        self.job = job
+
+
+def zip_compress_type(file_path):
+    """Elegir compresión: los formatos ya comprimidos se almacenan tal cual"""
+    if Path(file_path).suffix.lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def jobs_path(output_dir="output"):
+    """Ruta de la tabla de trabajos de un directorio de salida"""
+    return Path(output_dir) / "classification" / JOBS_FILENAME
+
+
+def now_iso():
+    return datetime.now().isoformat()
+
+
+class JobStore:
+    """Tabla persistente de trabajos (SQLite en WAL, una conexión por hilo)"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {JOB_SCHEMA_VERSION}")
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.row_factory = sqlite3.Row
+            self.local.connection = connection
+        return connection
+
+    @staticmethod
+    def to_job(row):
+        """Fila de la tabla como diccionario (params y result decodificados)"""
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or '{}')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        total = job['total']
+        if job['status'] == 'completed':
+            job['progress'] = 100.0
+        else:
+            job['progress'] = round(min(job['processed'] / total, 1.0) * 100, 1) if total else 0.0
+        return job
+
+    def create(self, kind, params, payload=None, total=None, exclusive=False):
+        """Insertar un trabajo pendiente; con exclusive falla si ya hay otro de EXCLUSIVE_KINDS activo"""
+        job_id = uuid.uuid4().hex
+        connection = self.connection
+        # BEGIN IMMEDIATE: la revisión y la inserción son atómicas entre procesos web
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if exclusive:
+                active = self.active_job(EXCLUSIVE_KINDS)
+                if active is not None:
+                    raise JobConflict(active)
+            connection.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, payload, total, created) "
+                "VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), payload, total, now_iso())
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self.connection.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self.to_job(row)
+
+    def list(self, kind=None, limit=50):
+        """Trabajos más recientes primero"""
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        args = []
+        if kind:
+            query += " WHERE kind = ?"
+            args.append(kind)
+        query += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+        return [self.to_job(row) for row in self.connection.execute(query, args)]
+
+    def active_job(self, kinds):
+        placeholders = ', '.join('?' * len(kinds))
+        row = self.connection.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE kind IN ({placeholders}) "
+            "AND status IN ('pending', 'running') ORDER BY created LIMIT 1", tuple(kinds)
+        ).fetchone()
+        return self.to_job(row)
+
+    def payload(self, job_id):
+        row = self.connection.execute("SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row['payload'] if row else None
+
+    def pending_ids(self):
+        return [row['job_id'] for row in self.connection.execute(
+            "SELECT job_id FROM jobs WHERE status = 'pending' ORDER BY created"
+        )]
+
+    def claim(self, job_id, pid):
+        """Tomar un trabajo pendiente; solo un proceso lo consigue aunque se haya encolado dos veces"""
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = 'running', worker_pid = ?, heartbeat = ?, started = ?, "
+            "attempts = attempts + 1, error = NULL WHERE job_id = ? AND status = 'pending'",
+            (pid, time.time(), now_iso(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    def update_progress(self, job_id, processed, total=None, message=None):
+        """Guardar el progreso y devolver si se solicitó la cancelación"""
+        self.connection.execute(
+            "UPDATE jobs SET processed = ?, total = COALESCE(?, total), message = COALESCE(?, message), "
+            "heartbeat = ? WHERE job_id = ?",
+            (processed, total, message, time.time(), job_id)
+        )
+        row = self.connection.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def beat(self, job_id):
+        self.connection.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ? AND status = 'running'",
+                                (time.time(), job_id))
+
+    def finish(self, job_id, status, result=None, error=None, message=None):
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, message = COALESCE(?, message), "
+            "finished = ?, worker_pid = NULL WHERE job_id = ?",
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, message, now_iso(), job_id)
+        )
+
+    def request_cancel(self, job_id):
+        """Cancelar: los pendientes terminan de inmediato, los que corren al siguiente reporte de progreso"""
+        connection = self.connection
+        connection.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished = ?, "
+            "message = 'Cancelado antes de iniciar' WHERE job_id = ? AND status = 'pending'",
+            (now_iso(), job_id)
+        )
+        connection.execute(
+            "UPDATE jobs SET cancel_requested = 1, message = 'Cancelando...' "
+            "WHERE job_id = ? AND status = 'running'", (job_id,)
+        )
+        return self.get(job_id)
+
+    def recover_stale(self, stale_after=STALE_AFTER):
+        """Trabajos 'running' cuyo proceso murió (p. ej. reinicio del servidor): volver a encolarlos
+
+        Los que ya agotaron MAX_ATTEMPTS o cuya cancelación estaba pedida se cierran.
+        Devuelve los ids de los trabajos que volvieron a 'pending'.
+        """
+        connection = self.connection
+        limit = time.time() - stale_after
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            stale = [dict(row) for row in connection.execute(
+                "SELECT job_id, attempts, cancel_requested FROM jobs "
+                "WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)", (limit,)
+            )]
+            for job in stale:
+                if job['cancel_requested']:
+                    status, message = 'cancelled', 'Cancelado (el proceso se interrumpió)'
+                elif job['attempts'] >= MAX_ATTEMPTS:
+                    status, message = 'failed', f"Interrumpido {job['attempts']} veces"
+                else:
+                    status, message = 'pending', 'Reencolado tras una interrupción'
+                connection.execute(
+                    "UPDATE jobs SET status = ?, message = ?, worker_pid = NULL, finished = ?, "
+                    "error = CASE WHEN ? = 'failed' THEN ? ELSE error END WHERE job_id = ?",
+                    (status, message, None if status == 'pending' else now_iso(), status, message, job['job_id'])
+                )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return [job['job_id'] for job in stale
+                if not job['cancel_requested'] and job['attempts'] < MAX_ATTEMPTS]
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+class JobContext:
+    """Lo que ve el trabajo: reporte de progreso (que también detecta la cancelación)"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.last_report = 0.0
+
+    def progress(self, processed, total=None, message=None, force=False):
+        """Reportar progreso; lanza JobCancelled si el usuario canceló el trabajo"""
+        now = time.monotonic()
+        if not force and message is None and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        if self.store.update_progress(self.job_id, processed, total, message):
+            raise JobCancelled()
+
+
+class Heartbeat(threading.Thread):
+    """Latido del proceso mientras el trabajo corre (incluso en etapas sin progreso)"""
+
+    def __init__(self, store, job_id):
+        super().__init__(daemon=True)
+        self.store = store
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.store.beat(self.job_id)
+            except sqlite3.Error:
+                pass
+        self.store.close()
+
+
+def reclassify_job(context, params, output_dir):
+    """Re-clasificar todos los emails (reclassify_emails.py)"""
+    from reclassify_emails import reclassify_all_emails
+
+    summary = reclassify_all_emails(output_dir, progress=context.progress)
+    if summary is None:
+        raise RuntimeError("No se encontró el archivo de clasificación existente")
+    return {'summary': summary}
+
+
+def report_job(context, params, output_dir):
+    """Clasificación completa y reporte de texto (email_classifier.py)"""
+    from email_classifier import EmailClassifier
+
+    classifier = EmailClassifier(
+        output_dir,
+        scan_quoted=params.get('scan_quoted', True),
+        dedup=params.get('dedup', True)
+    )
+    report = classifier.generate_report(progress=context.progress)
+
+    # Mismo archivo que la línea de comandos, más una copia propia del trabajo para descargarla
+    (classifier.classification_dir / 'classification_report.txt').write_text(report, encoding='utf-8')
+    report_path = Path(output_dir) / "exports" / f"report_{context.job_id}.txt"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(report, encoding='utf-8')
+    return {'file': str(report_path.resolve()), 'size': report_path.stat().st_size, 'format': 'txt'}
+
+
+def export_job(context, params, output_dir):
+    """Escribir el CSV, Excel o ZIP de una exportación masiva (filas calculadas por el dashboard)"""
+    import pandas as pd
+
+    export_format = params['format']
+    output_dir = Path(output_dir)
+    manifest = pd.read_json(StringIO(context.store.payload(context.job_id)), orient='split',
+                            dtype=False, convert_dates=False)
+    exports_dir = output_dir / "exports"
+    exports_dir.mkdir(parents=True, exist_ok=True)
+    export_path = exports_dir / f"export_{context.job_id}.{export_format}"
+
+    try:
+        if export_format == 'csv':
+            manifest.to_csv(export_path, index=False, encoding='utf-8-sig')
+        elif export_format == 'xlsx':
+            manifest.to_excel(export_path, index=False)
+        else:
+            # El ZIP se escribe directamente a disco, un archivo a la vez
+            with zipfile.ZipFile(export_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                zf.writestr('manifest.csv', manifest.to_csv(index=False).encode('utf-8-sig'))
+
+                for processed, email_id in enumerate(manifest[params['id_column']], start=1):
+                    entries = [
+                        (output_dir / "emails" / f"{email_id}.eml", f"{email_id}/{email_id}.eml"),
+                        (output_dir / "metadata" / f"{email_id}.json", f"{email_id}/{email_id}_metadata.json")
+                    ]
+                    attachment_dir = output_dir / "attachments" / email_id
+                    if attachment_dir.exists():
+                        for file_path in attachment_dir.iterdir():
+                            if file_path.is_file():
+                                entries.append((file_path, f"{email_id}/attachments/{file_path.name}"))
+
+                    for file_path, arcname in entries:
+                        if file_path.exists():
+                            zf.write(file_path, arcname, compress_type=zip_compress_type(file_path))
+
+                    context.progress(processed)
+    except BaseException:
+        # Cancelada o fallida: no dejar un archivo a medias en exports/
+        export_path.unlink(missing_ok=True)
+        raise
+
+    context.progress(len(manifest), force=True)
+    return {'file': str(export_path.resolve()), 'size': export_path.stat().st_size, 'format': export_format}
+
+
+JOB_HANDLERS = {
+    'reclassify': reclassify_job,
+    'report': report_job,
+    'export': export_job,
+}
+
+
+def run_job(db_path, job_id):
+    """Ejecutar un trabajo en este proceso; devuelve el estado final o None si otro lo tomó"""
+    store = JobStore(db_path)
+    if not store.claim(job_id, os.getpid()):
+        store.close()
+        return None
+
+    job = store.get(job_id)
+    context = JobContext(store, job_id)
+    heartbeat = Heartbeat(store, job_id)
+    heartbeat.start()
+
+    # La salida de los scripts (print) va al log del trabajo, no a la consola del servidor
+    log_path = Path(db_path).parent / JOB_LOGS_DIRNAME / f"{job_id}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    status = 'failed'
+    try:
+        with open(log_path, 'a', encoding='utf-8') as log, redirect_stdout(log):
+            try:
+                context.progress(0, message='En ejecución', force=True)
+                result = JOB_HANDLERS[job['kind']](context, job['params'], job['params']['output_dir'])
+                status = 'completed'
+                store.finish(job_id, status, result=result, message='Completado')
+            except JobCancelled:
+                status = 'cancelled'
+                store.finish(job_id, status, message='Cancelado por el usuario')
+            except Exception as e:
+                traceback.print_exc(file=log)
+                store.finish(job_id, status, error=str(e) or type(e).__name__, message='Error')
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+        store.close()
+
+    return status
+
+
+class JobManager:
+    """Lado web: lanzar cada trabajo en su proceso y leer su estado de la tabla"""
+
+    def __init__(self, output_dir="output", workers=JOB_WORKERS):
+        self.output_dir = Path(output_dir)
+        self.store = JobStore(jobs_path(output_dir))
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.last_recovery = time.monotonic()
+
+    def get_executor(self):
+        """Hilos que esperan a los procesos de los trabajos (creados al primer trabajo)"""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            return self.executor
+
+    def dispatch(self, job_id):
+        future = self.get_executor().submit(self.run_process, job_id)
+        future.add_done_callback(lambda done: self.on_done(job_id, done))
+
+    def run_process(self, job_id):
+        """Ejecutar el trabajo en un intérprete nuevo que solo importa este módulo y el script del trabajo
+
+        Un proceso de multiprocessing (spawn) volvería a importar el módulo principal
+        del servidor, y con él el dashboard completo, en cada worker.
+        """
+        log_path = self.log_path(job_id)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as log:
+            returncode = subprocess.run(
+                [sys.executable, str(Path(__file__).resolve()), str(self.output_dir), '--job', job_id],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log
+            ).returncode
+        if returncode != 0:
+            raise RuntimeError(f"El proceso del trabajo terminó con código {returncode}")
+
+    def on_done(self, job_id, future):
+        """El proceso del trabajo murió a la mitad (p. ej. sin memoria): cerrar el trabajo"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            return
+        job = self.store.get(job_id)
+        if job and job['status'] in ACTIVE_STATUSES:
+            self.store.finish(job_id, 'failed', error=str(error) or type(error).__name__, message='Error')
+
+    def submit(self, kind, params=None, payload=None, total=None):
+        """Crear y encolar un trabajo; lanza JobConflict si ya corre una re-clasificación o un reporte"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        params = dict(params or {}, output_dir=str(self.output_dir))
+        job = self.store.create(kind, params, payload, total, exclusive=kind in EXCLUSIVE_KINDS)
+        self.dispatch(job['job_id'])
+        return job
+
+    def resume(self):
+        """Al arrancar: reencolar los trabajos interrumpidos y los que quedaron pendientes"""
+        recovered = self.store.recover_stale()
+        pending = self.store.pending_ids()
+        for job_id in pending:
+            self.dispatch(job_id)
+        return len(recovered), len(pending)
+
+    def recover_if_due(self):
+        """Reencolar trabajos cuyo proceso murió después del arranque (o durante un reinicio rápido)
+
+        Se revisa al leer el estado, como mucho una vez cada HEARTBEAT_INTERVAL.
+        """
+        now = time.monotonic()
+        if now - self.last_recovery < HEARTBEAT_INTERVAL:
+            return
+        self.last_recovery = now
+        for job_id in self.store.recover_stale():
+            self.dispatch(job_id)
+
+    def get(self, job_id):
+        self.recover_if_due()
+        return self.store.get(job_id)
+
+    def list(self, kind=None, limit=50):
+        self.recover_if_due()
+        return self.store.list(kind, limit)
+
+    def cancel(self, job_id):
+        return self.store.request_cancel(job_id)
+
+    def log_path(self, job_id):
+        return self.store.db_path.parent / JOB_LOGS_DIRNAME / f"{job_id}.log"
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+
+def main():
+    """Listar, ejecutar o cancelar trabajos desde la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Trabajos en segundo plano del dashboard")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--run', choices=EXCLUSIVE_KINDS, help="Ejecutar un trabajo en primer plano")
+    action.add_argument('--cancel', metavar='JOB_ID', help="Solicitar la cancelación de un trabajo")
+    action.add_argument('--job', metavar='JOB_ID', help="Ejecutar un trabajo encolado (proceso lanzado por el dashboard)")
+    parser.add_argument('--limit', type=int, default=20, help="Trabajos a listar")
+    args = parser.parse_args()
+    store = JobStore(jobs_path(args.output_dir))
+
+    if args.cancel:
+        job = store.request_cancel(args.cancel)
+        print(f"🛑 {job['job_id']}: {job['status']}" if job else "❌ Trabajo no encontrado")
+        return
+
+    if args.job:
+        # El estado final (o el error) queda en la tabla
+        run_job(store.db_path, args.job)
+        return
+
+    if args.run:
+        try:
+            job = store.create(args.run, {'output_dir': args.output_dir}, exclusive=True)
+        except JobConflict as e:
+            print(f"❌ {e}")
+            return
+        print(f"⚙️  Ejecutando {args.run} ({job['job_id']})...")
+        status = run_job(store.db_path, job['job_id'])
+        job = store.get(job['job_id'])
+        print(f"{'✅' if status == 'completed' else '❌'} {status}: {job['error'] or job['message']}")
+        return
+
+    for job in store.list(limit=args.limit):
+        print(f"{job['created'][:19]}  {job['job_id'][:12]}  {job['kind']:<10} {job['status']:<10} "
+              f"{job['processed']}/{job['total'] or '?'}  {job['error'] or job['message'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
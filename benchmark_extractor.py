@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Extractor PST
+Ejecuta PSTExtractor sobre el backend simulado (fake_pypff) sin necesidad de un
+PST real: mide throughput (mensajes/s, MB escritos), verifica la reanudación
+tras una interrupción a mitad de la extracción y permite inyectar errores y
+latencia de E/S
+Uso: python benchmark_extractor.py [--messages N] [--config pst.json] [--error-rate 0.01] [--latency-ms 1]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fake_pypff
+from pst_extractor import PSTExtractor
+
+
+def directory_size(path):
+    """Bytes escritos bajo un directorio"""
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def extraction_snapshot(output_dir):
+    """{email_id: (carpeta, asunto, adjuntos, hilo)} para comparar extracciones"""
+    snapshot = {}
+    for metadata_file in (Path(output_dir) / "metadata").glob("*.json"):
+        metadata = json.loads(metadata_file.read_text(encoding='utf-8'))
+        snapshot[metadata['id']] = (
+            metadata['folder'], metadata.get('subject'),
+            tuple((a['filename'], a['size']) for a in metadata.get('attachments', [])),
+            metadata.get('thread_id')
+        )
+    return snapshot
+
+
+def run_extraction(output_dir, config, verbose=False):
+    """Extraer con el backend simulado: (segundos, backend, interrumpida)"""
+    backend = fake_pypff.FakePypff(config)
+    extractor = PSTExtractor("simulado.pst", output_dir, pst_backend=backend)
+    interrupted = False
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        try:
+            extractor.extract()
+        except KeyboardInterrupt:
+            interrupted = True
+    return time.perf_counter() - start, backend, interrupted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de PSTExtractor con un PST simulado")
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--config', default=None, help="JSON con la configuración del PST simulado")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--subfolders', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--body-kb', type=int, default=4)
+    parser.add_argument('--attachment-kb', type=int, default=40)
+    parser.add_argument('--attachment-rate', type=float, default=0.7)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Probabilidad de error al leer cuerpos y adjuntos")
+    parser.add_argument('--corrupt-rate', type=float, default=0.0)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latencia por mensaje")
+    parser.add_argument('--no-resume-check', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    config = {
+        'seed': args.seed,
+        'messages': args.messages,
+        'subfolders': args.subfolders,
+        'depth': args.depth,
+        'body_kb': args.body_kb,
+        'attachment_kb': args.attachment_kb,
+        'attachment_rate': args.attachment_rate,
+        'message_error_rate': args.error_rate,
+        'attachment_error_rate': args.error_rate,
+        'corrupt_rate': args.corrupt_rate,
+        'message_latency_ms': args.latency_ms
+    }
+    if args.config:
+        config.update(json.loads(Path(args.config).read_text(encoding='utf-8')))
+
+    print("⏱️  BENCHMARK DEL EXTRACTOR PST (backend simulado)")
+    print("=" * 60)
+    print(f"Mensajes: {config['messages']} | Cuerpo: {config['body_kb']} KB | "
+          f"PDF: {config['attachment_kb']} KB | Errores: {args.error_rate:.1%}")
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="sura_pst_") as tmp:
+        full_dir = Path(tmp) / "full"
+        seconds, backend, _ = run_extraction(full_dir, config, args.verbose)
+        state = backend.last_file.state
+        written_mb = directory_size(full_dir) / 1024 / 1024
+        full = extraction_snapshot(full_dir)
+
+        print(f"\nEXTRACCIÓN COMPLETA: {seconds:8.2f} s")
+        print(f"  {len(full) / seconds:,.0f} mensajes/s | {written_mb / seconds:.1f} MB/s escritos "
+              f"({written_mb:.1f} MB)")
+        print(f"  Adjuntos leídos: {state.bytes_served / 1024 / 1024:.1f} MB | "
+              f"Errores inyectados: {state.errors_injected}")
+
+        if len(full) != config['messages']:
+            failures.append(f"{len(full)} metadatos escritos de {config['messages']} mensajes")
+
+        if not args.no_resume_check:
+            # Interrumpir a mitad de camino y reanudar con un extractor nuevo
+            resume_dir = Path(tmp) / "resume"
+            half = config['messages'] // 2
+            first_seconds, _, interrupted = run_extraction(resume_dir, dict(config, fail_after=half), args.verbose)
+            saved = len(json.loads((resume_dir / "progress.json").read_text(encoding='utf-8'))['processed_emails'])
+            resume_seconds, _, _ = run_extraction(resume_dir, config, args.verbose)
+            resumed = extraction_snapshot(resume_dir)
+
+            print(f"\nREANUDACIÓN (interrupción tras {half} mensajes):")
+            print(f"  Primera pasada: {first_seconds:8.2f} s ({saved} emails en progress.json)")
+            print(f"  Reanudación:    {resume_seconds:8.2f} s")
+
+            if not interrupted:
+                failures.append("la interrupción simulada no se produjo")
+            if resumed != full:
+                differing = sum(1 for key in full.keys() | resumed.keys() if full.get(key) != resumed.get(key))
+                failures.append(f"la extracción reanudada difiere en {differing} emails")
+
+    if failures:
+        print("\n❌ Fallos:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("\n✅ Extracción completa y reanudación verificadas")
+
+
+if __name__ == "__main__":
+    main()
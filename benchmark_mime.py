@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Lector de Cuerpos MIME
+Compara la lectura actual (texto + email.message_from_file + walk) contra el
+lector binario de mime_body, verifica que el texto extraído es el mismo y
+reporta tiempos. Con --synthetic genera emails con adjuntos grandes
+Uso: python benchmark_mime.py [emails_dir] [--synthetic N --attachment-kb K] [--runs N]
+"""
+
+import argparse
+import email
+import os
+import statistics
+import sys
+import tempfile
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from mime_body import read_text_parts
+
+
+def read_with_message_tree(eml_file):
+    """Lectura anterior: decodifica todo el archivo y construye el árbol completo"""
+    content = {'plain_text': '', 'html_content': ''}
+    with open(eml_file, 'r', encoding='utf-8') as f:
+        msg = email.message_from_file(f)
+
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    content['plain_text'] = payload.decode('utf-8', errors='ignore')
+            elif part.get_content_type() == "text/html":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    content['html_content'] = payload.decode('utf-8', errors='ignore')
+    return content
+
+
+def write_synthetic_emails(target_dir, count, attachment_kb):
+    """Generar emails de prueba: cuerpo texto/HTML + un SLIP y un PDF binarios"""
+    for i in range(count):
+        msg = MIMEMultipart('mixed')
+        msg['Subject'] = f"COTIZACION AGENTE {1000 + i}"
+        body = MIMEMultipart('alternative')
+        body.attach(MIMEText(f"Solicito su apoyo cotizando la póliza {50000 + i}", 'plain', 'utf-8'))
+        body.attach(MIMEText(f"<p>Solicito su apoyo cotizando la <b>póliza {50000 + i}</b></p>", 'html', 'utf-8'))
+        msg.attach(body)
+        for name in ('SLIP.xlsx', 'COTIZACION.pdf'):
+            msg.attach(MIMEApplication(os.urandom(attachment_kb * 1024), Name=name))
+        (target_dir / f"email_{i + 1:06d}.eml").write_bytes(msg.as_bytes())
+
+
+def time_reader(reader, files, runs):
+    """Mediana de segundos para leer todos los archivos con un lector"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for eml_file in files:
+            reader(eml_file)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del lector de cuerpos MIME")
+    parser.add_argument('emails_dir', nargs='?', default='output/emails')
+    parser.add_argument('--synthetic', type=int, default=0, help="Generar N emails con adjuntos")
+    parser.add_argument('--attachment-kb', type=int, default=512, help="Tamaño de cada adjunto sintético")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        emails_dir = Path(args.emails_dir)
+        if args.synthetic:
+            emails_dir = Path(tmp)
+            write_synthetic_emails(emails_dir, args.synthetic, args.attachment_kb)
+
+        files = sorted(emails_dir.glob('*.eml'))
+        if not files:
+            print(f"❌ No hay archivos .eml en {emails_dir}")
+            sys.exit(1)
+
+        total_mb = sum(f.stat().st_size for f in files) / 1024 / 1024
+
+        print("⏱️  BENCHMARK DEL LECTOR MIME")
+        print("=" * 60)
+        print(f"Emails: {len(files)} | Tamaño total: {total_mb:.1f} MB | Ejecuciones: {args.runs}")
+
+        # Equivalencia: mismo texto plano y HTML
+        mismatches = [f.name for f in files if read_with_message_tree(f) != read_text_parts(f)]
+
+        tree_time = time_reader(read_with_message_tree, files, args.runs)
+        binary_time = time_reader(read_text_parts, files, args.runs)
+
+    print(f"\nÁRBOL MIME (actual): {tree_time:8.3f} s  ({tree_time / len(files) * 1000:.3f} ms/email)")
+    print(f"LECTOR BINARIO:      {binary_time:8.3f} s  ({binary_time / len(files) * 1000:.3f} ms/email)")
+    print(f"Aceleración: {tree_time / binary_time if binary_time else 0:.2f}x")
+
+    if mismatches:
+        print(f"\n❌ {len(mismatches)} emails con texto distinto:")
+        for name in mismatches[:10]:
+            print(f"  - {name}")
+        sys.exit(1)
+
+    print("\n✅ Equivalencia verificada: mismo texto plano y HTML")
+
+
+if __name__ == "__main__":
+    main()
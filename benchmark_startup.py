@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark de Arranque del Dashboard
+Mide el arranque en frío de web_app (import + primera respuesta) con y sin snapshot
+Uso: python benchmark_startup.py [output_dir] [--runs N] [--target SEGUNDOS]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Objetivo de arranque en frío (import + primera respuesta de /api/stats)
+STARTUP_TARGET_SECONDS = 1.0
+
+# Código ejecutado en un proceso nuevo para cada medición
+PROBE = """
+import json, time
+start = time.perf_counter()
+import web_app
+imported = time.perf_counter()
+client = web_app.app.test_client()
+client.get('/api/stats')
+first_response = time.perf_counter()
+client.get('/api/search')
+first_search = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_response': first_response - start,
+    'first_search': first_search - start
+}))
+"""
+
+
+def measure(output_dir, use_snapshot, runs):
+    """Ejecutar el probe en procesos nuevos y devolver las medianas"""
+    env = dict(os.environ)
+    env['DASHBOARD_OUTPUT_DIR'] = str(output_dir)
+    env['DASHBOARD_USE_SNAPSHOT'] = '1' if use_snapshot else '0'
+
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=Path(__file__).resolve().parent,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del dashboard")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS)
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir).resolve()
+
+    print("⏱️  BENCHMARK DE ARRANQUE DEL DASHBOARD")
+    print("=" * 60)
+    print(f"Datos: {output_dir} | Ejecuciones: {args.runs}")
+
+    results = {}
+    for label, use_snapshot in [('snapshot', True), ('json', False)]:
+        results[label] = measure(output_dir, use_snapshot, args.runs)
+        timings = results[label]
+        print(f"\n{label.upper()}:")
+        print(f"  Import web_app:        {timings['import'] * 1000:8.1f} ms")
+        print(f"  Primera /api/stats:    {timings['first_response'] * 1000:8.1f} ms")
+        print(f"  Primera /api/search:   {timings['first_search'] * 1000:8.1f} ms")
+
+    cold_start = results['snapshot']['first_response']
+    print(f"\n🎯 Objetivo: {args.target * 1000:.0f} ms | Arranque con snapshot: {cold_start * 1000:.1f} ms")
+
+    if cold_start > args.target:
+        print("❌ Arranque por encima del objetivo")
+        sys.exit(1)
+
+    print("✅ Arranque dentro del objetivo")
+
+
+if __name__ == "__main__":
+    main()
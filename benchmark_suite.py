@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Suite de Benchmarks de Extremo a Extremo
+Genera corpus sintéticos (synthetic_corpus.py) de distintos tamaños y mide
+classify_all_emails, reclassify_all_emails, el arranque del dashboard y la
+latencia de /api/search y /email/<id>. Cada ejecución se agrega a un historial
+JSON y se compara con la anterior del mismo tamaño para detectar regresiones
+Uso: python benchmark_suite.py --sizes 1000 10000 [--history benchmarks/history.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from benchmark_startup import measure as measure_startup
+from synthetic_corpus import generate_corpus
+
+# Historial por defecto (una entrada por tamaño y ejecución)
+DEFAULT_HISTORY_FILE = "benchmarks/history.json"
+
+# Una métrica es regresión si empeora más que este porcentaje respecto a la ejecución anterior
+REGRESSION_THRESHOLD = 0.25
+
+# Diferencias absolutas por debajo de este piso se consideran ruido (ms o segundos)
+NOISE_FLOOR_MS = 2.0
+NOISE_FLOOR_S = 0.1
+
+# Consultas representativas de /api/search
+SEARCH_QUERIES = [
+    {},
+    {'classification': 'cotizacion'},
+    {'classification': 'renovacion', 'has_attachments': 'true'},
+    {'query': 'COTIZACION'},
+    {'query': 'MSC INDUSTRIALSUPPLY', 'sort': 'sender', 'order': 'asc'},
+    {'date_from': '2025-03-01', 'date_to': '2025-06-30'},
+    {'sort': 'confidence', 'page': '5'},
+    {'collapse_threads': 'true'},
+    {'classification': 'endoso', 'per_page': '200'}
+]
+
+
+def quiet(func, *args, **kwargs):
+    """Ejecutar una función descartando lo que imprime"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def timed(func, *args, **kwargs):
+    """(resultado, segundos)"""
+    start = time.perf_counter()
+    result = quiet(func, *args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency_summary(samples):
+    """Percentiles en milisegundos"""
+    values = np.array(samples) * 1000
+    return {
+        'requests': len(samples),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def measure_requests(client, paths):
+    """Latencias de una lista de rutas con el cliente de pruebas de Flask"""
+    samples = []
+    for path in paths:
+        start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} devolvió {response.status_code}")
+    return samples
+
+
+def check_entity_lookup(client, corpus_dir):
+    """Verificar que una póliza con guiones ('1-284-97186') se encuentra por /api/entities
+
+    Devuelve (póliza, emails encontrados); lanza RuntimeError si /api/entities no
+    devuelve exactamente los emails cuyas entidades la mencionan.
+    """
+    from entity_index import normalize_entity
+
+    results_file = Path(corpus_dir) / "classification" / "classification_results.json"
+    with open(results_file, 'r', encoding='utf-8') as f:
+        emails = json.load(f)['emails']
+
+    values = {}
+    expected = {}
+    for email_info in emails:
+        for value in email_info.get('entities', {}).get('poliza', []):
+            if '-' in value:
+                key = normalize_entity(value)
+                values.setdefault(key, value)
+                expected.setdefault(key, set()).add(email_info['email_id'])
+    if not expected:
+        raise RuntimeError("Ningún email tiene una póliza con guiones en sus entidades")
+
+    key = max(expected, key=lambda candidate: len(expected[candidate]))
+    response = client.get(f"/api/entities/poliza/{values[key]}")
+    found = {row['email_id'] for row in response.get_json()['emails']}
+    if found != expected[key]:
+        raise RuntimeError(f"/api/entities/poliza/{values[key]} devolvió {len(found)} emails, "
+                           f"se esperaban {len(expected[key])}")
+    return values[key], len(found)
+
+
+def benchmark_dashboard(corpus_dir, requests, seed):
+    """Latencia de /api/search y /email/<id> sobre un corpus ya clasificado"""
+    os.environ['DASHBOARD_OUTPUT_DIR'] = str(corpus_dir)
+    import web_app
+    from urllib.parse import urlencode
+
+    web_app.dashboard = quiet(web_app.EmailDashboard, str(corpus_dir))
+    client = web_app.app.test_client()
+
+    poliza, found = check_entity_lookup(client, corpus_dir)
+    print(f"  /api/entities póliza {poliza}: {found} emails (verificado)")
+
+    search_paths = [f"/api/search?{urlencode(query)}" for query in SEARCH_QUERIES]
+    cold = measure_requests(client, search_paths)
+    warm = measure_requests(client, [search_paths[i % len(search_paths)] for i in range(requests)])
+
+    rng = random.Random(seed)
+    email_ids = web_app.dashboard.state.columns['email_id']
+    email_paths = [f"/email/{email_ids[rng.randrange(len(email_ids))]}" for _ in range(requests)]
+    email_samples = measure_requests(client, email_paths)
+
+    return {
+        'search_cold': latency_summary(cold),
+        'search_warm': latency_summary(warm),
+        'email_view': latency_summary(email_samples)
+    }
+
+
+def run_size(size, work_dir, args):
+    """Todas las mediciones para un tamaño de corpus"""
+    from email_classifier import EmailClassifier
+    from reclassify_emails import reclassify_all_emails
+
+    corpus_dir = work_dir / f"corpus_{size}"
+    progress_file = corpus_dir / "progress.json"
+
+    generation = None
+    reuse = args.reuse and progress_file.exists() and \
+        json.loads(progress_file.read_text(encoding='utf-8')).get('total_processed') == size
+    if not reuse:
+        if corpus_dir.exists():
+            shutil.rmtree(corpus_dir)
+        generation = generate_corpus(corpus_dir, size, seed=args.seed, workers=args.workers)
+
+    print(f"\n📦 Corpus de {size} emails: {corpus_dir}" + (" (reutilizado)" if reuse else ""))
+
+    classify_results, classify_seconds = timed(EmailClassifier(corpus_dir).classify_all_emails)
+    print(f"  classify_all_emails:    {classify_seconds:8.2f} s")
+
+    _, reclassify_seconds = timed(reclassify_all_emails, str(corpus_dir))
+    print(f"  reclassify_all_emails:  {reclassify_seconds:8.2f} s")
+
+    startup = measure_startup(corpus_dir, True, args.startup_runs)
+    print(f"  Arranque dashboard:     {startup['first_response'] * 1000:8.1f} ms")
+
+    dashboard = benchmark_dashboard(corpus_dir, args.requests, args.seed)
+    print(f"  /api/search p50/p95:    {dashboard['search_warm']['p50_ms']:.2f} / {dashboard['search_warm']['p95_ms']:.2f} ms "
+          f"(primera vez p95 {dashboard['search_cold']['p95_ms']:.2f} ms)")
+    print(f"  /email/<id> p50/p95:    {dashboard['email_view']['p50_ms']:.2f} / {dashboard['email_view']['p95_ms']:.2f} ms")
+
+    return {
+        'emails': size,
+        'generation': generation,
+        'classify_all_emails_s': round(classify_seconds, 3),
+        'classify_ms_per_email': round(classify_seconds / max(classify_results.get('total_emails', 0), 1) * 1000, 3),
+        'reclassify_all_emails_s': round(reclassify_seconds, 3),
+        'dashboard_startup_ms': round(startup['first_response'] * 1000, 3),
+        'dashboard_import_ms': round(startup['import'] * 1000, 3),
+        'first_search_ms': round(startup['first_search'] * 1000, 3),
+        'api_search': dashboard['search_warm'],
+        'api_search_cold': dashboard['search_cold'],
+        'email_view': dashboard['email_view']
+    }
+
+
+def comparable_metrics(result):
+    """Métricas de tiempo comparables entre ejecuciones (nombre → valor)"""
+    metrics = {key: value for key, value in result.items() if key.endswith(('_s', '_ms', '_per_email'))}
+    for group in ('api_search', 'api_search_cold', 'email_view'):
+        for key in ('p50_ms', 'p95_ms'):
+            metrics[f"{group}.{key}"] = result[group][key]
+    return metrics
+
+
+def find_regressions(history, entry):
+    """Métricas que empeoran respecto a la ejecución anterior del mismo tamaño"""
+    previous = next((item for item in reversed(history) if item['emails'] == entry['emails']), None)
+    if previous is None:
+        return None, []
+
+    regressions = []
+    before = comparable_metrics(previous)
+    for metric, value in comparable_metrics(entry).items():
+        old = before.get(metric)
+        noise_floor = NOISE_FLOOR_S if metric.endswith('_s') else NOISE_FLOOR_MS
+        if old and value > old * (1 + REGRESSION_THRESHOLD) and value - old > noise_floor:
+            regressions.append({'metric': metric, 'before': old, 'after': value, 'change': round(value / old - 1, 3)})
+    return previous, regressions
+
+
+def git_commit():
+    """Commit actual (si el directorio es un repositorio git)"""
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True
+        )
+        return completed.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de extremo a extremo")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000])
+    parser.add_argument('--work-dir', default=None, help="Directorio para los corpus (temporal por defecto)")
+    parser.add_argument('--reuse', action='store_true', help="Reutilizar corpus existentes del mismo tamaño")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests', type=int, default=200, help="Peticiones por endpoint")
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    print("⏱️  SUITE DE BENCHMARKS")
+    print("=" * 60)
+
+    temporary = None
+    if args.work_dir:
+        work_dir = Path(args.work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        temporary = tempfile.TemporaryDirectory(prefix="sura_bench_")
+        work_dir = Path(temporary.name)
+
+    history_file = Path(args.history)
+    history = json.loads(history_file.read_text(encoding='utf-8')) if history_file.exists() else []
+
+    run_info = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed
+    }
+
+    all_regressions = []
+    try:
+        for size in args.sizes:
+            entry = dict(run_info, **run_size(size, work_dir, args))
+            previous, regressions = find_regressions(history, entry)
+            if previous:
+                print(f"  Comparado con {previous.get('commit') or previous['timestamp']}: "
+                      f"{len(regressions)} regresiones (> {REGRESSION_THRESHOLD:.0%})")
+                for regression in regressions:
+                    print(f"    ⚠️  {regression['metric']}: {regression['before']} → {regression['after']} "
+                          f"(+{regression['change']:.0%})")
+            entry['regressions'] = regressions
+            all_regressions.extend(regressions)
+            history.append(entry)
+    finally:
+        if temporary:
+            temporary.cleanup()
+
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Historial actualizado: {history_file} ({len(history)} ejecuciones)")
+
+    if all_regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Historial Versionado de Clasificaciones
+Cada ejecución del clasificador (classify_all_emails, reclassify_emails.py,
+reprocess_quarantine.py) se registra como una versión en
+output/classification/history.sqlite, guardando solo los emails cuya
+clasificación cambió respecto de la versión anterior junto con la versión de
+las reglas. Reemplaza las copias completas classification_results_backup_*.json:
+cualquier versión se puede reconstruir a partir de los cambios
+Uso: python classification_history.py output [--diff A B] [--email ID] [--restore N]
+"""
+
+import argparse
+import hashlib
+import json
+import shutil
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from dashboard_snapshot import stamp_results
+
+# Archivo del historial dentro de output/classification
+HISTORY_FILENAME = "history.sqlite"
+
+# Versión del esquema (PRAGMA user_version)
+HISTORY_SCHEMA_VERSION = 1
+
+# Campos del resultado que forman la clasificación versionada; los metadatos
+# están en el catálogo y 'evaluation' solo describe cómo se evaluó
+CLASSIFICATION_FIELDS = ('thread_id', 'entities', 'attachment_analysis', 'classifications', 'primary_classification',
+                         'degraded', 'duplicate_of')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    source TEXT NOT NULL,
+    rules_version TEXT,
+    options TEXT,
+    complete INTEGER NOT NULL,
+    total_emails INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS changes (
+    email_id TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    primary_type TEXT,
+    confidence INTEGER,
+    status TEXT,
+    digest TEXT,
+    record BLOB,
+    PRIMARY KEY (email_id, run_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest (
+    email_id TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    digest TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS changes_run ON changes(run_id);
+"""
+
+
+def classification_view(email_result):
+    """Parte versionada de un resultado de classify_email"""
+    return {field: email_result[field] for field in CLASSIFICATION_FIELDS if field in email_result}
+
+
+def classification_digest(view):
+    """Huella estable de una clasificación (claves ordenadas)"""
+    encoded = json.dumps(view, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def pack_record(view):
+    return zlib.compress(json.dumps(view, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def unpack_record(record):
+    return json.loads(zlib.decompress(record)) if record is not None else None
+
+
+class ClassificationHistory:
+    """Versiones de clasificación almacenadas como deltas por email"""
+
+    def __init__(self, classification_dir="output/classification"):
+        self.classification_dir = Path(classification_dir)
+        self.classification_dir.mkdir(parents=True, exist_ok=True)
+        self.history_file = self.classification_dir / HISTORY_FILENAME
+        self.connection = sqlite3.connect(self.history_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+        self.connection.commit()
+
+    def record_run(self, emails, source, rules_version=None, options=None, complete=True, summary=None):
+        """Registrar una ejecución: solo se escriben los emails nuevos o cuya clasificación cambió
+
+        complete=False (reproceso parcial) no marca como eliminados los emails ausentes.
+        Devuelve el run_id, o None si no hubo ningún cambio respecto de la versión anterior
+        con las mismas reglas (no se crea una versión vacía).
+        """
+        connection = self.connection
+        latest = dict(connection.execute("SELECT email_id, digest FROM latest"))
+
+        rows = []
+        seen = set()
+        added = changed = 0
+        for email_result in emails:
+            email_id = email_result['email_id']
+            seen.add(email_id)
+            view = classification_view(email_result)
+            digest = classification_digest(view)
+            previous = latest.get(email_id)
+            if previous == digest:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                changed += 1
+            primary = view.get('primary_classification', {})
+            rows.append((email_id, primary.get('type'), primary.get('confidence'), primary.get('status'),
+                         digest, pack_record(view)))
+
+        removed = []
+        if complete:
+            removed = [email_id for email_id, digest in latest.items() if digest is not None and email_id not in seen]
+
+        last_run = connection.execute(
+            "SELECT rules_version FROM runs ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        if not rows and not removed and last_run is not None and last_run[0] == rules_version:
+            return None
+
+        cursor = connection.execute(
+            "INSERT INTO runs (created, source, rules_version, options, complete, total_emails, added, changed, "
+            "removed, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.now().isoformat(), source, rules_version,
+                json.dumps(options or {}, sort_keys=True), int(complete), len(seen),
+                added, changed, len(removed), json.dumps(summary or {}, ensure_ascii=False)
+            )
+        )
+        run_id = cursor.lastrowid
+
+        connection.executemany(
+            "INSERT INTO changes (email_id, run_id, primary_type, confidence, status, digest, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((email_id, run_id, *values) for email_id, *values in rows)
+        )
+        connection.executemany(
+            "INSERT INTO changes (email_id, run_id) VALUES (?, ?)",
+            ((email_id, run_id) for email_id in removed)
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO latest (email_id, run_id, digest) VALUES (?, ?, ?)",
+            [(row[0], run_id, row[4]) for row in rows] + [(email_id, run_id, None) for email_id in removed]
+        )
+        connection.commit()
+        return run_id
+
+    def has_runs(self):
+        return self.connection.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is not None
+
+    def runs(self):
+        """Versiones registradas, de la más antigua a la más reciente"""
+        cursor = self.connection.execute(
+            "SELECT run_id, created, source, rules_version, options, complete, total_emails, added, changed, "
+            "removed, summary FROM runs ORDER BY run_id"
+        )
+        columns = [column[0] for column in cursor.description]
+        runs = []
+        for row in cursor:
+            run = dict(zip(columns, row))
+            run['options'] = json.loads(run['options'] or '{}')
+            run['summary'] = json.loads(run['summary'] or '{}')
+            run['complete'] = bool(run['complete'])
+            runs.append(run)
+        return runs
+
+    def last_run_id(self):
+        row = self.connection.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def resolve_run(self, run_id):
+        """Admite índices negativos (-1 = última versión, -2 = la anterior)"""
+        if run_id >= 0:
+            return run_id
+        row = self.connection.execute(
+            "SELECT run_id FROM runs ORDER BY run_id DESC LIMIT 1 OFFSET ?", (-run_id - 1,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def state_row(self, email_id, run_id):
+        """Última fila de un email con versión <= run_id (búsqueda por clave primaria)"""
+        return self.connection.execute(
+            "SELECT run_id, primary_type, confidence, status, digest FROM changes "
+            "WHERE email_id = ? AND run_id <= ? ORDER BY run_id DESC LIMIT 1",
+            (email_id, run_id)
+        ).fetchone()
+
+    def changes_between(self, run_a, run_b):
+        """Emails cuya clasificación en la versión run_b difiere de la de run_a
+
+        Solo se consultan los emails con alguna fila entre ambas versiones; un email
+        que cambió y volvió a su clasificación original no se informa.
+        """
+        run_a, run_b = sorted((self.resolve_run(run_a), self.resolve_run(run_b)))
+        email_ids = [row[0] for row in self.connection.execute(
+            "SELECT DISTINCT email_id FROM changes WHERE run_id > ? AND run_id <= ?", (run_a, run_b)
+        )]
+
+        differences = []
+        for email_id in sorted(email_ids):
+            before = self.state_row(email_id, run_a)
+            after = self.state_row(email_id, run_b)
+            if (before[4] if before else None) == (after[4] if after else None):
+                continue
+            differences.append({
+                'email_id': email_id,
+                'before': self.describe_state(before),
+                'after': self.describe_state(after)
+            })
+        return differences
+
+    @staticmethod
+    def describe_state(row):
+        if row is None or row[4] is None:
+            return None
+        return {'run_id': row[0], 'type': row[1], 'confidence': row[2], 'status': row[3]}
+
+    def email_history(self, email_id, include_records=False):
+        """Versiones de la clasificación de un email, con la versión de reglas de cada una"""
+        history = []
+        for row in self.connection.execute(
+            "SELECT c.run_id, r.created, r.source, r.rules_version, c.primary_type, c.confidence, c.status, c.record "
+            "FROM changes c JOIN runs r USING (run_id) WHERE c.email_id = ? ORDER BY c.run_id",
+            (email_id,)
+        ):
+            entry = {
+                'run_id': row[0], 'created': row[1], 'source': row[2], 'rules_version': row[3],
+                'type': row[4], 'confidence': row[5], 'status': row[6], 'removed': row[7] is None
+            }
+            if include_records:
+                entry['classification'] = unpack_record(row[7])
+            history.append(entry)
+        return history
+
+    def state_at(self, run_id=None):
+        """{email_id: clasificación} tal como quedó en la versión run_id (por defecto la última)"""
+        run_id = self.last_run_id() if run_id is None else self.resolve_run(run_id)
+        state = {}
+        if run_id is None:
+            return state
+        for email_id, record in self.connection.execute(
+            "SELECT c.email_id, c.record FROM changes c WHERE c.run_id = ("
+            "SELECT MAX(run_id) FROM changes WHERE email_id = c.email_id AND run_id <= ?)",
+            (run_id,)
+        ):
+            if record is not None:
+                state[email_id] = unpack_record(record)
+        return state
+
+    def close(self):
+        self.connection.close()
+
+
+def backup_results(classification_dir):
+    """Copia completa de classification_results.json (respaldo si el historial no se puede escribir)"""
+    results_file = Path(classification_dir) / "classification_results.json"
+    if not results_file.exists():
+        return None
+    backup_file = results_file.with_name(
+        f"classification_results_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    shutil.copy2(results_file, backup_file)
+    return backup_file
+
+
+def record_classification_run(classifier, emails, source, complete=True, summary=None):
+    """Registrar una ejecución de EmailClassifier; devuelve el run_id o None
+
+    Se llama antes de sobrescribir classification_results.json: si el historial
+    no se puede escribir, los resultados anteriores se copian a un backup
+    completo como antes del historial. Si tampoco se puede copiar, el OSError
+    se propaga y el llamador no sobrescribe el archivo.
+    """
+    try:
+        history = ClassificationHistory(classifier.classification_dir)
+        run_id = history.record_run(
+            emails, source,
+            rules_version=classifier.rules_version(),
+            options=classifier.run_options(),
+            complete=complete,
+            summary=summary
+        )
+        history.close()
+        return run_id
+    except sqlite3.Error as e:
+        print(f"⚠️  No se pudo registrar la versión en el historial de clasificaciones: {e}")
+        backup_file = backup_results(classifier.classification_dir)
+        if backup_file:
+            print(f"💾 Resultados anteriores guardados en: {backup_file}")
+        return None
+
+
+def restore_results(output_dir, run_id):
+    """Reconstruir el contenido de classification_results.json para una versión"""
+    from metadata_catalog import load_catalog
+
+    history = ClassificationHistory(Path(output_dir) / "classification")
+    state = history.state_at(run_id)
+    catalog = load_catalog(output_dir)
+
+    emails = []
+    counts = {'cotizacion': 0, 'renovacion': 0, 'endoso': 0, 'sin_clasificar': 0}
+    for email_id in sorted(state):
+        view = state[email_id]
+        metadata = catalog.get_metadata(email_id) if catalog else None
+        email_result = {'email_id': email_id, 'thread_id': view.get('thread_id'), 'metadata': metadata or {}}
+        email_result.update(view)
+        emails.append(email_result)
+        primary_type = view.get('primary_classification', {}).get('type')
+        if primary_type in counts:
+            counts[primary_type] += 1
+
+    results = {'total_emails': len(emails), 'total_threads': len({email['thread_id'] for email in emails})}
+    results.update(counts)
+    results['quarantined'] = sum(1 for email in emails if 'degraded' in email)
+    results['restored_from_run'] = history.resolve_run(run_id)
+    results['emails'] = emails
+    history.close()
+    return results
+
+
+def print_runs(history):
+    print(f"{'versión':>8}  {'fecha':<20}{'origen':<22}{'reglas':<14}{'emails':>8}{'nuevos':>8}"
+          f"{'cambios':>9}{'elim.':>7}")
+    for run in history.runs():
+        print(f"{run['run_id']:>8}  {run['created'][:19]:<20}{run['source']:<22}{(run['rules_version'] or '-'):<14}"
+              f"{run['total_emails']:>8}{run['added']:>8}{run['changed']:>9}{run['removed']:>7}")
+
+
+def describe(state):
+    if state is None:
+        return '(sin clasificación)'
+    return f"{state['type']} ({state['confidence']}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historial versionado de clasificaciones")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--diff', nargs=2, type=int, metavar=('A', 'B'),
+                        help="Emails cuya clasificación cambió entre las versiones A y B (-1 = última)")
+    parser.add_argument('--email', help="Historial de clasificación de un email")
+    parser.add_argument('--restore', type=int, metavar='N', help="Reconstruir los resultados de la versión N")
+    parser.add_argument('--to', help="Archivo de salida para --restore")
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    classification_dir = Path(args.output_dir) / "classification"
+    if not (classification_dir / HISTORY_FILENAME).exists():
+        print(f"❌ No existe {classification_dir / HISTORY_FILENAME} (se crea al clasificar)")
+        sys.exit(1)
+
+    history = ClassificationHistory(classification_dir)
+
+    if args.diff:
+        differences = history.changes_between(*args.diff)
+        print(f"🔀 {len(differences)} emails cambiaron entre las versiones "
+              f"{history.resolve_run(args.diff[0])} y {history.resolve_run(args.diff[1])}")
+        for difference in differences[:args.limit]:
+            print(f"  {difference['email_id']}: {describe(difference['before'])} → {describe(difference['after'])}")
+        if len(differences) > args.limit:
+            print(f"  ... y {len(differences) - args.limit} más")
+    elif args.email:
+        entries = history.email_history(args.email)
+        if not entries:
+            print(f"❌ {args.email} no aparece en el historial")
+        for entry in entries:
+            state = 'eliminado' if entry['removed'] else f"{entry['type']} ({entry['confidence']}%) {entry['status'] or ''}"
+            print(f"  v{entry['run_id']:<4} {entry['created'][:19]}  {entry['source']:<20} "
+                  f"reglas {entry['rules_version'] or '-':<12}  {state}")
+    elif args.restore is not None:
+        results = restore_results(args.output_dir, args.restore)
+        target = Path(args.to) if args.to else classification_dir / f"classification_results_v{results['restored_from_run']}.json"
+        stamp_results(results)
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Versión {results['restored_from_run']} ({results['total_emails']} emails) guardada en {target}")
+    else:
+        print_runs(history)
+
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
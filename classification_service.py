@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Servicio de Clasificación Residente
+Mantiene cargado un EmailClassifier (patrones compilados, catálogo de metadatos
+abierto, caché de SLIP por hilo) y clasifica emails individuales o
+micro-lotes por HTTP local o socket Unix, sin pagar el arranque del
+clasificador en cada invocación. Un email se clasifica por id (del directorio
+de salida) o a partir del .eml recibido con sus adjuntos.
+
+Las solicitudes se atienden en el hilo principal, una por vez, para que los
+presupuestos de tiempo por etapa se apliquen con SIGALRM igual que en lote.
+
+Uso: python classification_service.py output [--port 8765 | --socket /tmp/clasificador.sock]
+
+    GET  /health
+    GET  /classify/<email_id>
+    POST /classify          {"email_id": ...} | {"eml": base64, "attachments": {nombre: base64}, "folder": ...}
+                            o el .eml crudo con Content-Type: message/rfc822
+    POST /classify/batch    {"emails": [ {...}, ... ]}
+"""
+
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import os
+import shutil
+import signal
+import socketserver
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+from email_classifier import EmailClassifier
+from eml_import import import_eml
+
+# Puerto por defecto (solo se escucha en localhost)
+DEFAULT_PORT = 8765
+
+# Resultados recientes en memoria (por id y firma de archivos, o por hash del .eml)
+SERVICE_CACHE_SIZE = 4096
+
+# Emails por micro-lote y tamaño máximo de una solicitud
+MAX_BATCH_SIZE = 200
+MAX_REQUEST_BYTES = 100 * 1024 * 1024
+
+
+class ServiceError(Exception):
+    """Error de una solicitud con su código HTTP"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ClassificationService:
+    """Clasificador residente con caché de resultados"""
+
+    def __init__(self, output_dir="output", lazy_evaluation=False, scan_quoted=True, budgets=True,
+                 cache_size=SERVICE_CACHE_SIZE):
+        self.output_dir = Path(output_dir)
+        self.classifier = EmailClassifier(output_dir, lazy_evaluation=lazy_evaluation, scan_quoted=scan_quoted,
+                                          budgets=budgets, dedup=False)
+
+        # Los .eml recibidos se escriben en un directorio temporal con la estructura del
+        # extractor y se borran al clasificarlos (no se agregan al directorio de salida)
+        self.scratch_dir = Path(tempfile.mkdtemp(prefix='clasificador-'))
+        self.inbox = EmailClassifier(self.scratch_dir, lazy_evaluation=lazy_evaluation, scan_quoted=scan_quoted,
+                                     budgets=budgets, dedup=False)
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.started = time.time()
+        self.stats = {'requests': 0, 'classified': 0, 'cache_hits': 0, 'errors': 0}
+
+    def close(self):
+        """Borrar el directorio temporal"""
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    def warm_up(self):
+        """Clasificar un email del directorio de salida para cargar catálogo, openpyxl y cachés de regex"""
+        metadata_dir = self.output_dir / "metadata"
+        first = next(iter(sorted(metadata_dir.glob('*.json'))[:1]), None) if metadata_dir.exists() else None
+        if first is not None:
+            self.classifier.classify_email(first.stem)
+        return first.stem if first is not None else None
+
+    def cached(self, key):
+        """Resultado en caché (None si no está)"""
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+        return result
+
+    def remember(self, key, result):
+        """Guardar un resultado en la caché LRU (los degradados por presupuesto se vuelven a intentar)"""
+        if 'degraded' in result:
+            return
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def email_signature(self, email_id):
+        """Firma de los archivos de un email: cambia si se reextrae o cambian sus adjuntos"""
+        signature = [email_id]
+        for path in (self.output_dir / "metadata" / f"{email_id}.json",
+                     self.output_dir / "emails" / f"{email_id}.eml",
+                     self.output_dir / "attachments" / email_id):
+            try:
+                stat = path.stat()
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def classify_id(self, email_id):
+        """Clasificar un email del directorio de salida"""
+        if not email_id or '/' in email_id or '\\' in email_id or email_id.startswith('.'):
+            raise ServiceError(400, f"email_id inválido: {email_id!r}")
+
+        key = ('id',) + self.email_signature(email_id)
+        result = self.cached(key)
+        if result is not None:
+            return result, True
+
+        result = self.classifier.classify_email(email_id)
+        if 'error' in result:
+            raise ServiceError(404, result['error'])
+        self.stats['classified'] += 1
+        self.remember(key, result)
+        return result, False
+
+    def classify_eml(self, eml_bytes, attachments=None, folder=""):
+        """Clasificar un .eml recibido (con adjuntos adicionales opcionales {nombre: bytes})"""
+        if not eml_bytes:
+            raise ServiceError(400, "El .eml está vacío")
+
+        digest = hashlib.sha1(eml_bytes)
+        for filename, data in sorted((attachments or {}).items()):
+            digest.update(filename.encode('utf-8'))
+            digest.update(hashlib.sha1(data).digest())
+        digest.update(folder.encode('utf-8'))
+        email_id = f"eml-{digest.hexdigest()[:16]}"
+
+        key = ('eml', email_id)
+        result = self.cached(key)
+        if result is not None:
+            return result, True
+
+        try:
+            metadata = import_eml(self.scratch_dir, eml_bytes, email_id, folder, attachments)
+            result = self.inbox.classify_email(email_id, metadata)
+        finally:
+            (self.scratch_dir / "emails" / f"{email_id}.eml").unlink(missing_ok=True)
+            (self.scratch_dir / "metadata" / f"{email_id}.json").unlink(missing_ok=True)
+            shutil.rmtree(self.scratch_dir / "attachments" / email_id, ignore_errors=True)
+
+        self.stats['classified'] += 1
+        self.remember(key, result)
+        return result, False
+
+    def classify_item(self, item):
+        """Clasificar un elemento de solicitud JSON ({"email_id"} o {"eml", "attachments", "folder"})"""
+        if not isinstance(item, dict):
+            raise ServiceError(400, "Cada email debe ser un objeto JSON")
+        if item.get('email_id') and 'eml' not in item:
+            return self.classify_id(str(item['email_id']))
+        if 'eml' in item:
+            try:
+                eml_bytes = base64.b64decode(item['eml'])
+                attachments = {str(name): base64.b64decode(data)
+                               for name, data in (item.get('attachments') or {}).items()}
+            except (binascii.Error, TypeError, ValueError):
+                raise ServiceError(400, "eml y attachments deben estar en base64")
+            return self.classify_eml(eml_bytes, attachments, str(item.get('folder') or ''))
+        raise ServiceError(400, "Se requiere email_id o eml")
+
+    def timed(self, func, *args):
+        """Ejecutar una clasificación y devolver la respuesta con su tiempo"""
+        start = time.perf_counter()
+        result, cached = func(*args)
+        return {
+            'email_id': result['email_id'],
+            'cached': cached,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+            'result': result
+        }
+
+    def classify_batch(self, items):
+        """Clasificar un micro-lote; los errores se informan por email sin interrumpir el lote"""
+        if not isinstance(items, list):
+            raise ServiceError(400, "emails debe ser una lista")
+        if len(items) > MAX_BATCH_SIZE:
+            raise ServiceError(413, f"Máximo {MAX_BATCH_SIZE} emails por lote")
+
+        start = time.perf_counter()
+        responses = []
+        for item in items:
+            try:
+                responses.append(self.timed(self.classify_item, item))
+            except ServiceError as e:
+                self.stats['errors'] += 1
+                responses.append({'error': str(e), 'status': e.status,
+                                  'email_id': item.get('email_id') if isinstance(item, dict) else None})
+        return {
+            'total': len(responses),
+            'errors': sum(1 for response in responses if 'error' in response),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+            'results': responses
+        }
+
+    def health(self):
+        """Estado del servicio"""
+        return {
+            'status': 'ok',
+            'output_dir': str(self.output_dir),
+            'rules_version': self.classifier.rules_version(),
+            'started': datetime.fromtimestamp(self.started).isoformat(),
+            'uptime_s': round(time.time() - self.started, 1),
+            'cache_entries': len(self.cache),
+            **self.stats
+        }
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """Rutas HTTP del servicio (self.server.service es el ClassificationService)"""
+
+    server_version = "ClasificadorSura/1.0"
+
+    def address_string(self):
+        # En un socket Unix client_address no es (host, puerto)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ServiceError(413, f"Solicitud mayor a {MAX_REQUEST_BYTES} bytes")
+        return self.rfile.read(length) if length else b''
+
+    def read_json(self):
+        """Cuerpo JSON de la solicitud; debe ser un objeto"""
+        try:
+            body = json.loads(self.read_body() or b'{}')
+        except ValueError:
+            raise ServiceError(400, "JSON inválido")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "El cuerpo debe ser un objeto JSON")
+        return body
+
+    def dispatch(self, handler):
+        service = self.server.service
+        service.stats['requests'] += 1
+        try:
+            self.send_json(200, handler(service))
+        except ServiceError as e:
+            service.stats['errors'] += 1
+            self.send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            service.stats['errors'] += 1
+            self.send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self.dispatch(lambda service: service.health())
+        elif path.startswith('/classify/') and path != '/classify/batch':
+            email_id = unquote(path[len('/classify/'):])
+            self.dispatch(lambda service: service.timed(service.classify_id, email_id))
+        else:
+            self.send_json(404, {'error': f"Ruta no encontrada: {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == '/classify':
+            content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+            if content_type == 'message/rfc822':
+                folder = parse_qs(url.query).get('folder', [''])[0]
+                self.dispatch(lambda service: service.timed(service.classify_eml, self.read_body(), None, folder))
+            else:
+                self.dispatch(lambda service: service.timed(service.classify_item, self.read_json()))
+        elif url.path == '/classify/batch':
+            self.dispatch(lambda service: service.classify_batch(self.read_json().get('emails')))
+        else:
+            self.send_json(404, {'error': f"Ruta no encontrada: {url.path}"})
+
+
+class UnixServiceServer(socketserver.UnixStreamServer):
+    """Servidor HTTP sobre un socket Unix"""
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o660)
+
+
+def create_server(service, port=DEFAULT_PORT, socket_path=None, host='127.0.0.1', verbose=False):
+    """Servidor HTTP (TCP en localhost o socket Unix) para el servicio"""
+    if socket_path:
+        server = UnixServiceServer(socket_path, ServiceRequestHandler)
+    else:
+        server = HTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio residente de clasificación de emails")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--socket', help="Escuchar en un socket Unix en vez de TCP")
+    parser.add_argument('--lazy', action='store_true', help="Evaluación perezosa de señales")
+    parser.add_argument('--no-quoted', action='store_true', help="Ignorar el historial citado")
+    parser.add_argument('--no-budget', action='store_true', help="Sin presupuestos de tiempo y tamaño")
+    parser.add_argument('--verbose', action='store_true', help="Registrar cada solicitud")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    service = ClassificationService(args.output_dir, lazy_evaluation=args.lazy, scan_quoted=not args.no_quoted,
+                                    budgets=not args.no_budget)
+    warmed = service.warm_up()
+    server = create_server(service, args.port, args.socket, args.host, args.verbose)
+
+    address = args.socket or f"http://{args.host}:{args.port}"
+    print(f"🚀 Servicio de clasificación en {address} "
+          f"(reglas {service.classifier.rules_version()}, listo en {time.perf_counter() - start:.2f}s"
+          f"{', precalentado con ' + warmed if warmed else ''})")
+    # SIGTERM (systemd, kill) cierra igual que Ctrl+C: se borran el socket y el directorio temporal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Snapshot binario del Dashboard
+Columnas, índices de ordenamiento y resultados por email precalculados por el
+clasificador, que el dashboard carga con memory mapping sin parsear el JSON
+completo. Los archivos son de solo lectura: varios procesos del servidor que
+mapean el mismo snapshot comparten sus páginas en memoria
+"""
+
+import json
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from thread_index import thread_id_for
+
+# Bloqueo entre procesos de los resultados (no disponible en Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Versión del formato del snapshot (incrementar si cambian las columnas)
+SNAPSHOT_FORMAT_VERSION = 4
+
+# Nombre del directorio del snapshot dentro de output/classification
+SNAPSHOT_DIRNAME = "dashboard_snapshot"
+
+# Cada escritura va a un subdirectorio propio (v-<id>); CURRENT tiene el nombre
+# del vigente y se reemplaza de forma atómica, así siempre hay un snapshot completo
+SNAPSHOT_POINTER = "CURRENT"
+SNAPSHOT_VERSION_PREFIX = "v-"
+
+# Archivo de bloqueo de classification_results.json
+RESULTS_LOCK_FILENAME = "classification_results.lock"
+
+# Identificador de cada escritura de los resultados: primera clave de
+# classification_results.json, se lee sin parsear el archivo completo
+RESULTS_ID_KEY = "results_id"
+RESULTS_ID_PATTERN = re.compile(rb'^\s*\{\s*"' + RESULTS_ID_KEY.encode() + rb'"\s*:\s*"([0-9a-f]+)"')
+RESULTS_ID_HEAD_BYTES = 256
+
+# Columnas del dashboard por tipo
+STRING_COLUMNS = [
+    'email_id', 'subject', 'sender_name', 'sender_email', 'folder', 'delivery_time',
+    'classification_type', 'status', 'agente_code', 'poliza_number', 'thread_id', 'duplicate_of'
+]
+INT_COLUMNS = ['size', 'attachment_count', 'confidence', 'total_attachments', 'duplicates']
+BOOL_COLUMNS = ['has_slip', 'slip_complete']
+DATE_COLUMNS = ['delivery_date']
+
+# Campos de ordenamiento disponibles en /api/search
+SORT_FIELDS = {
+    'date': 'delivery_date',
+    'confidence': 'confidence',
+    'sender': 'sender_name'
+}
+
+
+@contextmanager
+def results_lock(classification_dir):
+    """Bloqueo exclusivo entre procesos de classification_results.json (leer → clasificar → escribir)
+
+    Lo toman todos los que reescriben los resultados (email_classifier.py,
+    reclassify_emails.py, reprocess_quarantine.py, watch_inbox.py y los trabajos
+    del dashboard), para que ninguno sobrescriba lo que otro acaba de escribir.
+    Sin fcntl (Windows) no se bloquea.
+    """
+    lock_file = Path(classification_dir) / RESULTS_LOCK_FILENAME
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, 'a') as handle:
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("⏳ Esperando a que otro proceso termine de escribir los resultados...")
+                fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def stamp_results(results):
+    """Asignar un results_id nuevo a unos resultados que se van a escribir
+
+    Se coloca como primera clave para que results_version lo lea del inicio del archivo.
+    """
+    results_id = uuid.uuid4().hex
+    items = [(key, value) for key, value in results.items() if key != RESULTS_ID_KEY]
+    results.clear()
+    results[RESULTS_ID_KEY] = results_id
+    results.update(items)
+    return results_id
+
+
+def results_version(results_file):
+    """Versión de un archivo de resultados: cambia con cada ejecución de clasificación
+
+    Es el results_id que escribe el clasificador, así que se conserva al copiar el
+    directorio, hacer checkout o subirlo a un despliegue (cambia la fecha de
+    modificación pero no el contenido). Los archivos anteriores sin results_id
+    usan la fecha de modificación y el tamaño.
+    """
+    results_file = Path(results_file)
+    with open(results_file, 'rb') as f:
+        match = RESULTS_ID_PATTERN.match(f.read(RESULTS_ID_HEAD_BYTES))
+    if match:
+        return match.group(1).decode('ascii')
+    stat = results_file.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def build_dashboard_rows(results):
+    """Aplanar los resultados de clasificación a una fila por email"""
+    # Copias reutilizadas de cada representante de un grupo de casi duplicados
+    duplicates = {}
+    for email_info in results.get('emails', []):
+        if 'duplicate_of' in email_info:
+            representative = email_info['duplicate_of']['email_id']
+            duplicates[representative] = duplicates.get(representative, 0) + 1
+
+    emails_data = []
+    for email_info in results.get('emails', []):
+        row = {
+            'email_id': email_info['email_id'],
+            'subject': email_info['metadata'].get('subject', ''),
+            'sender_name': email_info['metadata'].get('sender_name', ''),
+            'sender_email': email_info['metadata'].get('sender_email', ''),
+            'folder': email_info['metadata'].get('folder', ''),
+            'delivery_time': email_info['metadata'].get('delivery_time', ''),
+            'size': email_info['metadata'].get('size', 0),
+            'attachment_count': email_info['metadata'].get('attachment_count', 0),
+            'classification_type': email_info['primary_classification']['type'],
+            'confidence': email_info['primary_classification']['confidence'],
+            'status': email_info['primary_classification']['status'],
+            'agente_code': email_info['primary_classification']['details'].get('agente_code', ''),
+            'poliza_number': email_info['primary_classification']['details'].get('poliza_number', ''),
+            'has_slip': email_info['attachment_analysis'].get('has_slip', False),
+            'slip_complete': email_info['attachment_analysis'].get('slip_complete', False),
+            'total_attachments': email_info['attachment_analysis'].get('total_attachments', 0),
+            'thread_id': email_info.get('thread_id') or thread_id_for(
+                dict(email_info['metadata'], id=email_info['email_id'])
+            ),
+            'duplicate_of': email_info.get('duplicate_of', {}).get('email_id', ''),
+            'duplicates': duplicates.get(email_info['email_id'], 0)
+        }
+        emails_data.append(row)
+
+    return emails_data
+
+
+def build_dataframe(results):
+    """Construir el DataFrame del dashboard a partir de los resultados"""
+    import pandas as pd
+
+    df = pd.DataFrame(build_dashboard_rows(results))
+    if len(df) == 0:
+        return df
+
+    # Limpiar fechas
+    df['delivery_date'] = pd.to_datetime(df['delivery_time'], errors='coerce')
+
+    # Convertir fechas NaT a None para evitar errores de serialización JSON
+    df['delivery_time'] = df['delivery_time'].where(pd.notnull(df['delivery_time']), None)
+
+    return df
+
+
+def build_sort_indexes(df):
+    """Precalcular permutaciones ordenadas (ascendente y descendente) por campo"""
+    import pandas as pd
+
+    sort_indexes = {}
+    if len(df) == 0:
+        return sort_indexes
+
+    for sort_name, column in SORT_FIELDS.items():
+        keys = df[column]
+        if column == 'sender_name':
+            keys = keys.fillna('').str.lower()
+
+        for order in ('asc', 'desc'):
+            # email_id como desempate para que el orden sea estable entre páginas
+            ordered = pd.DataFrame({'key': keys, 'email_id': df['email_id']}).sort_values(
+                ['key', 'email_id'],
+                ascending=order == 'asc',
+                na_position='last',
+                kind='mergesort'
+            )
+            sort_indexes[(sort_name, order)] = ordered.index.to_numpy()
+
+    return sort_indexes
+
+
+def build_sort_ranks(sort_indexes):
+    """Rango de cada fila dentro de cada permutación (inversa, para paginación por cursor)"""
+    sort_ranks = {}
+    for key, permutation in sort_indexes.items():
+        ranks = np.empty(len(permutation), dtype=np.int64)
+        ranks[permutation] = np.arange(len(permutation))
+        sort_ranks[key] = ranks
+    return sort_ranks
+
+
+def encode_records(emails, encoded=None):
+    """Resultados por email como JSON concatenado y sus desplazamientos (n + 1)
+
+    encoded permite pasar el JSON de cada email ya serializado (en el mismo orden).
+    """
+    offsets = np.zeros(len(emails) + 1, dtype=np.int64)
+    chunks = []
+    for row, email_info in enumerate(emails):
+        chunk = (encoded[row] if encoded is not None else json.dumps(email_info, ensure_ascii=False)).encode('utf-8')
+        chunks.append(chunk)
+        offsets[row + 1] = offsets[row] + len(chunk)
+    return b''.join(chunks), offsets
+
+
+def read_record(records, record_offsets, position):
+    """Resultado completo de clasificación de la fila position"""
+    return json.loads(bytes(records[record_offsets[position]:record_offsets[position + 1]]))
+
+
+def find_position(email_ids, email_order, email_id):
+    """Fila de un email_id por búsqueda binaria sobre el orden de ids (None si no existe)"""
+    low, high = 0, len(email_order)
+    while low < high:
+        middle = (low + high) // 2
+        if email_ids[email_order[middle]] < email_id:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(email_order) and email_ids[email_order[low]] == email_id:
+        return int(email_order[low])
+    return None
+
+
+def find_positions(email_ids, email_order, wanted):
+    """Filas de varios email_ids con una sola búsqueda vectorizada (se omiten los que no existen)"""
+    wanted = np.asarray(wanted, dtype=email_ids.dtype)
+    if len(wanted) == 0 or len(email_order) == 0:
+        return np.array([], dtype=np.int64)
+    slots = np.searchsorted(email_ids, wanted, sorter=email_order)
+    inside = slots < len(email_order)
+    positions = np.asarray(email_order[slots[inside]], dtype=np.int64)
+    return positions[email_ids[positions] == wanted[inside]]
+
+
+def dataframe_to_columns(df):
+    """Convertir el DataFrame del dashboard a arreglos NumPy de tipo fijo"""
+    columns = {}
+    for column in STRING_COLUMNS:
+        values = df[column].fillna('').astype(str).to_numpy() if column in df else []
+        columns[column] = np.array(values, dtype=str) if len(values) else np.array([], dtype='<U1')
+    for column in INT_COLUMNS:
+        columns[column] = df[column].fillna(0).astype('int64').to_numpy()
+    for column in BOOL_COLUMNS:
+        columns[column] = df[column].fillna(False).astype(bool).to_numpy()
+    for column in DATE_COLUMNS:
+        dates = df[column]
+        if getattr(dates.dt, 'tz', None) is not None:
+            dates = dates.dt.tz_convert(None)
+        columns[column] = dates.to_numpy(dtype='datetime64[ns]')
+    return columns
+
+
+def write_snapshot(results, results_file, snapshot_dir=None, encoded_records=None):
+    """Escribir el snapshot binario asociado a un archivo de resultados
+
+    encoded_records: JSON ya serializado de cada email (evita volver a serializarlos).
+    """
+    results_file = Path(results_file)
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else results_file.parent / SNAPSHOT_DIRNAME
+
+    df = build_dataframe(results)
+
+    # Se escribe en un directorio de versión nuevo, que nadie lee hasta que CURRENT lo apunta;
+    # meta.json marca el snapshot como válido
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    previous = current_snapshot_name(snapshot_dir)
+    version_name = f"{SNAPSHOT_VERSION_PREFIX}{uuid.uuid4().hex}"
+    version_dir = snapshot_dir / version_name
+    version_dir.mkdir()
+
+    if len(df) > 0:
+        columns = dataframe_to_columns(df)
+        for column, values in columns.items():
+            np.save(version_dir / f"{column}.npy", values)
+        sort_indexes = build_sort_indexes(df)
+        for (sort_name, order), permutation in sort_indexes.items():
+            np.save(version_dir / f"sort_{sort_name}_{order}.npy", permutation.astype(np.int64))
+        for (sort_name, order), ranks in build_sort_ranks(sort_indexes).items():
+            np.save(version_dir / f"rank_{sort_name}_{order}.npy", ranks)
+
+        # Búsqueda de filas por email_id sin construir un diccionario por proceso
+        np.save(version_dir / "email_id_order.npy", np.argsort(columns['email_id'], kind='mergesort').astype(np.int64))
+
+        # Resultado completo de cada email (vista del email sin cargar el JSON de resultados)
+        records, offsets = encode_records(results.get('emails', []), encoded_records)
+        with open(version_dir / "records.bin", 'wb') as f:
+            f.write(records)
+        np.save(version_dir / "record_offsets.npy", offsets)
+
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'results_version': results.get(RESULTS_ID_KEY) or results_version(results_file),
+        'rows': len(df),
+        'created': datetime.now().isoformat()
+    }
+    with open(version_dir / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    # Cambio de versión atómico: un lector ve el CURRENT anterior o el nuevo, nunca ninguno
+    pointer_tmp = snapshot_dir / f"{SNAPSHOT_POINTER}.tmp"
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version_name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, snapshot_dir / SNAPSHOT_POINTER)
+
+    remove_stale_snapshots(snapshot_dir, keep={version_name, previous})
+    return version_dir
+
+
+def current_snapshot_name(snapshot_dir):
+    """Subdirectorio vigente según CURRENT (None si no hay puntero)"""
+    try:
+        name = (Path(snapshot_dir) / SNAPSHOT_POINTER).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    # Solo nombres de versión: el puntero no puede salir del directorio del snapshot
+    if not name.startswith(SNAPSHOT_VERSION_PREFIX) or '/' in name or '\\' in name:
+        return None
+    return name
+
+
+def current_snapshot_dir(snapshot_dir):
+    """Directorio con los archivos del snapshot vigente
+
+    Sin CURRENT (snapshots escritos antes de las versiones) los archivos están
+    directamente en snapshot_dir.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    name = current_snapshot_name(snapshot_dir)
+    return snapshot_dir / name if name else snapshot_dir
+
+
+def remove_stale_snapshots(snapshot_dir, keep):
+    """Borrar las versiones que ya no se leen
+
+    Se conserva también la anterior: un proceso que leyó CURRENT justo antes del
+    cambio todavía puede estar abriendo sus archivos. Los procesos que ya tienen
+    mapeada una versión borrada la siguen leyendo (los archivos eliminados siguen
+    mapeados); donde no se pueden borrar archivos abiertos se reintenta en la
+    siguiente escritura.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    for path in snapshot_dir.iterdir():
+        if path.name in keep or path.name == SNAPSHOT_POINTER:
+            continue
+        if path.is_dir():
+            if path.name.startswith(SNAPSHOT_VERSION_PREFIX):
+                shutil.rmtree(path, ignore_errors=True)
+        else:
+            # Archivos del formato sin versiones y punteros temporales abandonados
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    # Directorios de la escritura anterior por reemplazo (.tmp/.old)
+    for suffix in ('.tmp', '.old'):
+        shutil.rmtree(snapshot_dir.with_name(snapshot_dir.name + suffix), ignore_errors=True)
+
+
+def load_snapshot(snapshot_dir, expected_version=None):
+    """Cargar un snapshot con memory mapping; devuelve None si no existe o está desactualizado"""
+    snapshot_dir = current_snapshot_dir(snapshot_dir)
+    meta_file = snapshot_dir / 'meta.json'
+    if not meta_file.exists():
+        return None
+
+    try:
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            return None
+        if expected_version and meta.get('results_version') != expected_version:
+            return None
+
+        columns = {}
+        sort_indexes = {}
+        sort_ranks = {}
+        email_order = records = record_offsets = None
+        if meta['rows'] > 0:
+            for column in STRING_COLUMNS + INT_COLUMNS + BOOL_COLUMNS + DATE_COLUMNS:
+                columns[column] = np.load(snapshot_dir / f"{column}.npy", mmap_mode='r')
+            for sort_name in SORT_FIELDS:
+                for order in ('asc', 'desc'):
+                    sort_indexes[(sort_name, order)] = np.load(
+                        snapshot_dir / f"sort_{sort_name}_{order}.npy", mmap_mode='r'
+                    )
+                    sort_ranks[(sort_name, order)] = np.load(
+                        snapshot_dir / f"rank_{sort_name}_{order}.npy", mmap_mode='r'
+                    )
+            email_order = np.load(snapshot_dir / "email_id_order.npy", mmap_mode='r')
+            record_offsets = np.load(snapshot_dir / "record_offsets.npy", mmap_mode='r')
+            records = np.memmap(snapshot_dir / "records.bin", dtype=np.uint8, mode='r')
+
+        return {
+            'meta': meta,
+            'columns': columns,
+            'sort_indexes': sort_indexes,
+            'sort_ranks': sort_ranks,
+            'email_order': email_order,
+            'records': records,
+            'record_offsets': record_offsets
+        }
+
+    except Exception as e:
+        print(f"Error cargando snapshot {snapshot_dir}: {e}")
+        return None
@@ -6,18 +6,136 @@ Basado en especificaciones del negocio de seguros
 """
 
 import os
+import sys
 import json
 import re
+import copy
+import hashlib
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
 import openpyxl
 from pathlib import Path
 from typing import Dict, List, Any
 import PyPDF2
-import email
-from bs4 import BeautifulSoup
+from dashboard_snapshot import results_lock, stamp_results, write_snapshot
+from thread_index import thread_id_for
+from quoted_history import html_to_text, split_message
+from mime_body import read_text_parts
+from rule_profiler import RuleProfiler, summary_table
+from metadata_catalog import load_catalog
+from classification_history import record_classification_run
+from aggregate_cube import save_cube_for_results
+from entity_index import save_entity_index_for_results
+from near_duplicates import NearDuplicateDetector, similarity
+
+
+# Reglas de puntuación: (categoría, señal, peso, criterio registrado en criteria_met)
+SCORING_RULES = [
+    ('cotizacion', 'cot_subject', 30, 'CA1: Palabra clave en asunto'),
+    ('cotizacion', 'agente', 20, 'CA2: Código de agente detectado'),
+    ('cotizacion', 'cot_body', 15, 'CA3: Palabra clave en cuerpo del email'),
+    ('cotizacion', 'cot_quoted', 5, 'CA3: Palabra clave en historial citado'),
+    ('cotizacion', 'has_slip', 25, 'CA4: Archivo SLIP detectado'),
+    ('cotizacion', 'slip_complete', 15, 'CA5: SLIP completo'),
+    ('cotizacion', 'pdf_cotizacion', 20, 'CA6: PDF de cotización presente'),
+    ('cotizacion', 'pdf_poliza', -15, 'CA7/CA10: Contiene documentos de póliza vigente'),
+    ('renovacion', 'ren_subject', 35, 'CA1: Palabra clave de renovación en asunto'),
+    ('renovacion', 'poliza', 20, 'CA2: Número de póliza detectado'),
+    ('renovacion', 'ren_body', 15, 'CA4-6: Palabra clave de renovación en cuerpo'),
+    ('renovacion', 'ren_quoted', 5, 'CA4-6: Palabra clave de renovación en historial citado'),
+    ('renovacion', 'pdf_renovacion', 25, 'CA-Adj1: PDF de renovación presente'),
+    ('renovacion', 'poliza_docs_renovacion', 20, 'CA-Adj2: Documentos de póliza + renovación'),
+    ('renovacion', 'cotizacion_sin_renovacion', -20, 'CA-Adj5: Prevención falso positivo cotización'),
+    ('endoso', 'end_subject', 35, 'CA1-2: Palabra clave de endoso en asunto'),
+    ('endoso', 'end_body', 15, 'CA3-4: Palabra clave de endoso en cuerpo'),
+    ('endoso', 'end_quoted', 5, 'CA3-4: Palabra clave de endoso en historial citado'),
+    ('endoso', 'poliza', 25, 'CA5: Referencia a póliza vigente'),
+    ('endoso', 'pdf_endoso', 20, 'CA7: PDF de endoso presente'),
+    ('endoso', 'poliza_docs_endoso', 15, 'CA8: Documentos de respaldo de endoso')
+]
+
+# Umbrales: por categoría (is_*) y mínimo para la clasificación principal
+CLASSIFICATION_THRESHOLDS = {
+    'cotizacion': 40,
+    'renovacion': 40,
+    'endoso': 30,
+    'primary': 30
+}
+
+# Categorías en orden de desempate para la clasificación principal
+CATEGORIES = ['cotizacion', 'renovacion', 'endoso']
+
+# Máximo de resultados de SLIP cacheados por hilo antes de vaciar la caché
+THREAD_CACHE_SIZE = 50000
+
+# Matriz binaria de reglas cumplidas (una fila por email, una columna por regla)
+FEATURE_MATRIX_FILENAME = 'feature_matrix.npz'
+
+# Señales que dependen del cuerpo del email (requieren parsear MIME + HTML)
+BODY_SIGNALS = ['agente_body', 'cot_body', 'poliza_body', 'ren_body', 'end_body',
+                'cot_quoted', 'ren_quoted', 'end_quoted']
+
+# Señales del historial citado y la señal del texto nuevo que las reemplaza
+QUOTED_SIGNALS = {'cot_quoted': 'cot_body', 'ren_quoted': 'ren_body', 'end_quoted': 'end_body'}
+
+# Señales que dependen del contenido de los adjuntos (requieren abrir libros Excel)
+CONTENT_SIGNALS = ['slip_complete']
+
+# Presupuestos por email: un email que los excede recibe una clasificación
+# degradada (asunto y nombres de adjuntos) y se registra en cuarentena
+EMAIL_TIME_BUDGET = 30.0
+STAGE_TIME_BUDGETS = {
+    'duplicates': 5.0,
+    'attachment_names': 5.0,
+    'body': 10.0,
+    'workbooks': 15.0
+}
+SIZE_BUDGETS = {
+    'subject_chars': 2000,
+    'body_bytes': 25 * 1024 * 1024,
+    'workbook_bytes': 20 * 1024 * 1024
+}
+
+# Emails en cuarentena, dentro de output/classification
+QUARANTINE_FILENAME = 'quarantine.json'
+
+# Identificadores extraídos del texto (grupo 1: el número)
+AGENTE_CODE_PATTERNS = [
+    r'\bAGENTE\s+(\d+)',
+    r'\bAG\s+(\d+)'
+]
+POLIZA_NUMBER_PATTERNS = [
+    r'\bp[óo]liza\s+(\d+)',
+    r'\bP[ÓO]LIZA\s+(\d+)',
+    r'\bOT\s+(\d+)',
+    r'\bN[ÚU]MERO\s+(\d+)'
+]
+
+# Identificadores completos para el índice de entidades (grupo 1): pólizas con
+# guiones o barras ('1-284-97186') y solo después de "póliza", no de "número" u "OT"
+ENTITY_POLIZA_PATTERNS = [
+    r'\bp[óo]liza\s+(?:n[úuo°º]\.?\s*|no\.\s*|n[úu]mero\s+)?(\d(?:[\d\-/]*\d)?)'
+]
+
+
+class BudgetExceeded(Exception):
+    """Un email excedió su presupuesto de tiempo o tamaño en una etapa"""
+
+    def __init__(self, stage: str, reason: str, limit, value):
+        super().__init__(f"{stage}: {reason} {value} > {limit}")
+        self.stage = stage
+        self.reason = reason
+        self.limit = limit
+        self.value = value
 
 
 class EmailClassifier:
-    def __init__(self, output_dir="output"):
+    def __init__(self, output_dir="output", lazy_evaluation=False, weights=None, thresholds=None, scan_quoted=True,
+                 budgets=True, budget_scale=1.0, profile=False, dedup=True):
         self.output_dir = Path(output_dir)
         self.metadata_dir = self.output_dir / "metadata"
         self.attachments_dir = self.output_dir / "attachments"
@@ -26,9 +144,72 @@ class EmailClassifier:
         # Crear directorio de clasificación
         self.classification_dir.mkdir(exist_ok=True)
 
+        # Evaluación perezosa: señales de menor a mayor costo, deteniéndose
+        # cuando la clasificación principal y su estado ya no pueden cambiar
+        self.lazy_evaluation = lazy_evaluation
+        self.evaluation_stats = {
+            'emails': 0,
+            'body_parsed': 0,
+            'body_skipped': 0,
+            'workbooks_opened': 0,
+            'workbooks_skipped': 0,
+            'workbooks_reused': 0,
+            'workbooks_hashed': 0,
+            'quoted_reused': 0,
+            'duplicates_reused': 0,
+            'new_chars': 0,
+            'quoted_chars': 0
+        }
+
+        # Historial citado: las reglas de cuerpo se evalúan sobre el texto nuevo;
+        # el texto citado solo aporta una señal de menor peso (desactivable)
+        self.scan_quoted = scan_quoted
+
+        # Presupuestos de tiempo (segundos) y tamaño; budget_scale los amplía al reprocesar
+        self.budgets_enabled = budgets
+        self.email_time_budget = EMAIL_TIME_BUDGET * budget_scale
+        self.stage_budgets = {stage: limit * budget_scale for stage, limit in STAGE_TIME_BUDGETS.items()}
+        self.size_budgets = {name: int(limit * budget_scale) for name, limit in SIZE_BUDGETS.items()}
+        self.email_deadline = None
+        self.current_stage = None
+        self.budget_expired = False
+        self.stage_timings = {}
+        self.quarantine = {}
+
+        # Análisis compartido por hilo: los SLIP reenviados en cada respuesta se
+        # abren una sola vez por hilo (clave: hilo y tamaño; el hash del contenido
+        # solo se calcula si coincide el tamaño) y el historial citado que repiten
+        # las respuestas se convierte de HTML a texto una sola vez
+        self.current_thread = None
+        self.thread_workbooks = {}
+        self.thread_quoted = {}
+
+        # Casi duplicados (reenvíos, copias CC): el primer email de cada grupo se
+        # analiza completo y su resultado se reutiliza en los demás
+        self.duplicates = NearDuplicateDetector(self.output_dir, text_signature=self.duplicate_signature) if dedup else None
+        self.duplicate_results = {}
+
+        # Catálogo SQLite de metadatos (se abre al primer uso; False si no hay)
+        self.catalog = None
+
+        # Perfil opcional de patrones, reglas y etapas (acumulado para todo el lote)
+        self.profiler = RuleProfiler() if profile else None
+
         # Patrones de palabras clave
         self.setup_patterns()
 
+        # Entidades del índice (/api/entities), compiladas una vez
+        self.entity_regexes = {
+            'poliza': [re.compile(pattern, re.IGNORECASE) for pattern in ENTITY_POLIZA_PATTERNS],
+            'agente': [re.compile(pattern, re.IGNORECASE) for pattern in AGENTE_CODE_PATTERNS]
+        }
+
+        # Pesos y umbrales de puntuación (ajustables para análisis what-if)
+        self.rules = {(category, signal): [weight, criterion] for category, signal, weight, criterion in SCORING_RULES}
+        for key, weight in (weights or {}).items():
+            self.rules[key][0] = weight
+        self.thresholds = dict(CLASSIFICATION_THRESHOLDS, **(thresholds or {}))
+
     def setup_patterns(self):
         """Configurar patrones de clasificación según especificaciones"""
 
@@ -108,34 +289,98 @@ class EmailClassifier:
             r'incorporaci[óo]n de cl[áa]usulas'
         ]
 
+    def rules_version(self) -> str:
+        """Huella corta de pesos, umbrales y patrones (versión de reglas del historial)"""
+        patterns = {name: value for name, value in sorted(vars(self).items()) if name.endswith('_patterns')}
+        encoded = json.dumps({
+            'rules': sorted([category, signal, weight] for (category, signal), (weight, _) in self.rules.items()),
+            'thresholds': self.thresholds,
+            'patterns': patterns,
+            'scan_quoted': self.scan_quoted
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:12]
+
+    @contextmanager
+    def full_evaluation(self):
+        """Evaluar todas las señales mientras dure el bloque, aunque el clasificador sea perezoso"""
+        lazy_evaluation, self.lazy_evaluation = self.lazy_evaluation, False
+        try:
+            yield
+        finally:
+            self.lazy_evaluation = lazy_evaluation
+
+    def run_options(self) -> Dict[str, Any]:
+        """Opciones de ejecución registradas con cada versión del historial"""
+        return {
+            'lazy': self.lazy_evaluation,
+            'scan_quoted': self.scan_quoted,
+            'budgets': self.budgets_enabled,
+            'email_time_budget': self.email_time_budget,
+            'dedup': self.duplicates is not None
+        }
+
+    def apply_rule(self, classification: Dict[str, Any], category: str, signal: str) -> int:
+        """Registrar el criterio cumplido de una regla y devolver su peso"""
+        weight, criterion = self.rules[(category, signal)]
+        classification['criteria_met'].append(criterion)
+        if self.profiler:
+            self.profiler.record_rule(category, signal)
+        return weight
+
+    def search(self, group: str, pattern: str, text: str):
+        """re.search sin distinguir mayúsculas; con --profile registra coincidencia y tiempo"""
+        if self.profiler is None:
+            return re.search(pattern, text, re.IGNORECASE)
+        start = time.perf_counter()
+        match = re.search(pattern, text, re.IGNORECASE)
+        self.profiler.record_pattern(group, pattern, match is not None, time.perf_counter() - start)
+        return match
+
+    def record_stage(self, stage: str, start: float):
+        """Registrar en el perfil la duración de una etapa iniciada en start"""
+        if self.profiler:
+            self.profiler.record_stage(stage, time.perf_counter() - start)
+
     def extract_agente_code(self, text: str) -> str:
         """Extraer código de agente del texto"""
-        patterns = [
-            r'\bAGENTE\s+(\d+)',
-            r'\bAG\s+(\d+)'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in AGENTE_CODE_PATTERNS:
+            match = self.search('agente_code', pattern, text)
             if match:
                 return match.group(1)
         return ""
 
     def extract_poliza_number(self, text: str) -> str:
         """Extraer número de póliza del texto"""
-        patterns = [
-            r'\bp[óo]liza\s+(\d+)',
-            r'\bP[ÓO]LIZA\s+(\d+)',
-            r'\bOT\s+(\d+)',
-            r'\bN[ÚU]MERO\s+(\d+)'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in POLIZA_NUMBER_PATTERNS:
+            match = self.search('poliza_number', pattern, text)
             if match:
                 return match.group(1)
         return ""
 
+    def extract_all(self, patterns: List[re.Pattern], texts: List[str]) -> List[str]:
+        """Todas las coincidencias distintas de los patrones, en orden de aparición"""
+        values = []
+        for text in texts:
+            if not text:
+                continue
+            for pattern in patterns:
+                for match in pattern.finditer(text):
+                    if match.group(1) not in values:
+                        values.append(match.group(1))
+        return values
+
+    def extract_entities(self, metadata: Dict[str, Any], email_content: Dict[str, str]) -> Dict[str, List[str]]:
+        """Números de póliza y códigos de agente del asunto, el texto nuevo y el citado (índice de entidades)"""
+        start = time.perf_counter()
+        cuerpo, citado = self.body_texts(email_content)
+        texts = [metadata.get('subject', '').upper(), cuerpo, citado]
+        entities = {
+            'poliza': self.extract_all(self.entity_regexes['poliza'], texts),
+            'agente': self.extract_all(self.entity_regexes['agente'], texts)
+        }
+        self.record_stage('entities', start)
+        return entities
+
     def extract_email_content(self, email_id: str) -> Dict[str, str]:
         """Extraer contenido del email (.eml file)"""
         emails_dir = self.output_dir / "emails"
@@ -144,47 +389,142 @@ class EmailClassifier:
         content = {
             'plain_text': '',
             'html_content': '',
-            'combined_text': ''
+            'combined_text': '',
+            'new_text': '',
+            'quoted_text': ''
         }
 
         if not eml_file.exists():
             return content
 
         try:
-            with open(eml_file, 'r', encoding='utf-8') as f:
-                msg = email.message_from_file(f)
-
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            content['plain_text'] = payload.decode('utf-8', errors='ignore')
-                    elif part.get_content_type() == "text/html":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            html_content = payload.decode('utf-8', errors='ignore')
-                            content['html_content'] = html_content
-
-                            # Extraer texto del HTML usando BeautifulSoup
-                            try:
-                                soup = BeautifulSoup(html_content, 'html.parser')
-                                content['combined_text'] = soup.get_text(separator=' ', strip=True)
-                            except:
-                                content['combined_text'] = content['plain_text']
-
-                # Si no hay texto plano, usar el extraído del HTML
-                if not content['plain_text'] and content['combined_text']:
-                    content['plain_text'] = content['combined_text']
+            # Solo se decodifican las partes text/plain y text/html (sin adjuntos)
+            start = time.perf_counter()
+            content.update(read_text_parts(eml_file))
+            self.record_stage('mime', start)
+
+            # Separar texto nuevo e historial citado (el HTML se parsea por partes);
+            # como antes, las reglas de cuerpo solo analizan el texto derivado del HTML
+            if content['html_content']:
+                start = time.perf_counter()
+                content.update(split_message('', content['html_content'], self.quoted_html_to_text))
+                self.record_stage('html', start)
+            content['combined_text'] = ' '.join(
+                part for part in (content['new_text'], content['quoted_text']) if part
+            )
+
+            # Si no hay texto plano, usar el extraído del HTML
+            if not content['plain_text'] and content['combined_text']:
+                content['plain_text'] = content['combined_text']
+
+            self.evaluation_stats['new_chars'] += len(content['new_text'])
+            self.evaluation_stats['quoted_chars'] += len(content['quoted_text'])
 
         except Exception as e:
             print(f"Error extrayendo contenido del email {email_id}: {e}")
 
         return content
 
-    def analyze_attachments(self, email_id: str) -> Dict[str, Any]:
-        """Analizar adjuntos según criterios de aceptación"""
+    def quoted_html_to_text(self, quoted_html: str) -> str:
+        """Texto del historial citado, reutilizado si otro email del hilo citó el mismo HTML"""
+        if not quoted_html:
+            return ''
+        cache_key = (self.current_thread, hashlib.sha1(quoted_html.encode('utf-8', 'surrogatepass')).hexdigest())
+        text = self.thread_quoted.get(cache_key)
+        if text is not None:
+            self.evaluation_stats['quoted_reused'] += 1
+            return text
+
+        text = html_to_text(quoted_html)
+        if len(self.thread_quoted) >= THREAD_CACHE_SIZE:
+            self.thread_quoted.clear()
+        self.thread_quoted[cache_key] = text
+        return text
+
+    def workbook_digest(self, file_path: Path, stat=None):
+        """SHA-1 del contenido de un libro (None si no se pudo leer o cambió desde stat)"""
+        try:
+            if stat is not None:
+                current = file_path.stat()
+                if (current.st_size, current.st_mtime_ns) != stat:
+                    return None
+            self.evaluation_stats['workbooks_hashed'] += 1
+            return hashlib.sha1(file_path.read_bytes()).hexdigest()
+        except OSError:
+            return None
+
+    def slip_is_complete(self, file_path: Path):
+        """Criterio de aceptación 5 - Verificar si un SLIP está completo (None si no se pudo leer)
+
+        Sin otro SLIP del mismo tamaño en el hilo el libro se abre sin calcular su
+        hash; si lo hay, se comparan los hashes (el del anterior se calcula en ese momento).
+        """
+        try:
+            stat = file_path.stat()
+            stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stat = None
+
+        workbook_bytes = stat[0] if stat else 0
+        if self.budgets_enabled and workbook_bytes > self.size_budgets['workbook_bytes']:
+            raise BudgetExceeded('workbooks', 'bytes', self.size_budgets['workbook_bytes'], workbook_bytes)
+
+        cache_key = (self.current_thread, stat[0]) if stat else None
+        candidates = self.thread_workbooks.get(cache_key) if cache_key else None
+        digest = None
+        if candidates:
+            digest = self.workbook_digest(file_path)
+            for entry in candidates:
+                if entry['sha1'] is None:
+                    entry['sha1'] = self.workbook_digest(entry['path'], entry['stat']) or ''
+                if digest is not None and entry['sha1'] == digest:
+                    self.evaluation_stats['workbooks_reused'] += 1
+                    return entry['complete']
+
+        complete = self.read_slip_completeness(file_path)
+
+        if cache_key is not None:
+            if len(self.thread_workbooks) >= THREAD_CACHE_SIZE:
+                self.thread_workbooks.clear()
+            self.thread_workbooks.setdefault(cache_key, []).append(
+                {'path': file_path, 'stat': stat, 'sha1': digest, 'complete': complete}
+            )
+
+        return complete
+
+    def read_slip_completeness(self, file_path: Path):
+        """Abrir el libro Excel y contar celdas con datos"""
+        self.evaluation_stats['workbooks_opened'] += 1
+        try:
+            wb = openpyxl.load_workbook(file_path, data_only=True)
+            ws = wb.active
+            filled_cells = 0
+
+            for row in ws.iter_rows():
+                for cell in row:
+                    if cell.value is not None and str(cell.value).strip():
+                        filled_cells += 1
+
+            wb.close()
+
+            # Si tiene más de 5 celdas con datos, se considera completo
+            return filled_cells > 5
+        except:
+            return None
+
+    def check_slip_completeness(self, email_id: str, attachment_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Abrir los SLIP detectados por nombre y actualizar slip_complete"""
         attachment_dir = self.attachments_dir / email_id
-        attachment_info = {
+        for filename in attachment_info['slip_files']:
+            complete = self.slip_is_complete(attachment_dir / filename)
+            if complete is not None:
+                attachment_info['slip_complete'] = complete
+        return attachment_info
+
+    @staticmethod
+    def empty_attachment_info() -> Dict[str, Any]:
+        """Análisis de adjuntos vacío"""
+        return {
             'has_slip': False,
             'slip_complete': False,
             'slip_files': [],
@@ -196,6 +536,11 @@ class EmailClassifier:
             'total_attachments': 0
         }
 
+    def analyze_attachments(self, email_id: str, inspect_content: bool = True) -> Dict[str, Any]:
+        """Analizar adjuntos según criterios de aceptación"""
+        attachment_dir = self.attachments_dir / email_id
+        attachment_info = self.empty_attachment_info()
+
         if not attachment_dir.exists():
             return attachment_info
 
@@ -210,21 +555,10 @@ class EmailClassifier:
                     attachment_info['slip_files'].append(file_path.name)
 
                     # Criterio de aceptación 5 - Verificar si el SLIP está completo
-                    try:
-                        wb = openpyxl.load_workbook(file_path, data_only=True)
-                        ws = wb.active
-                        filled_cells = 0
-
-                        for row in ws.iter_rows():
-                            for cell in row:
-                                if cell.value is not None and str(cell.value).strip():
-                                    filled_cells += 1
-
-                        # Si tiene más de 5 celdas con datos, se considera completo
-                        attachment_info['slip_complete'] = filled_cells > 5
-                        wb.close()
-                    except:
-                        pass
+                    if inspect_content:
+                        complete = self.slip_is_complete(file_path)
+                        if complete is not None:
+                            attachment_info['slip_complete'] = complete
 
                 # Excel files en general
                 elif filename.endswith(('.XLSX', '.XLS')):
@@ -252,6 +586,214 @@ class EmailClassifier:
 
         return attachment_info
 
+    def subject_signals(self, metadata: Dict[str, Any]) -> Dict[str, bool]:
+        """Señales de las reglas que dependen solo del asunto"""
+        asunto = (metadata.get('subject') or '').upper()
+        return {
+            'cot_subject': self.matches_any('cotizacion_asunto', self.cotizacion_asunto_patterns, asunto),
+            'agente_subject': bool(self.extract_agente_code(asunto)),
+            'ren_subject': self.matches_any('renovacion_asunto', self.renovacion_asunto_patterns, asunto),
+            'poliza_subject': bool(self.extract_poliza_number(asunto)),
+            'end_subject': self.matches_any('endoso_asunto', self.endoso_asunto_patterns, asunto),
+            'subject_renovar': any(word in asunto for word in ['RENOVACION', 'RENOVAR']),
+            'subject_renovacion': 'RENOVACION' in asunto,
+            'subject_endoso_words': any(word in asunto for word in ['ENDOSO', 'MODIFICACION', 'CORRECCION'])
+        }
+
+    def attachment_signals(self, attachment_info: Dict[str, Any]) -> Dict[str, bool]:
+        """Señales de las reglas que dependen de los nombres de los adjuntos"""
+        return {
+            'has_slip': attachment_info['has_slip'],
+            'pdf_cotizacion': bool(attachment_info['pdf_cotizacion']),
+            'pdf_poliza': bool(attachment_info['pdf_poliza']),
+            'pdf_renovacion': bool(attachment_info['pdf_renovacion']),
+            'pdf_endoso': bool(attachment_info['pdf_endoso']),
+            'has_attachments': attachment_info['total_attachments'] > 0
+        }
+
+    def body_texts(self, email_content: Dict[str, str]):
+        """Texto nuevo y texto citado del cuerpo en mayúsculas (citado vacío si no se analiza)"""
+        cuerpo = email_content.get('new_text', '').upper()
+        citado = email_content.get('quoted_text', '').upper() if self.scan_quoted else ''
+        return cuerpo, citado
+
+    def matches_any(self, group: str, patterns: List[str], text: str) -> bool:
+        """True si algún patrón del grupo aparece en el texto"""
+        return bool(text) and any(self.search(group, p, text) for p in patterns)
+
+    def duplicate_signature(self, new_text: str, quoted_text: str) -> tuple:
+        """Palabras clave de las reglas de cuerpo en el texto de un posible casi duplicado
+
+        Sin parsear el HTML (texto de near_duplicates.body_text) y sin registrar en
+        el perfil: dos emails solo comparten resultado si coincide esta firma.
+        """
+        groups = (self.cotizacion_cuerpo_patterns, self.renovacion_cuerpo_patterns, self.endoso_cuerpo_patterns)
+        return tuple(bool(text) and any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+                     for text in (new_text, quoted_text) for patterns in groups)
+
+    def body_signals(self, email_content: Dict[str, str]) -> Dict[str, bool]:
+        """Señales de las reglas que dependen del cuerpo del email"""
+        cuerpo, citado = self.body_texts(email_content)
+        signals = {
+            'agente_body': bool(self.extract_agente_code(cuerpo) or self.extract_agente_code(citado)),
+            'cot_body': self.matches_any('cotizacion_cuerpo', self.cotizacion_cuerpo_patterns, cuerpo),
+            'poliza_body': bool(self.extract_poliza_number(cuerpo) or self.extract_poliza_number(citado)),
+            'ren_body': self.matches_any('renovacion_cuerpo', self.renovacion_cuerpo_patterns, cuerpo),
+            'end_body': self.matches_any('endoso_cuerpo', self.endoso_cuerpo_patterns, cuerpo)
+        }
+
+        # El historial citado solo se revisa para las reglas que no se cumplieron en el texto nuevo
+        quoted_patterns = {
+            'cot_quoted': ('cotizacion_citado', self.cotizacion_cuerpo_patterns),
+            'ren_quoted': ('renovacion_citado', self.renovacion_cuerpo_patterns),
+            'end_quoted': ('endoso_citado', self.endoso_cuerpo_patterns)
+        }
+        for quoted_signal, body_signal in QUOTED_SIGNALS.items():
+            signals[quoted_signal] = not signals[body_signal] and self.matches_any(*quoted_patterns[quoted_signal], citado)
+
+        return signals
+
+    @staticmethod
+    def rule_hits(signals: Dict[str, bool]) -> Dict[tuple, bool]:
+        """Reglas de SCORING_RULES que se cumplen según las señales"""
+        s = signals
+        poliza = s['poliza_subject'] or s['poliza_body']
+        return {
+            ('cotizacion', 'cot_subject'): s['cot_subject'],
+            ('cotizacion', 'agente'): s['agente_subject'] or s['agente_body'],
+            ('cotizacion', 'cot_body'): s['cot_body'],
+            ('cotizacion', 'cot_quoted'): s['cot_quoted'],
+            ('cotizacion', 'has_slip'): s['has_slip'],
+            ('cotizacion', 'slip_complete'): s['has_slip'] and s['slip_complete'],
+            ('cotizacion', 'pdf_cotizacion'): s['pdf_cotizacion'],
+            ('cotizacion', 'pdf_poliza'): s['pdf_poliza'],
+            ('renovacion', 'ren_subject'): s['ren_subject'],
+            ('renovacion', 'poliza'): poliza,
+            ('renovacion', 'ren_body'): s['ren_body'],
+            ('renovacion', 'ren_quoted'): s['ren_quoted'],
+            ('renovacion', 'pdf_renovacion'): s['pdf_renovacion'],
+            ('renovacion', 'poliza_docs_renovacion'): s['pdf_poliza'] and s['subject_renovar'],
+            ('renovacion', 'cotizacion_sin_renovacion'): s['pdf_cotizacion'] and not s['subject_renovacion'],
+            ('endoso', 'end_subject'): s['end_subject'],
+            ('endoso', 'end_body'): s['end_body'],
+            ('endoso', 'end_quoted'): s['end_quoted'],
+            ('endoso', 'poliza'): poliza,
+            ('endoso', 'pdf_endoso'): s['pdf_endoso'],
+            ('endoso', 'poliza_docs_endoso'): s['pdf_poliza'] and s['subject_endoso_words']
+        }
+
+    def score_outcome(self, signals: Dict[str, bool]):
+        """Clasificación principal y estado a partir de las señales (mismas reglas que classify_*)"""
+        s = signals
+        poliza = s['poliza_subject'] or s['poliza_body']
+
+        scores = dict.fromkeys(CATEGORIES, 0)
+        for (category, signal), hit in self.rule_hits(signals).items():
+            if hit:
+                scores[category] += self.rules[(category, signal)][0]
+
+        if s['has_slip']:
+            cot_status = 'Cotización con información completa' if s['slip_complete'] else 'Cotización pendiente'
+        else:
+            cot_status = 'Cotización detectada' if scores['cotizacion'] >= self.thresholds['cotizacion'] else ''
+
+        ren_status = ''
+        if scores['renovacion'] >= self.thresholds['renovacion']:
+            ren_status = 'Renovación con información completa' if s['has_attachments'] and poliza else 'Renovación pendiente'
+
+        end_status = ''
+        if scores['endoso'] >= self.thresholds['endoso']:
+            end_status = 'Endoso completo' if poliza and (s['pdf_endoso'] or s['pdf_poliza']) else 'Endoso incompleto'
+
+        candidates = [
+            ('cotizacion', min(100, scores['cotizacion']), cot_status),
+            ('renovacion', min(100, scores['renovacion']), ren_status),
+            ('endoso', min(100, scores['endoso']), end_status)
+        ]
+        candidates.sort(key=lambda x: x[1], reverse=True)
+        primary_type, confidence, status = candidates[0]
+
+        return (primary_type if confidence >= self.thresholds['primary'] else 'sin_clasificar', status)
+
+    def score_bounds(self, signals: Dict[str, bool], unknown: List[str]):
+        """Señales con las pendientes en False y en True, y puntaje mínimo y máximo de cada categoría
+
+        Todas las reglas crecen con las señales pendientes (cuerpo y contenido de los
+        SLIP; las negaciones solo usan señales del asunto), así que basta evaluarlas
+        dos veces: una regla que solo se cumple con las pendientes en True suma su peso
+        al máximo si es positivo y al mínimo si es negativo.
+        """
+        low_signals = dict(signals, **dict.fromkeys(unknown, False))
+        high_signals = dict(signals, **dict.fromkeys(unknown, True))
+        high_hits = self.rule_hits(high_signals)
+
+        low = dict.fromkeys(CATEGORIES, 0)
+        high = dict.fromkeys(CATEGORIES, 0)
+        for rule, hit in self.rule_hits(low_signals).items():
+            category, weight = rule[0], self.rules[rule][0]
+            if hit:
+                low[category] += weight
+                high[category] += weight
+            elif high_hits[rule]:
+                low[category] += min(0, weight)
+                high[category] += max(0, weight)
+
+        return low_signals, high_signals, low, high
+
+    def possible_outcomes(self, signals: Dict[str, bool], unknown: List[str]) -> set:
+        """Resultados principales (tipo, estado) posibles con las señales pendientes en cualquier valor
+
+        Cota superior del conjunto real (mismas reglas que score_outcome), calculada en
+        una pasada lineal sobre las reglas en lugar de probar cada combinación.
+        """
+        low_signals, high_signals, low, high = self.score_bounds(signals, unknown)
+        s = signals
+        polizas = {sig['poliza_subject'] or sig['poliza_body'] for sig in (low_signals, high_signals)}
+        slip_complete = {sig['slip_complete'] for sig in (low_signals, high_signals)}
+
+        def statuses(category):
+            threshold = self.thresholds[category]
+            passes = {score >= threshold for score in (low[category], high[category])}
+            if category == 'cotizacion':
+                if s['has_slip']:
+                    return {'Cotización con información completa' if complete else 'Cotización pendiente'
+                            for complete in slip_complete}
+                return {'Cotización detectada' if passed else '' for passed in passes}
+            options = {''} if False in passes else set()
+            if True in passes:
+                for poliza in polizas:
+                    if category == 'renovacion':
+                        options.add('Renovación con información completa' if s['has_attachments'] and poliza
+                                    else 'Renovación pendiente')
+                    else:
+                        options.add('Endoso completo' if poliza and (s['pdf_endoso'] or s['pdf_poliza'])
+                                    else 'Endoso incompleto')
+            return options
+
+        # Confianza acotada a 100; en empates gana la primera categoría (orden estable)
+        low = {category: min(100, score) for category, score in low.items()}
+        high = {category: min(100, score) for category, score in high.items()}
+
+        outcomes = set()
+        for position, category in enumerate(CATEGORIES):
+            beaten = any(
+                low[other] > high[category] or (low[other] == high[category] and other_position < position)
+                for other_position, other in enumerate(CATEGORIES) if other != category
+            )
+            if beaten:
+                continue
+            types = set()
+            if high[category] >= self.thresholds['primary']:
+                types.add(category)
+            if low[category] < self.thresholds['primary']:
+                types.add('sin_clasificar')
+            outcomes.update((primary_type, status) for primary_type in types for status in statuses(category))
+        return outcomes
+
+    def outcome_is_settled(self, signals: Dict[str, bool], unknown: List[str]) -> bool:
+        """True si ningún valor posible de las señales pendientes cambia el resultado principal"""
+        return len(self.possible_outcomes(signals, unknown)) == 1
+
     def classify_cotizacion(self, metadata: Dict[str, Any], attachment_info: Dict[str, Any], email_content: Dict[str, str]) -> Dict[str, Any]:
         """Clasificar email como cotización según criterios de aceptación"""
         classification = {
@@ -265,57 +807,51 @@ class EmailClassifier:
         }
 
         asunto = metadata.get('subject', '').upper()
-        cuerpo = email_content.get('combined_text', '').upper()
+        cuerpo, citado = self.body_texts(email_content)
 
         score = 0
 
         # Criterio de aceptación 1 - Palabras clave en asunto
         for pattern in self.cotizacion_asunto_patterns:
-            if re.search(pattern, asunto, re.IGNORECASE):
-                score += 30
-                classification['criteria_met'].append('CA1: Palabra clave en asunto')
+            if self.search('cotizacion_asunto', pattern, asunto):
+                score += self.apply_rule(classification, 'cotizacion', 'cot_subject')
                 break
 
         # Criterio de aceptación 2 - Código de agente en asunto o cuerpo
-        agente_code = self.extract_agente_code(asunto) or self.extract_agente_code(cuerpo)
+        agente_code = self.extract_agente_code(asunto) or self.extract_agente_code(cuerpo) or self.extract_agente_code(citado)
         if agente_code:
             classification['agente_code'] = agente_code
-            score += 20
-            classification['criteria_met'].append('CA2: Código de agente detectado')
+            score += self.apply_rule(classification, 'cotizacion', 'agente')
 
         # Criterio de aceptación 3 - Palabras clave en cuerpo del mensaje
-        for pattern in self.cotizacion_cuerpo_patterns:
-            if re.search(pattern, cuerpo, re.IGNORECASE):
-                score += 15
-                classification['criteria_met'].append('CA3: Palabra clave en cuerpo del email')
-                break
+        # (primero el texto nuevo; el historial citado pesa menos)
+        if self.matches_any('cotizacion_cuerpo', self.cotizacion_cuerpo_patterns, cuerpo):
+            score += self.apply_rule(classification, 'cotizacion', 'cot_body')
+        elif self.matches_any('cotizacion_citado', self.cotizacion_cuerpo_patterns, citado):
+            score += self.apply_rule(classification, 'cotizacion', 'cot_quoted')
 
         # Criterio de aceptación 4 - SLIP presente
         if attachment_info['has_slip']:
-            score += 25
-            classification['criteria_met'].append('CA4: Archivo SLIP detectado')
+            score += self.apply_rule(classification, 'cotizacion', 'has_slip')
 
             # Criterio de aceptación 5 - SLIP completo o vacío
             if attachment_info['slip_complete']:
                 classification['status'] = 'Cotización con información completa'
-                score += 15
-                classification['criteria_met'].append('CA5: SLIP completo')
+                score += self.apply_rule(classification, 'cotizacion', 'slip_complete')
             else:
                 classification['status'] = 'Cotización pendiente'
                 classification['criteria_met'].append('CA5: SLIP vacío o incompleto')
 
         # Criterio de aceptación 6 - PDFs de cotización
         if attachment_info['pdf_cotizacion']:
-            score += 20
-            classification['criteria_met'].append('CA6: PDF de cotización presente')
+            score += self.apply_rule(classification, 'cotizacion', 'pdf_cotizacion')
 
         # Criterio de aceptación 7 y 10 - Excluir pólizas vigentes
         if attachment_info['pdf_poliza']:
-            score -= 15
-            classification['criteria_met'].append('CA7/CA10: Contiene documentos de póliza vigente')
+            score += self.apply_rule(classification, 'cotizacion', 'pdf_poliza')
 
         classification['confidence'] = min(100, score)
-        classification['is_cotizacion'] = score >= 40
+        classification['is_cotizacion'] = score >= self.thresholds['cotizacion']
 
         if not classification['status'] and classification['is_cotizacion']:
             classification['status'] = 'Cotización detectada'
@@ -341,47 +877,42 @@ class EmailClassifier:
         }
 
         asunto = metadata.get('subject', '').upper()
-        cuerpo = email_content.get('combined_text', '').upper()
+        cuerpo, citado = self.body_texts(email_content)
         score = 0
 
         # Criterio de aceptación 1 - Palabras clave en asunto
         for pattern in self.renovacion_asunto_patterns:
-            if re.search(pattern, asunto, re.IGNORECASE):
-                score += 35
-                classification['criteria_met'].append('CA1: Palabra clave de renovación en asunto')
+            if self.search('renovacion_asunto', pattern, asunto):
+                score += self.apply_rule(classification, 'renovacion', 'ren_subject')
                 break
 
         # Criterio de aceptación 2 - Número de póliza en asunto o cuerpo
-        poliza_number = self.extract_poliza_number(asunto) or self.extract_poliza_number(cuerpo)
+        poliza_number = self.extract_poliza_number(asunto) or self.extract_poliza_number(cuerpo) or self.extract_poliza_number(citado)
         if poliza_number:
             classification['poliza_number'] = poliza_number
-            score += 20
-            classification['criteria_met'].append('CA2: Número de póliza detectado')
+            score += self.apply_rule(classification, 'renovacion', 'poliza')
 
         # Criterios de aceptación 4, 5 y 6 - Palabras clave en cuerpo
-        for pattern in self.renovacion_cuerpo_patterns:
-            if re.search(pattern, cuerpo, re.IGNORECASE):
-                score += 15
-                classification['criteria_met'].append('CA4-6: Palabra clave de renovación en cuerpo')
-                break
+        # (primero el texto nuevo; el historial citado pesa menos)
+        if self.matches_any('renovacion_cuerpo', self.renovacion_cuerpo_patterns, cuerpo):
+            score += self.apply_rule(classification, 'renovacion', 'ren_body')
+        elif self.matches_any('renovacion_citado', self.renovacion_cuerpo_patterns, citado):
+            score += self.apply_rule(classification, 'renovacion', 'ren_quoted')
 
         # CA-Adjuntos 1 - PDFs de renovación
         if attachment_info['pdf_renovacion']:
-            score += 25
-            classification['criteria_met'].append('CA-Adj1: PDF de renovación presente')
+            score += self.apply_rule(classification, 'renovacion', 'pdf_renovacion')
 
         # CA-Adjuntos 2 - Documentos de póliza con mención de renovación
         if attachment_info['pdf_poliza'] and any(word in asunto for word in ['RENOVACION', 'RENOVAR']):
-            score += 20
-            classification['criteria_met'].append('CA-Adj2: Documentos de póliza + renovación')
+            score += self.apply_rule(classification, 'renovacion', 'poliza_docs_renovacion')
 
         # CA-Adjuntos 5 - Prevenir falsos positivos con cotización
         if attachment_info['pdf_cotizacion'] and 'RENOVACION' not in asunto:
-            score -= 20
-            classification['criteria_met'].append('CA-Adj5: Prevención falso positivo cotización')
+            score += self.apply_rule(classification, 'renovacion', 'cotizacion_sin_renovacion')
 
         classification['confidence'] = min(100, score)
-        classification['is_renovacion'] = score >= 40
+        classification['is_renovacion'] = score >= self.thresholds['renovacion']
 
         # Criterio de aceptación 10 - Determinar estado
         if classification['is_renovacion']:
@@ -412,15 +943,14 @@ class EmailClassifier:
         }
 
         asunto = metadata.get('subject', '').upper()
-        cuerpo = email_content.get('combined_text', '').upper()
+        cuerpo, citado = self.body_texts(email_content)
         score = 0
 
         # Criterio de aceptación 1 y 2 - Palabras clave en asunto
         for pattern in self.endoso_asunto_patterns:
-            match = re.search(pattern, asunto, re.IGNORECASE)
+            match = self.search('endoso_asunto', pattern, asunto)
             if match:
-                score += 35
-                classification['criteria_met'].append('CA1-2: Palabra clave de endoso en asunto')
+                score += self.apply_rule(classification, 'endoso', 'end_subject')
 
                 # Detectar tipo de endoso específico
                 if 'ENDOSO A' in asunto:
@@ -434,31 +964,28 @@ class EmailClassifier:
                 break
 
         # Criterio de aceptación 3 y 4 - Palabras clave en cuerpo del mensaje
-        for pattern in self.endoso_cuerpo_patterns:
-            if re.search(pattern, cuerpo, re.IGNORECASE):
-                score += 15
-                classification['criteria_met'].append('CA3-4: Palabra clave de endoso en cuerpo')
-                break
+        # (primero el texto nuevo; el historial citado pesa menos)
+        if self.matches_any('endoso_cuerpo', self.endoso_cuerpo_patterns, cuerpo):
+            score += self.apply_rule(classification, 'endoso', 'end_body')
+        elif self.matches_any('endoso_citado', self.endoso_cuerpo_patterns, citado):
+            score += self.apply_rule(classification, 'endoso', 'end_quoted')
 
         # Criterio de aceptación 5 - Referencia a póliza vigente
-        poliza_number = self.extract_poliza_number(asunto) or self.extract_poliza_number(cuerpo)
+        poliza_number = self.extract_poliza_number(asunto) or self.extract_poliza_number(cuerpo) or self.extract_poliza_number(citado)
         if poliza_number:
             classification['poliza_number'] = poliza_number
-            score += 25
-            classification['criteria_met'].append('CA5: Referencia a póliza vigente')
+            score += self.apply_rule(classification, 'endoso', 'poliza')
 
         # Criterio de aceptación 7 - PDFs de endoso
         if attachment_info['pdf_endoso']:
-            score += 20
-            classification['criteria_met'].append('CA7: PDF de endoso presente')
+            score += self.apply_rule(classification, 'endoso', 'pdf_endoso')
 
         # Criterio de aceptación 8 - Documentos de respaldo
         if attachment_info['pdf_poliza'] and any(word in asunto for word in ['ENDOSO', 'MODIFICACION', 'CORRECCION']):
-            score += 15
-            classification['criteria_met'].append('CA8: Documentos de respaldo de endoso')
+            score += self.apply_rule(classification, 'endoso', 'poliza_docs_endoso')
 
         classification['confidence'] = min(100, score)
-        classification['is_endoso'] = score >= 30
+        classification['is_endoso'] = score >= self.thresholds['endoso']
 
         # Criterio de aceptación 10 - Determinar completitud
         if classification['is_endoso']:
@@ -475,26 +1002,247 @@ class EmailClassifier:
 
         return classification
 
-    def classify_email(self, email_id: str) -> Dict[str, Any]:
-        """Clasificar un email individual"""
-        # Cargar metadatos
+    def read_body(self, email_id: str) -> Dict[str, str]:
+        """Extraer el cuerpo respetando el presupuesto de tamaño del .eml"""
+        eml_file = self.output_dir / "emails" / f"{email_id}.eml"
+        if self.budgets_enabled and eml_file.exists():
+            body_bytes = eml_file.stat().st_size
+            if body_bytes > self.size_budgets['body_bytes']:
+                raise BudgetExceeded('body', 'bytes', self.size_budgets['body_bytes'], body_bytes)
+        return self.extract_email_content(email_id)
+
+    def on_budget_alarm(self, signum, frame):
+        """SIGALRM: interrumpir la etapa en curso al agotarse su presupuesto"""
+        self.budget_expired = True
+        raise BudgetExceeded(self.current_stage, 'segundos', None, None)
+
+    def run_stage(self, stage: str, func, *args):
+        """Ejecutar una etapa con su presupuesto de tiempo y registrar su duración
+
+        El límite es el menor entre el presupuesto de la etapa y lo que queda del
+        presupuesto del email. En el hilo principal (Unix) la etapa se interrumpe
+        con SIGALRM; en otro caso el exceso se detecta al terminar la etapa.
+        """
+        start = time.perf_counter()
+        limit = None
+        if self.budgets_enabled:
+            limit = min(self.stage_budgets.get(stage, self.email_time_budget), self.email_deadline - start)
+            if limit <= 0:
+                raise BudgetExceeded(stage, 'segundos', round(self.email_time_budget, 3), round(self.email_time_budget - limit, 3))
+
+        use_alarm = (
+            limit is not None
+            and hasattr(signal, 'setitimer')
+            and threading.current_thread() is threading.main_thread()
+        )
+        self.current_stage = stage
+        self.budget_expired = False
+        if use_alarm:
+            previous_handler = signal.signal(signal.SIGALRM, self.on_budget_alarm)
+            signal.setitimer(signal.ITIMER_REAL, limit)
+
+        try:
+            return func(*args)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+
+            elapsed = time.perf_counter() - start
+            self.stage_timings[stage] = round(self.stage_timings.get(stage, 0) + elapsed * 1000, 3)
+            if self.profiler and stage != 'body':
+                self.profiler.record_stage(stage, elapsed)
+
+            # Algunas etapas capturan cualquier excepción (p. ej. openpyxl); el
+            # indicador asegura que el exceso no se pierda
+            if limit is not None and (self.budget_expired or elapsed > limit):
+                raise BudgetExceeded(stage, 'segundos', round(limit, 3), round(elapsed, 3))
+
+    def degraded_inputs(self, email_id: str, exceeded: BudgetExceeded):
+        """Contenido y adjuntos para la clasificación degradada (solo señales baratas)"""
+        email_content = {'plain_text': '', 'html_content': '', 'combined_text': '', 'new_text': '', 'quoted_text': ''}
+        if exceeded.stage == 'attachment_names':
+            attachment_info = self.empty_attachment_info()
+        else:
+            attachment_info = self.analyze_attachments(email_id, inspect_content=False)
+        return email_content, attachment_info
+
+    def record_quarantine(self, email_id: str, metadata: Dict[str, Any], exceeded: BudgetExceeded):
+        """Registrar un email que excedió su presupuesto"""
+        eml_file = self.output_dir / "emails" / f"{email_id}.eml"
+        self.quarantine[email_id] = {
+            'email_id': email_id,
+            'stage': exceeded.stage,
+            'reason': exceeded.reason,
+            'limit': exceeded.limit,
+            'value': exceeded.value,
+            'timings_ms': dict(self.stage_timings),
+            'subject_chars': len(metadata.get('subject') or ''),
+            'eml_bytes': eml_file.stat().st_size if eml_file.exists() else 0,
+            'quarantined_at': datetime.now().isoformat()
+        }
+
+    def save_quarantine(self, processed_ids) -> Path:
+        """Actualizar quarantine.json con los emails procesados en esta ejecución"""
+        quarantine_file = self.classification_dir / QUARANTINE_FILENAME
+        entries = {}
+        if quarantine_file.exists():
+            try:
+                with open(quarantine_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get('emails', {})
+            except:
+                entries = {}
+
+        processed_ids = set(processed_ids)
+        entries = {email_id: entry for email_id, entry in entries.items() if email_id not in processed_ids}
+        for email_id, entry in self.quarantine.items():
+            if email_id in processed_ids:
+                entry['attempts'] = entry.get('attempts', 0) + 1
+                entries[email_id] = entry
+
+        with open(quarantine_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated': datetime.now().isoformat(),
+                'budgets': {
+                    'email_seconds': self.email_time_budget,
+                    'stage_seconds': self.stage_budgets,
+                    'sizes': self.size_budgets
+                },
+                'total': len(entries),
+                'emails': entries
+            }, f, indent=2, ensure_ascii=False)
+
+        return quarantine_file
+
+    def get_catalog(self):
+        """Catálogo de metadatos al día con metadata/ (None si no se pudo abrir)"""
+        if self.catalog is None:
+            self.catalog = load_catalog(self.output_dir) or False
+        return self.catalog or None
+
+    def load_metadata(self, email_id: str):
+        """Metadatos de un email desde el catálogo o, si no está, desde su JSON"""
+        catalog = self.get_catalog()
+        if catalog:
+            metadata = catalog.get_metadata(email_id)
+            if metadata is not None:
+                return metadata
+
         metadata_file = self.metadata_dir / f"{email_id}.json"
         if not metadata_file.exists():
+            return None
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def classify_or_reuse(self, email_id: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Clasificar un email o, si es casi duplicado de uno ya analizado, reutilizar su resultado"""
+        if self.duplicates is None:
+            return self.classify_email(email_id, metadata)
+
+        if metadata is None:
+            metadata = self.load_metadata(email_id)
+        if metadata is None:
             return {'error': f'Metadatos no encontrados para {email_id}'}
 
-        with open(metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        # Clave de asunto y adjuntos; el texto MIME (sin parsear el HTML) solo se lee
+        # si otro email comparte la clave. Si excede su presupuesto se analiza completo
+        self.email_deadline = time.perf_counter() + self.email_time_budget
+        try:
+            match = self.run_stage('duplicates', self.duplicates.match, email_id, metadata)
+        except BudgetExceeded:
+            return self.classify_email(email_id, metadata)
+
+        if match:
+            representative, distance = match
+            self.duplicates.add_member(email_id, representative)
+            return self.reuse_classification(email_id, metadata, self.duplicate_results[representative], distance)
+
+        result = self.classify_email(email_id, metadata)
+        if 'error' not in result and 'degraded' not in result:
+            self.duplicates.add_representative(email_id)
+            self.duplicate_results[email_id] = result
+        return result
 
-        # Extraer contenido del email
-        email_content = self.extract_email_content(email_id)
+    def reuse_classification(self, email_id: str, metadata: Dict[str, Any], representative: Dict[str, Any], distance: int) -> Dict[str, Any]:
+        """Resultado de un casi duplicado: el análisis del representante con sus propios metadatos e hilo"""
+        self.evaluation_stats['emails'] += 1
+        self.evaluation_stats['duplicates_reused'] += 1
+        self.quarantine.pop(email_id, None)
+        text_similarity = similarity(distance)
 
-        # Analizar adjuntos
-        attachment_info = self.analyze_attachments(email_id)
+        result = {
+            'email_id': email_id,
+            'thread_id': thread_id_for(dict(metadata, id=metadata.get('id', email_id))),
+            'metadata': metadata
+        }
+        for field in ('entities', 'attachment_analysis', 'classifications', 'primary_classification'):
+            result[field] = copy.deepcopy(representative[field])
+        result['duplicate_of'] = {
+            'email_id': representative['email_id'],
+            'similarity': text_similarity,
+            'note': (f"Clasificación reutilizada de {representative['email_id']}: casi duplicado "
+                     f"(texto {text_similarity:.0%} similar, mismo asunto, adjuntos, números y palabras clave)")
+        }
+        return result
+
+    def classify_email(self, email_id: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Clasificar un email individual (metadata se carga si no se pasa)"""
+        # Cargar metadatos
+        if metadata is None:
+            metadata = self.load_metadata(email_id)
+        if metadata is None:
+            return {'error': f'Metadatos no encontrados para {email_id}'}
+
+        email_start = time.perf_counter()
+        if self.profiler:
+            self.profiler.start_email(email_id)
+        self.evaluation_stats['emails'] += 1
+        self.current_thread = thread_id_for(dict(metadata, id=metadata.get('id', email_id)))
+        self.quarantine.pop(email_id, None)
+        self.stage_timings = {}
+        self.email_deadline = time.perf_counter() + self.email_time_budget
+        evaluation = None
+        degraded = None
+
+        # Los patrones de asunto con .* no se pueden interrumpir: se limita su entrada
+        rules_metadata = metadata
+        subject = metadata.get('subject') or ''
+        subject_limit = self.size_budgets['subject_chars']
+        if self.budgets_enabled and len(subject) > subject_limit:
+            rules_metadata = dict(metadata, subject=subject[:subject_limit])
+
+        try:
+            if rules_metadata is not metadata:
+                raise BudgetExceeded('subject', 'caracteres', subject_limit, len(subject))
+
+            if self.lazy_evaluation:
+                email_content, attachment_info, evaluation = self.evaluate_signals_lazily(email_id, rules_metadata)
+            else:
+                # Extraer contenido del email
+                email_content = self.run_stage('body', self.read_body, email_id)
+                self.evaluation_stats['body_parsed'] += 1
+
+                # Analizar adjuntos (nombres y después contenido de los SLIP)
+                attachment_info = self.run_stage('attachment_names', self.analyze_attachments, email_id, False)
+                if attachment_info['has_slip']:
+                    self.run_stage('workbooks', self.check_slip_completeness, email_id, attachment_info)
+
+        except BudgetExceeded as exceeded:
+            # Clasificación degradada con señales baratas y registro en cuarentena
+            email_content, attachment_info = self.degraded_inputs(email_id, exceeded)
+            evaluation = None
+            self.record_quarantine(email_id, metadata, exceeded)
+            degraded = {
+                'stage': exceeded.stage,
+                'reason': exceeded.reason,
+                'signals': ['subject'] + (['attachment_names'] if exceeded.stage != 'attachment_names' else [])
+            }
 
         # Realizar clasificaciones
-        cotizacion = self.classify_cotizacion(metadata, attachment_info, email_content)
-        renovacion = self.classify_renovacion(metadata, attachment_info, email_content)
-        endoso = self.classify_endoso(metadata, attachment_info, email_content)
+        scoring_start = time.perf_counter()
+        cotizacion = self.classify_cotizacion(rules_metadata, attachment_info, email_content)
+        renovacion = self.classify_renovacion(rules_metadata, attachment_info, email_content)
+        endoso = self.classify_endoso(rules_metadata, attachment_info, email_content)
 
         # Determinar clasificación principal
         classifications = [
@@ -510,7 +1258,9 @@ class EmailClassifier:
 
         result = {
             'email_id': email_id,
+            'thread_id': self.current_thread,
             'metadata': metadata,
+            'entities': self.extract_entities(rules_metadata, email_content),
             'attachment_analysis': attachment_info,
             'classifications': {
                 'cotizacion': cotizacion,
@@ -518,55 +1268,202 @@ class EmailClassifier:
                 'endoso': endoso
             },
             'primary_classification': {
-                'type': primary_class[0] if primary_class[1]['confidence'] >= 30 else 'sin_clasificar',
+                'type': primary_class[0] if primary_class[1]['confidence'] >= self.thresholds['primary'] else 'sin_clasificar',
                 'confidence': primary_class[1]['confidence'],
                 'status': primary_class[1].get('status', ''),
                 'details': primary_class[1]
             }
         }
 
+        if evaluation:
+            result['evaluation'] = evaluation
+        if degraded:
+            result['degraded'] = degraded
+
+        self.record_stage('scoring', scoring_start)
+        self.record_stage('total', email_start)
+
         return result
 
-    def classify_all_emails(self) -> Dict[str, Any]:
-        """Clasificar todos los emails procesados"""
+    def evaluate_signals_lazily(self, email_id: str, metadata: Dict[str, Any]):
+        """Calcular señales de menor a mayor costo: asunto, nombres de adjuntos, cuerpo, contenido de Excel
+
+        Se detiene en cuanto la clasificación principal y su estado no pueden cambiar.
+        Las confianzas de las etapas omitidas quedan como cotas inferiores.
+        """
+        email_content = {'plain_text': '', 'html_content': '', 'combined_text': '', 'new_text': '', 'quoted_text': ''}
+        stages = ['subject', 'attachment_names']
+
+        # Etapas 1 y 2 - Asunto y nombres de adjuntos (sin abrir archivos)
+        attachment_info = self.run_stage('attachment_names', self.analyze_attachments, email_id, False)
+        signals = self.subject_signals(metadata)
+        signals.update(self.attachment_signals(attachment_info))
+
+        pending_content = CONTENT_SIGNALS if attachment_info['has_slip'] else []
+        if not pending_content:
+            signals['slip_complete'] = False
+
+        # Sin análisis del historial citado, sus señales se conocen de antemano
+        if not self.scan_quoted:
+            signals.update(dict.fromkeys(QUOTED_SIGNALS, False))
+        body_pending = [name for name in BODY_SIGNALS if name not in signals]
+
+        # Etapa 3 - Cuerpo del email (MIME + HTML)
+        if self.outcome_is_settled(signals, body_pending + pending_content):
+            self.evaluation_stats['body_skipped'] += 1
+        else:
+            email_content = self.run_stage('body', self.read_body, email_id)
+            self.evaluation_stats['body_parsed'] += 1
+            signals.update(self.body_signals(email_content))
+            stages.append('body')
+
+        # Etapa 4 - Contenido de los SLIP (openpyxl)
+        if pending_content:
+            body_pending = [name for name in BODY_SIGNALS if name not in signals]
+            if self.outcome_is_settled(signals, body_pending + pending_content):
+                self.evaluation_stats['workbooks_skipped'] += len(attachment_info['slip_files'])
+            else:
+                self.run_stage('workbooks', self.check_slip_completeness, email_id, attachment_info)
+                stages.append('workbooks')
+
+        evaluation = {
+            'mode': 'lazy',
+            'stages': stages,
+            'complete': 'body' in stages and (not pending_content or 'workbooks' in stages)
+        }
+
+        return email_content, attachment_info, evaluation
+
+    def classify_all_emails(self, progress=None) -> Dict[str, Any]:
+        """Clasificar todos los emails procesados
+
+        progress(procesados, total, mensaje=None) se llama después de cada email
+        (trabajos en segundo plano del dashboard, ver background_jobs.py).
+
+        Lo que se guarda aquí (resultados, matriz de reglas, cubo, índice de
+        entidades, historial) se evalúa siempre con todas las señales: la
+        evaluación perezosa solo aplica a classify_email (servicio, benchmark).
+        """
         results = {
             'total_emails': 0,
+            'total_threads': 0,
             'cotizacion': 0,
             'renovacion': 0,
             'endoso': 0,
             'sin_clasificar': 0,
+            'quarantined': 0,
+            'duplicates': 0,
             'emails': []
         }
 
-        if not self.metadata_dir.exists():
-            return {'error': 'Directorio de metadatos no encontrado'}
-
-        for metadata_file in self.metadata_dir.glob('*.json'):
-            if metadata_file.name == 'progress.json':
-                continue
-
-            email_id = metadata_file.stem
-            classification = self.classify_email(email_id)
-
-            if 'error' not in classification:
-                results['emails'].append(classification)
-                results['total_emails'] += 1
-
-                # Contar por categoría
-                primary_type = classification['primary_classification']['type']
-                if primary_type in results:
-                    results[primary_type] += 1
-
-        # Guardar resultados
-        results_file = self.classification_dir / 'classification_results.json'
-        with open(results_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
-
-        return results
-
-    def generate_report(self) -> str:
+        with results_lock(self.classification_dir), self.full_evaluation():
+            if not self.metadata_dir.exists():
+                return {'error': 'Directorio de metadatos no encontrado'}
+
+            # Grupos de casi duplicados por ejecución
+            if self.duplicates is not None:
+                self.duplicates = NearDuplicateDetector(self.output_dir, self.duplicates.max_distance,
+                                                        self.duplicate_signature)
+                self.duplicate_results = {}
+            reused_before = self.evaluation_stats['duplicates_reused']
+
+            # Con catálogo: una sola consulta en lugar de abrir un JSON por email
+            catalog = self.get_catalog()
+            if catalog:
+                total = catalog.count()
+                pending = ((metadata['id'], metadata) for metadata in catalog.iter_metadata())
+            else:
+                pending = [
+                    (metadata_file.stem, None) for metadata_file in self.metadata_dir.glob('*.json')
+                    if metadata_file.name != 'progress.json'
+                ]
+                total = len(pending)
+
+            for processed, (email_id, metadata) in enumerate(pending, start=1):
+                classification = self.classify_or_reuse(email_id, metadata)
+                if progress:
+                    progress(processed, total)
+
+                if 'error' not in classification:
+                    results['emails'].append(classification)
+                    results['total_emails'] += 1
+
+                    # Contar por categoría
+                    primary_type = classification['primary_classification']['type']
+                    if primary_type in results:
+                        results[primary_type] += 1
+
+            results['total_threads'] = len({email['thread_id'] for email in results['emails']})
+            results['duplicates'] = self.evaluation_stats['duplicates_reused'] - reused_before
+
+            if progress:
+                progress(total, total, 'Guardando resultados')
+
+            # Emails que excedieron su presupuesto (reprocesar con reprocess_quarantine.py)
+            results['quarantined'] = len(self.quarantine)
+            self.save_quarantine(email['email_id'] for email in results['emails'])
+
+            # Versión en el historial (solo los emails cuya clasificación cambió), antes de
+            # sobrescribir los resultados: si falla, record_classification_run respalda los anteriores
+            record_classification_run(self, results['emails'], 'classify_all_emails', summary={
+                category: results[category] for category in CATEGORIES + ['sin_clasificar']
+            })
+
+            # Guardar resultados
+            results_file = self.classification_dir / 'classification_results.json'
+            stamp_results(results)
+            with open(results_file, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+
+            # Snapshot binario para el arranque rápido del dashboard
+            write_snapshot(results, results_file)
+
+            # Matriz de reglas cumplidas para análisis what-if de pesos y umbrales
+            self.save_feature_matrix(results['emails'])
+
+            # Cubo de agregados (día × clasificación × carpeta × agente × SLIP) para /api/aggregate
+            save_cube_for_results(self.classification_dir, results['emails'])
+
+            # Grupos de casi duplicados de esta ejecución
+            if self.duplicates is not None:
+                self.duplicates.save(self.classification_dir)
+
+            # Índice invertido de pólizas y códigos de agente para /api/entities
+            save_entity_index_for_results(self.classification_dir, results['emails'])
+
+            # Perfil de patrones y etapas (--profile)
+            if self.profiler:
+                self.profiler.save(self.classification_dir)
+
+            return results
+
+    def save_feature_matrix(self, emails: List[Dict[str, Any]]) -> Path:
+        """Guardar la matriz binaria de reglas cumplidas por email (NumPy .npz)"""
+        features = np.zeros((len(emails), len(SCORING_RULES)), dtype=np.uint8)
+        email_ids = []
+        primary_types = []
+
+        for row, email_result in enumerate(emails):
+            email_ids.append(email_result['email_id'])
+            primary_types.append(email_result['primary_classification']['type'])
+            classifications = email_result.get('classifications', {})
+            for column, (category, _signal, _weight, criterion) in enumerate(SCORING_RULES):
+                if criterion in classifications.get(category, {}).get('criteria_met', []):
+                    features[row, column] = 1
+
+        matrix_file = self.classification_dir / FEATURE_MATRIX_FILENAME
+        np.savez_compressed(
+            matrix_file,
+            features=features,
+            email_ids=np.array(email_ids, dtype=str),
+            primary_types=np.array(primary_types, dtype=str),
+            rules=np.array([f"{category}.{signal}" for category, signal, _, _ in SCORING_RULES], dtype=str)
+        )
+        return matrix_file
+
+    def generate_report(self, progress=None) -> str:
         """Generar reporte de clasificación"""
-        results = self.classify_all_emails()
+        results = self.classify_all_emails(progress)
 
         if 'error' in results:
             return f"Error: {results['error']}"
@@ -581,6 +1478,8 @@ REPORTE DE CLASIFICACIÓN AUTOMÁTICA DE CORREOS
 - Renovaciones: {results['renovacion']} ({results['renovacion']/results['total_emails']*100:.1f}%)
 - Endosos: {results['endoso']} ({results['endoso']/results['total_emails']*100:.1f}%)
 - Sin clasificar: {results['sin_clasificar']} ({results['sin_clasificar']/results['total_emails']*100:.1f}%)
+- En cuarentena (clasificación degradada): {results['quarantined']}
+- Casi duplicados (clasificación reutilizada): {results['duplicates']}
 
 📋 DETALLE POR CATEGORÍA:
 
@@ -611,6 +1510,10 @@ COTIZACIONES ({results['cotizacion']} emails):
         if len(endosos) > 5:
             report += f"  ... y {len(endosos) - 5} más\n"
 
+        if self.profiler:
+            report += "\n" + summary_table(self.profiler.to_dict()) + "\n"
+            report += f"\n📈 Perfil guardado en: {self.classification_dir}/rule_profile.json (y .csv)\n"
+
         report += f"\n💾 Resultados detallados guardados en: {self.classification_dir}/classification_results.json\n"
 
         return report
@@ -621,7 +1524,14 @@ def main():
     print("🔍 CLASIFICADOR AUTOMÁTICO DE CORREOS DE SEGUROS")
     print("=" * 60)
 
-    classifier = EmailClassifier()
+    # --no-quoted: ignorar el historial citado de respuestas y reenvíos
+    # --profile: contar coincidencias y tiempo por patrón y por etapa
+    # --no-dedup: analizar completo cada casi duplicado (reenvíos, copias CC)
+    classifier = EmailClassifier(
+        scan_quoted='--no-quoted' not in sys.argv,
+        profile='--profile' in sys.argv,
+        dedup='--no-dedup' not in sys.argv
+    )
 
     print("Iniciando clasificación de todos los emails...")
     report = classifier.generate_report()
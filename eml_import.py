@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Importación de Archivos EML
+Escribe un email recibido como .eml (y adjuntos opcionales adicionales) con la
+misma estructura que el extractor de PST: emails/<id>.eml, attachments/<id>/
+y metadata/<id>.json, para que el clasificador y el dashboard lo lean igual
+que un email extraído
+"""
+
+import base64
+import email
+import email.policy
+import json
+import re
+from datetime import datetime, timezone
+from email.utils import parseaddr, parsedate_to_datetime
+from pathlib import Path
+
+from thread_index import thread_id_for
+
+# Caracteres no permitidos en nombres de adjuntos
+UNSAFE_FILENAME_PATTERN = re.compile(r'[\x00-\x1f<>:"|?*]')
+
+
+def safe_filename(filename, index):
+    """Nombre de adjunto sin rutas ni caracteres de control"""
+    name = UNSAFE_FILENAME_PATTERN.sub('_', (filename or '').replace('\\', '/').split('/')[-1]).strip(' .')
+    return name or f"attachment_{index}"
+
+
+def unique_filename(used, filename):
+    """Evitar que dos adjuntos con el mismo nombre se sobrescriban"""
+    candidate = filename
+    stem, dot, suffix = filename.rpartition('.')
+    number = 2
+    while candidate.upper() in used:
+        candidate = f"{stem} ({number}).{suffix}" if dot else f"{filename} ({number})"
+        number += 1
+    used.add(candidate.upper())
+    return candidate
+
+
+def parse_delivery_time(value):
+    """Fecha del encabezado Date en ISO, en UTC sin zona como el extractor (None si no se puede leer)"""
+    if not value:
+        return None
+    try:
+        delivery = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError, IndexError):
+        return None
+    if delivery.tzinfo is not None:
+        delivery = delivery.astimezone(timezone.utc).replace(tzinfo=None)
+    return delivery.isoformat()
+
+
+def conversation_index_hex(value):
+    """Thread-Index de Outlook (base64) como el PR_CONVERSATION_INDEX hexadecimal del extractor"""
+    if not value:
+        return None
+    try:
+        return base64.b64decode(str(value).strip(), validate=False).hex() or None
+    except (ValueError, TypeError):
+        return None
+
+
+def mime_attachments(message):
+    """Adjuntos del mensaje: [(nombre, bytes)]"""
+    attachments = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        if not filename and part.get_content_disposition() != 'attachment':
+            continue
+        attachments.append((filename, part.get_payload(decode=True) or b''))
+    return attachments
+
+
+def eml_metadata(message, email_id, folder, size):
+    """Metadatos con los mismos campos que PSTExtractor.extract_metadata"""
+    sender_name, sender_email = parseaddr(str(message.get('From', '')))
+    delivery_time = parse_delivery_time(message.get('Date'))
+    metadata = {
+        'id': email_id,
+        'folder': folder,
+        'extraction_date': datetime.now().isoformat(),
+        'subject': str(message.get('Subject', '')),
+        'sender_name': sender_name or sender_email,
+        'sender_email': sender_email,
+        'delivery_time': delivery_time,
+        'creation_time': delivery_time,
+        'modification_time': delivery_time,
+        'size': size
+    }
+
+    # Propiedades de conversación de Outlook (si el cliente las incluyó)
+    if message.get('Thread-Topic'):
+        metadata['conversation_topic'] = str(message.get('Thread-Topic'))
+    conversation_index = conversation_index_hex(message.get('Thread-Index'))
+    if conversation_index:
+        metadata['conversation_index'] = conversation_index
+
+    return metadata
+
+
+def import_eml(output_dir, eml_bytes, email_id, folder="", extra_attachments=None):
+    """Escribir un .eml con sus adjuntos y metadatos en output_dir; devuelve los metadatos
+
+    extra_attachments ({nombre: bytes}) agrega archivos que llegaron fuera del
+    .eml (p. ej. subidos junto con él).
+    """
+    output_dir = Path(output_dir)
+    message = email.message_from_bytes(eml_bytes, policy=email.policy.default)
+
+    emails_dir = output_dir / "emails"
+    metadata_dir = output_dir / "metadata"
+    emails_dir.mkdir(parents=True, exist_ok=True)
+    metadata_dir.mkdir(parents=True, exist_ok=True)
+
+    eml_path = emails_dir / f"{email_id}.eml"
+    eml_path.write_bytes(eml_bytes)
+
+    attachments = []
+    files = mime_attachments(message) + list((extra_attachments or {}).items())
+    if files:
+        attachment_dir = output_dir / "attachments" / email_id
+        attachment_dir.mkdir(parents=True, exist_ok=True)
+        used = set()
+        for index, (filename, data) in enumerate(files):
+            filename = unique_filename(used, safe_filename(filename, index))
+            attachment_path = attachment_dir / filename
+            attachment_path.write_bytes(data)
+            attachments.append({
+                'filename': filename,
+                'size': len(data),
+                'path': str(attachment_path.relative_to(output_dir))
+            })
+
+    metadata = eml_metadata(message, email_id, folder, len(eml_bytes))
+    metadata['attachment_count'] = len(attachments)
+    metadata['eml_file'] = str(eml_path.relative_to(output_dir))
+    metadata['attachments'] = attachments
+    metadata['thread_id'] = thread_id_for(metadata)
+
+    with open(metadata_dir / f"{email_id}.json", 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    return metadata
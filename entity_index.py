@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Índice de Entidades Extraídas
+Índice invertido número de póliza / código de agente → emails, a partir de
+todos los identificadores que el clasificador encuentra en el asunto, el texto
+nuevo y el historial citado de cada email (no solo la primera coincidencia).
+Se construye al clasificar y se actualiza de forma incremental al reclasificar
+o reprocesar
+Uso: python entity_index.py output --poliza 12345 | --agente 430 | --top agente
+"""
+
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+# Índice dentro de output/classification
+ENTITY_INDEX_FILENAME = "entity_index.json"
+
+# Versión del formato del índice (2: las claves conservan los grupos de dígitos)
+ENTITY_INDEX_FORMAT_VERSION = 2
+
+# Tipos de entidad y campo de los detalles de clasificación con la primera coincidencia
+ENTITY_KINDS = ('poliza', 'agente')
+ENTITY_DETAIL_FIELDS = {'poliza': 'poliza_number', 'agente': 'agente_code'}
+
+DIGIT_GROUPS = re.compile(r'\d+')
+
+
+def normalize_entity(value):
+    """Valor buscable de una entidad: sus grupos de dígitos unidos por '-'
+
+    'AGENTE 430' → '430' y '1/284/97186' → '1-284-97186'; se conservan los grupos
+    para que 123-45 y 12-345 sigan siendo pólizas distintas.
+    """
+    return '-'.join(DIGIT_GROUPS.findall(str(value or '')))
+
+
+def email_entities(email_result):
+    """Entidades de un resultado de clasificación
+
+    Los resultados anteriores al índice no tienen 'entities': se usa la primera
+    coincidencia registrada en los detalles de cada categoría.
+    """
+    if 'entities' in email_result:
+        return {kind: list(email_result['entities'].get(kind, [])) for kind in ENTITY_KINDS}
+
+    entities = {kind: [] for kind in ENTITY_KINDS}
+    for details in email_result.get('classifications', {}).values():
+        for kind, field in ENTITY_DETAIL_FIELDS.items():
+            value = details.get(field)
+            if value and value not in entities[kind]:
+                entities[kind].append(value)
+    return entities
+
+
+class EntityIndex:
+    """Índice invertido {tipo: {valor: [email_id, ...]}} con su inverso por email"""
+
+    def __init__(self, postings=None):
+        self.postings = {kind: {} for kind in ENTITY_KINDS}
+        self.email_entities = {}
+        for kind, values in (postings or {}).items():
+            if kind not in self.postings:
+                continue
+            for value, email_ids in values.items():
+                self.postings[kind][value] = list(email_ids)
+                for email_id in email_ids:
+                    self.email_entities.setdefault(email_id, {k: [] for k in ENTITY_KINDS})[kind].append(value)
+
+    @classmethod
+    def from_results(cls, emails):
+        """Índice completo a partir de los resultados de clasificación"""
+        index = cls()
+        index.update(emails)
+        return index
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Índice aproximado desde las columnas del dashboard (primera coincidencia por email)"""
+        index = cls()
+        for email_id, agente, poliza in zip(columns['email_id'].tolist(),
+                                            columns['agente_code'].tolist(),
+                                            columns['poliza_number'].tolist()):
+            index.set_entities(email_id, {'agente': [agente] if agente else [],
+                                          'poliza': [poliza] if poliza else []})
+        return index
+
+    def set_entities(self, email_id, entities):
+        """Reemplazar las entidades de un email; True si cambiaron"""
+        entities = {kind: sorted({normalize_entity(value) for value in entities.get(kind, [])} - {''})
+                    for kind in ENTITY_KINDS}
+        previous = self.email_entities.get(email_id, {kind: [] for kind in ENTITY_KINDS})
+        if all(sorted(previous[kind]) == entities[kind] for kind in ENTITY_KINDS):
+            return False
+
+        if email_id in self.email_entities:
+            self.remove(email_id)
+        if any(entities.values()):
+            self.email_entities[email_id] = entities
+            for kind, values in entities.items():
+                for value in values:
+                    self.postings[kind].setdefault(value, []).append(email_id)
+        return True
+
+    def remove(self, email_id):
+        """Quitar un email del índice"""
+        previous = self.email_entities.pop(email_id, None)
+        if previous is None:
+            return False
+        for kind, values in previous.items():
+            for value in values:
+                email_ids = self.postings[kind].get(value, [])
+                if email_id in email_ids:
+                    email_ids.remove(email_id)
+                if not email_ids:
+                    self.postings[kind].pop(value, None)
+        return True
+
+    def update(self, emails):
+        """Aplicar los resultados de clasificación de emails nuevos o reclasificados
+
+        Devuelve el número de emails cuyas entidades cambiaron.
+        """
+        return sum(self.set_entities(email_result['email_id'], email_entities(email_result))
+                   for email_result in emails)
+
+    def lookup(self, kind, value):
+        """email_ids que mencionan la entidad (lista vacía si no hay ninguno)"""
+        return self.postings.get(kind, {}).get(normalize_entity(value), [])
+
+    def top(self, kind, limit=20):
+        """Entidades con más emails: [(valor, emails), ...]"""
+        counts = sorted(((value, len(email_ids)) for value, email_ids in self.postings.get(kind, {}).items()),
+                        key=lambda item: (-item[1], item[0]))
+        return counts[:limit] if limit else counts
+
+    def stats(self):
+        """Valores distintos por tipo y emails con al menos una entidad"""
+        stats = {kind: len(values) for kind, values in self.postings.items()}
+        stats['emails'] = len(self.email_entities)
+        return stats
+
+    def save(self, classification_dir):
+        """Guardar el índice (escritura atómica)"""
+        index_file = Path(classification_dir) / ENTITY_INDEX_FILENAME
+        temp_file = index_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': ENTITY_INDEX_FORMAT_VERSION,
+                'updated': datetime.now().isoformat(),
+                'stats': self.stats(),
+                'postings': {kind: {value: sorted(email_ids) for value, email_ids in sorted(values.items())}
+                             for kind, values in self.postings.items()}
+            }, f, ensure_ascii=False)
+        os.replace(temp_file, index_file)
+        return index_file
+
+    @classmethod
+    def load(cls, classification_dir):
+        """Cargar el índice guardado (None si no existe o es de otro formato)"""
+        index_file = Path(classification_dir) / ENTITY_INDEX_FILENAME
+        if not index_file.exists():
+            return None
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format_version') != ENTITY_INDEX_FORMAT_VERSION:
+            return None
+        return cls(data.get('postings', {}))
+
+
+def save_entity_index_for_results(classification_dir, emails):
+    """Construir y guardar el índice completo de una ejecución de clasificación"""
+    return EntityIndex.from_results(emails).save(classification_dir)
+
+
+def update_entity_index(classification_dir, emails, all_emails=None):
+    """Actualizar el índice guardado con los emails reclasificados
+
+    Con all_emails (el conjunto completo de resultados) se quitan además los
+    emails que ya no están; si todavía no hay índice se construye completo.
+    Devuelve el número de emails cuyas entidades cambiaron.
+    """
+    index = EntityIndex.load(classification_dir)
+    if index is None:
+        emails = all_emails if all_emails is not None else emails
+        EntityIndex.from_results(emails).save(classification_dir)
+        return len(emails)
+
+    changed = index.update(emails)
+    if all_emails is not None:
+        current = {email_result['email_id'] for email_result in all_emails}
+        changed += sum(index.remove(email_id) for email_id in list(index.email_entities) if email_id not in current)
+    if changed:
+        index.save(classification_dir)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultar el índice de pólizas y códigos de agente")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--poliza', help="Emails que mencionan el número de póliza")
+    parser.add_argument('--agente', help="Emails que mencionan el código de agente")
+    parser.add_argument('--top', choices=ENTITY_KINDS, help="Entidades con más emails")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--rebuild', action='store_true', help="Reconstruir desde classification_results.json")
+    args = parser.parse_args()
+
+    classification_dir = Path(args.output_dir) / "classification"
+    index = None if args.rebuild else EntityIndex.load(classification_dir)
+    if index is None:
+        results_file = classification_dir / "classification_results.json"
+        if not results_file.exists():
+            print(f"❌ No existe {results_file}")
+            return
+        with open(results_file, 'r', encoding='utf-8') as f:
+            index = EntityIndex.from_results(json.load(f).get('emails', []))
+        index.save(classification_dir)
+        stats = index.stats()
+        print(f"🔎 Índice reconstruido: {stats['poliza']} pólizas, {stats['agente']} agentes, {stats['emails']} emails")
+
+    if args.top:
+        for value, count in index.top(args.top, args.limit):
+            print(f"  {value:<20}{count:>8}")
+        return
+
+    for kind in ENTITY_KINDS:
+        value = getattr(args, kind)
+        if value:
+            email_ids = index.lookup(kind, value)
+            print(f"{kind} {normalize_entity(value)}: {len(email_ids)} emails")
+            for email_id in email_ids[:args.limit] if args.limit else email_ids:
+                print(f"  {email_id}")
+
+
+if __name__ == "__main__":
+    main()
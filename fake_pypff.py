@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Backend PST Simulado (sustituto de pypff)
+Implementa la parte de la API de pypff que usa PSTExtractor (file, carpetas,
+mensajes, adjuntos y record sets) sobre un árbol generado al vuelo, con
+tamaños configurables e inyección de errores y latencia, para medir y probar
+la extracción sin archivos PST reales
+Uso: PSTExtractor("config.json", output_dir, pst_backend=fake_pypff)
+"""
+
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from synthetic_corpus import CorpusTemplates, FOLDERS, SENDERS, attachments_for, html_body, thread_topic
+
+# Carpeta de primer nivel de los PST de Outlook
+ROOT_FOLDER_NAME = "Principio del archivo de datos de Outlook"
+
+# Propiedad MAPI PR_CONVERSATION_INDEX
+PR_CONVERSATION_INDEX = 0x0071
+
+# Configuración por defecto del PST simulado
+DEFAULT_CONFIG = {
+    'seed': 42,
+    'messages': 1000,
+    'folders': [name.split('/')[-1] for name, _ in FOLDERS],
+    'subfolders': 0,            # subcarpetas por carpeta en cada nivel
+    'depth': 1,                 # niveles de carpetas bajo la carpeta raíz
+    'body_kb': 4,               # tamaño aproximado del cuerpo HTML
+    'attachment_rate': 0.7,
+    'attachment_kb': 40,        # tamaño de los PDFs
+    'reply_rate': 0.4,
+    'message_error_rate': 0.0,      # error al leer el cuerpo del mensaje
+    'attachment_error_rate': 0.0,   # error en read_buffer
+    'folder_error_rate': 0.0,       # error en get_sub_message
+    'corrupt_rate': 0.0,            # mensajes sin asunto, remitente ni fecha
+    'message_latency_ms': 0.0,
+    'attachment_latency_ms': 0.0,
+    'fail_after': None              # interrumpir tras N mensajes (prueba de reanudación)
+}
+
+
+# Plantillas de adjuntos por tamaño de PDF (mismos bytes en todas las aperturas del proceso)
+_templates_cache = {}
+
+
+def corpus_templates(pdf_kb):
+    if pdf_kb not in _templates_cache:
+        _templates_cache[pdf_kb] = CorpusTemplates(pdf_kb)
+    return _templates_cache[pdf_kb]
+
+
+class FakePSTError(IOError):
+    """Error inyectado (pypff lanza IOError/OSError al leer estructuras dañadas)"""
+
+
+class FakePSTState:
+    """Configuración y contadores compartidos por todos los objetos del PST simulado"""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.templates = corpus_templates(self.config['attachment_kb'])
+        self.messages_served = 0
+        self.bytes_served = 0
+        self.errors_injected = 0
+
+    def maybe_fail(self, rng, rate, what):
+        """Lanzar un error inyectado con la probabilidad indicada"""
+        if rate and rng.random() < rate:
+            self.errors_injected += 1
+            raise FakePSTError(f"Error simulado de pypff en {what}")
+
+    def sleep(self, milliseconds):
+        """Latencia simulada de E/S"""
+        if milliseconds:
+            time.sleep(milliseconds / 1000)
+
+
+class FakeRecordEntry:
+    def __init__(self, entry_type, data):
+        self.entry_type = entry_type
+        self.data = data
+
+    def get_entry_type(self):
+        return self.entry_type
+
+    def get_data(self):
+        return self.data
+
+
+class FakeRecordSet:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_number_of_entries(self):
+        return len(self.entries)
+
+    def get_entry(self, entry_index):
+        return self.entries[entry_index]
+
+
+class FakeAttachment:
+    def __init__(self, state, rng, filename, data):
+        self.state = state
+        self.rng = rng
+        self.name = filename
+        self.long_filename = filename
+        self.data = data
+
+    def get_size(self):
+        return len(self.data)
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def read_buffer(self, size):
+        self.state.sleep(self.state.config['attachment_latency_ms'])
+        self.state.maybe_fail(self.rng, self.state.config['attachment_error_rate'], f"adjunto {self.name}")
+        self.state.bytes_served += min(size, len(self.data))
+        return self.data[:size]
+
+
+class FakeMessage:
+    """Mensaje generado de forma determinista a partir de su número global"""
+
+    def __init__(self, state, number):
+        self.state = state
+        self.number = number
+        config = state.config
+        rng = random.Random(config['seed'] * 7_919 + number)
+        self.rng = rng
+
+        is_reply = number > 3 and rng.random() < config['reply_rate']
+        thread_key = rng.randrange(1, number) if is_reply else number
+        kind, base_subject, base_body, values = thread_topic(config['seed'], thread_key)
+
+        sender_name, sender_email = rng.choice(SENDERS)
+        delivery_time = datetime(2025, 1, 1, 8) + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        corrupt = config['corrupt_rate'] and rng.random() < config['corrupt_rate']
+
+        quoted = (SENDERS[thread_key % len(SENDERS)] + ('lunes, 4 de agosto de 2025 10:15', base_subject, base_body)
+                  if is_reply else None)
+        body = base_body
+        html = html_body(body, quoted)
+        padding = config['body_kb'] * 1024 - len(html)
+        if padding > 0:
+            html = html.replace('</body>', f"<div style=\"display:none\">{'&nbsp;' * (padding // 6)}</div></body>")
+
+        self.subject = None if corrupt else (('RE: ' if is_reply else '') + base_subject)
+        self.sender_name = None if corrupt else sender_name
+        self.sender_email_address = None if corrupt else sender_email
+        self.delivery_time = None if corrupt else delivery_time
+        self.creation_time = None if corrupt else delivery_time + timedelta(hours=1)
+        self.modification_time = None if corrupt else delivery_time + timedelta(hours=2)
+        self.conversation_topic = None if corrupt else base_subject
+        self._plain_text_body = body.encode('utf-8')
+        self._html_body = html.encode('utf-8')
+        self._conversation_index = bytes.fromhex(
+            f"01{thread_key:010x}{config['seed'] & 0xffffffff:08x}".ljust(44, '0')
+        ) + (rng.randbytes(5) if is_reply else b'')
+        self._attachments = attachments_for(rng, kind, values, state.templates, config['attachment_rate'])
+
+    @property
+    def plain_text_body(self):
+        self.state.maybe_fail(self.rng, self.state.config['message_error_rate'], f"mensaje {self.number}")
+        return self._plain_text_body
+
+    @property
+    def html_body(self):
+        return self._html_body
+
+    def get_size(self):
+        return len(self._plain_text_body) + len(self._html_body) + sum(len(data) for _, data in self._attachments)
+
+    def get_number_of_attachments(self):
+        return len(self._attachments)
+
+    @property
+    def number_of_attachments(self):
+        return len(self._attachments)
+
+    def get_attachment(self, attachment_index):
+        filename, data = self._attachments[attachment_index]
+        return FakeAttachment(self.state, self.rng, filename, data)
+
+    def get_number_of_record_sets(self):
+        return 1
+
+    def get_record_set(self, set_index):
+        return FakeRecordSet([FakeRecordEntry(PR_CONVERSATION_INDEX, self._conversation_index)])
+
+
+class FakeFolder:
+    """Carpeta con mensajes numerados [first_message, first_message + message_count)"""
+
+    def __init__(self, state, name, first_message=0, message_count=0, sub_folders=None):
+        self.state = state
+        self.name = name
+        self.first_message = first_message
+        self.message_count = message_count
+        self.sub_folders = sub_folders or []
+
+    def get_number_of_sub_messages(self):
+        return self.message_count
+
+    @property
+    def number_of_sub_messages(self):
+        return self.message_count
+
+    def get_sub_message(self, message_index):
+        if message_index >= self.message_count:
+            return None
+
+        state = self.state
+        number = self.first_message + message_index + 1
+        fail_after = state.config['fail_after']
+        if fail_after is not None and state.messages_served >= fail_after:
+            raise KeyboardInterrupt(f"Interrupción simulada tras {fail_after} mensajes")
+
+        state.sleep(state.config['message_latency_ms'])
+        state.maybe_fail(random.Random(number * 31), state.config['folder_error_rate'], f"carpeta {self.name}")
+        state.messages_served += 1
+        return FakeMessage(state, number)
+
+    def get_number_of_sub_folders(self):
+        return len(self.sub_folders)
+
+    @property
+    def number_of_sub_folders(self):
+        return len(self.sub_folders)
+
+    def get_sub_folder(self, sub_folder_index):
+        return self.sub_folders[sub_folder_index]
+
+
+def build_folder_tree(state):
+    """Árbol raíz → carpeta de datos → carpetas configuradas (con subcarpetas), mensajes en las hojas"""
+    config = state.config
+
+    def build_level(names, level):
+        folders = []
+        for name in names:
+            children = []
+            if level < config['depth'] and config['subfolders']:
+                children = build_level([f"{name} {i + 1}" for i in range(config['subfolders'])], level + 1)
+            folders.append(FakeFolder(state, name, sub_folders=children))
+        return folders
+
+    top_folders = build_level(config['folders'], 1)
+
+    # Repartir los mensajes entre las carpetas hoja en orden de recorrido
+    leaves = []
+
+    def collect(folder):
+        if folder.sub_folders:
+            for child in folder.sub_folders:
+                collect(child)
+        else:
+            leaves.append(folder)
+
+    for folder in top_folders:
+        collect(folder)
+
+    per_leaf, remainder = divmod(config['messages'], max(len(leaves), 1))
+    first_message = 0
+    for leaf_index, leaf in enumerate(leaves):
+        leaf.first_message = first_message
+        leaf.message_count = per_leaf + (1 if leaf_index < remainder else 0)
+        first_message += leaf.message_count
+
+    data_folder = FakeFolder(state, ROOT_FOLDER_NAME, sub_folders=top_folders)
+    return FakeFolder(state, None, sub_folders=[data_folder])
+
+
+class file:
+    """Equivalente a pypff.file(): open() acepta un JSON de configuración o cualquier ruta"""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.state = None
+        self.root_folder = None
+
+    def open(self, path, mode='r'):
+        config = dict(self.config or {})
+        if path and str(path).endswith('.json') and Path(path).exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        self.state = FakePSTState(config)
+        self.root_folder = build_folder_tree(self.state)
+
+    def close(self):
+        self.root_folder = None
+
+    def get_root_folder(self):
+        return self.root_folder
+
+    @property
+    def number_of_messages(self):
+        return self.state.config['messages'] if self.state else 0
+
+
+class FakePypff:
+    """Módulo sustituto con una configuración fija (pst_backend=FakePypff({...}))"""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.last_file = None
+
+    def file(self):
+        self.last_file = file(self.config)
+        return self.last_file
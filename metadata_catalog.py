@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Catálogo SQLite de Metadatos
+Un solo archivo indexado (output/catalog.sqlite) con los metadatos de cada
+email, sus adjuntos (tamaño, extensión y tipo detectado por firma) y las
+carpetas. Lo escribe PSTExtractor durante la extracción; el clasificador y el
+dashboard lo consultan en lugar de recorrer y abrir metadata/*.json
+Uso: python metadata_catalog.py output [--folder ASIGNADOS --since 2025-08-01 --with-attachments]
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+# Archivo del catálogo dentro del directorio de salida
+CATALOG_FILENAME = "catalog.sqlite"
+
+# Versión del esquema (PRAGMA user_version); si cambia, el catálogo se reconstruye
+CATALOG_SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    folder_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emails (
+    email_id TEXT PRIMARY KEY,
+    folder_id INTEGER REFERENCES folders(folder_id),
+    subject TEXT,
+    sender_name TEXT,
+    sender_email TEXT,
+    delivery_time TEXT,
+    thread_id TEXT,
+    size INTEGER,
+    attachment_count INTEGER NOT NULL DEFAULT 0,
+    attachment_bytes INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS attachments (
+    email_id TEXT NOT NULL REFERENCES emails(email_id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    extension TEXT,
+    mime_type TEXT,
+    detected_type TEXT,
+    path TEXT
+);
+CREATE TABLE IF NOT EXISTS catalog_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS emails_folder_time ON emails(folder_id, delivery_time);
+CREATE INDEX IF NOT EXISTS emails_time ON emails(delivery_time);
+CREATE INDEX IF NOT EXISTS emails_thread ON emails(thread_id);
+CREATE INDEX IF NOT EXISTS attachments_email ON attachments(email_id);
+CREATE INDEX IF NOT EXISTS attachments_type ON attachments(detected_type);
+"""
+
+# Firmas de archivo (primeros bytes) → tipo detectado
+FILE_SIGNATURES = [
+    (b'%PDF', 'pdf'),
+    (b'PK\x03\x04', 'zip'),           # xlsx, docx, pptx y zip
+    (b'\xd0\xcf\x11\xe0', 'ole'),     # xls, doc y msg
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG', 'png'),
+    (b'GIF8', 'gif'),
+    (b'Rar!', 'rar'),
+    (b'7z\xbc\xaf', '7z')
+]
+
+# Formatos Office Open XML (contenedor ZIP) y Office 97-2003 (contenedor OLE)
+OOXML_TYPES = {'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.docx': 'docx', '.pptx': 'pptx'}
+OLE_TYPES = {'.xls': 'xls', '.doc': 'doc', '.ppt': 'ppt', '.msg': 'msg'}
+
+
+def detect_file_type(file_path, extension):
+    """Tipo real del adjunto según su firma ('unknown' si no se reconoce o no existe)"""
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(8)
+    except OSError:
+        return 'missing'
+
+    for signature, file_type in FILE_SIGNATURES:
+        if header.startswith(signature):
+            if file_type == 'zip':
+                return OOXML_TYPES.get(extension, 'zip')
+            if file_type == 'ole':
+                return OLE_TYPES.get(extension, 'ole')
+            return file_type
+    return 'unknown'
+
+
+class MetadataCatalog:
+    """Catálogo de metadatos; una conexión por hilo (el dashboard atiende en varios hilos)"""
+
+    def __init__(self, output_dir="output", readonly=False):
+        self.output_dir = Path(output_dir)
+        self.metadata_dir = self.output_dir / "metadata"
+        self.catalog_file = self.output_dir / CATALOG_FILENAME
+        self.readonly = readonly
+        self.local = threading.local()
+        self.folder_ids = {}
+
+        if not readonly:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.ensure_schema()
+
+    @classmethod
+    def open_existing(cls, output_dir="output"):
+        """Catálogo de solo lectura, o None si todavía no existe"""
+        if not (Path(output_dir) / CATALOG_FILENAME).exists():
+            return None
+        return cls(output_dir, readonly=True)
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            if self.readonly:
+                connection = sqlite3.connect(f"file:{self.catalog_file}?mode=ro", uri=True)
+            else:
+                connection = sqlite3.connect(self.catalog_file)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self.local.connection = connection
+        return connection
+
+    def ensure_schema(self):
+        """Crear las tablas (o recrearlas si el esquema es de otra versión)"""
+        connection = self.connection
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, CATALOG_SCHEMA_VERSION):
+            connection.executescript(
+                "DROP TABLE IF EXISTS attachments; DROP TABLE IF EXISTS emails; "
+                "DROP TABLE IF EXISTS folders; DROP TABLE IF EXISTS catalog_state;"
+            )
+        connection.executescript(SCHEMA)
+        connection.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+        connection.commit()
+
+    def folder_id(self, path):
+        """Id de una carpeta (se crea al primer uso)"""
+        path = path or ''
+        folder_id = self.folder_ids.get(path)
+        if folder_id is None:
+            connection = self.connection
+            connection.execute(
+                "INSERT OR IGNORE INTO folders (path, name) VALUES (?, ?)",
+                (path, path.rstrip('/').rsplit('/', 1)[-1].strip())
+            )
+            folder_id = connection.execute("SELECT folder_id FROM folders WHERE path = ?", (path,)).fetchone()[0]
+            self.folder_ids[path] = folder_id
+        return folder_id
+
+    def add_email(self, metadata):
+        """Insertar o reemplazar un email con sus adjuntos (confirmar con commit())"""
+        email_id = metadata['id']
+        attachments = metadata.get('attachments') or []
+        connection = self.connection
+
+        connection.execute("DELETE FROM attachments WHERE email_id = ?", (email_id,))
+        connection.execute(
+            "INSERT OR REPLACE INTO emails (email_id, folder_id, subject, sender_name, sender_email, delivery_time, "
+            "thread_id, size, attachment_count, attachment_bytes, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                email_id,
+                self.folder_id(metadata.get('folder')),
+                metadata.get('subject'),
+                metadata.get('sender_name'),
+                metadata.get('sender_email'),
+                metadata.get('delivery_time'),
+                metadata.get('thread_id'),
+                metadata.get('size'),
+                len(attachments),
+                sum(attachment.get('size') or 0 for attachment in attachments),
+                json.dumps(metadata, ensure_ascii=False)
+            )
+        )
+
+        rows = []
+        for attachment in attachments:
+            filename = attachment.get('filename', '')
+            extension = os.path.splitext(filename)[1].lower()
+            path = attachment.get('path')
+            rows.append((
+                email_id, filename, attachment.get('size'), extension,
+                mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                detect_file_type(self.output_dir / path, extension) if path else 'missing',
+                path
+            ))
+        connection.executemany(
+            "INSERT INTO attachments (email_id, filename, size, extension, mime_type, detected_type, path) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def remove_emails(self, email_ids):
+        self.connection.executemany("DELETE FROM emails WHERE email_id = ?", ((email_id,) for email_id in email_ids))
+
+    def commit(self):
+        """Confirmar los cambios y registrar el estado del directorio de metadatos"""
+        if self.metadata_dir.exists():
+            self.connection.execute(
+                "INSERT OR REPLACE INTO catalog_state (key, value) VALUES ('metadata_dir_mtime_ns', ?)",
+                (str(self.metadata_dir.stat().st_mtime_ns),)
+            )
+        self.connection.commit()
+
+    def is_current(self):
+        """True si metadata/ no cambió desde el último commit (solo un stat del directorio)"""
+        if not self.metadata_dir.exists():
+            return True
+        row = self.connection.execute(
+            "SELECT value FROM catalog_state WHERE key = 'metadata_dir_mtime_ns'"
+        ).fetchone()
+        return row is not None and row[0] == str(self.metadata_dir.stat().st_mtime_ns)
+
+    def sync(self):
+        """Poner al día el catálogo con metadata/: solo se leen los JSON que faltan
+
+        Devuelve (agregados, eliminados). Sirve para corpus extraídos antes de
+        existir el catálogo o generados sin él.
+        """
+        if self.is_current():
+            return 0, 0
+
+        on_disk = {
+            entry.name[:-5] for entry in os.scandir(self.metadata_dir)
+            if entry.name.endswith('.json') and entry.name != 'progress.json'
+        }
+        cataloged = {row[0] for row in self.connection.execute("SELECT email_id FROM emails")}
+
+        added = 0
+        for email_id in sorted(on_disk - cataloged):
+            try:
+                with open(self.metadata_dir / f"{email_id}.json", 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                print(f"Error leyendo metadatos de {email_id}: {e}")
+                continue
+            metadata.setdefault('id', email_id)
+            self.add_email(metadata)
+            added += 1
+
+        removed = cataloged - on_disk
+        self.remove_emails(removed)
+        self.commit()
+        return added, len(removed)
+
+    def get_metadata(self, email_id):
+        """Metadatos de un email (mismo contenido que metadata/<id>.json) o None"""
+        row = self.connection.execute("SELECT metadata FROM emails WHERE email_id = ?", (email_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_metadata(self):
+        """Metadatos de todos los emails en orden de id"""
+        for (metadata,) in self.connection.execute("SELECT metadata FROM emails ORDER BY email_id"):
+            yield json.loads(metadata)
+
+    def get_attachments(self, email_id):
+        """Adjuntos de un email con tamaño y tipos"""
+        cursor = self.connection.execute(
+            "SELECT filename, size, extension, mime_type, detected_type, path FROM attachments WHERE email_id = ?",
+            (email_id,)
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM emails").fetchone()[0]
+
+    def query(self, folder=None, since=None, until=None, has_attachments=None, attachment_type=None,
+              thread_id=None, limit=None):
+        """Ids de email que cumplen los filtros, en orden de fecha (una sola consulta indexada)
+
+        folder acepta la ruta completa, el nombre de la carpeta o una ruta padre;
+        since/until son fechas ISO (AAAA-MM-DD) inclusivas.
+        """
+        clauses, params = [], []
+        if folder:
+            clauses.append(
+                "e.folder_id IN (SELECT folder_id FROM folders WHERE path = ? OR name = ? OR path LIKE ?)"
+            )
+            params += [folder, folder.strip(), folder.rstrip('/') + '/%']
+        if since:
+            clauses.append("e.delivery_time >= ?")
+            params.append(since)
+        if until:
+            if len(until) == 10:
+                # Fecha sin hora: incluir todo el día
+                clauses.append("e.delivery_time < ?")
+                params.append((date.fromisoformat(until) + timedelta(days=1)).isoformat())
+            else:
+                clauses.append("e.delivery_time <= ?")
+                params.append(until)
+        if has_attachments is not None:
+            clauses.append("e.attachment_count > 0" if has_attachments else "e.attachment_count = 0")
+        if attachment_type:
+            clauses.append("e.email_id IN (SELECT email_id FROM attachments WHERE detected_type = ?)")
+            params.append(attachment_type)
+        if thread_id:
+            clauses.append("e.thread_id = ?")
+            params.append(thread_id)
+
+        sql = "SELECT e.email_id FROM emails e"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY e.delivery_time"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [row[0] for row in self.connection.execute(sql, params)]
+
+    def folder_counts(self):
+        """{ruta de carpeta: emails}"""
+        return dict(self.connection.execute(
+            "SELECT f.path, COUNT(*) FROM emails e JOIN folders f USING (folder_id) GROUP BY f.path ORDER BY f.path"
+        ))
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def load_catalog(output_dir="output"):
+    """Catálogo al día con metadata/ (lo crea o completa si hace falta), o None si no hay metadatos"""
+    output_dir = Path(output_dir)
+    if not (output_dir / "metadata").exists() and not (output_dir / CATALOG_FILENAME).exists():
+        return None
+
+    try:
+        catalog = MetadataCatalog(output_dir)
+        added, removed = catalog.sync()
+        if added or removed:
+            print(f"🗂️  Catálogo de metadatos actualizado: +{added} / -{removed} emails")
+        return catalog
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Catálogo de metadatos no disponible ({e}); se leerán los JSON")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catálogo SQLite de metadatos")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--rebuild', action='store_true', help="Reconstruir desde metadata/*.json")
+    parser.add_argument('--folder')
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    parser.add_argument('--with-attachments', dest='has_attachments', action='store_const', const=True)
+    parser.add_argument('--without-attachments', dest='has_attachments', action='store_const', const=False)
+    parser.add_argument('--attachment-type', help="pdf, xlsx, jpeg, ...")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        catalog_file = Path(args.output_dir) / CATALOG_FILENAME
+        for suffix in ('', '-wal', '-shm'):
+            Path(f"{catalog_file}{suffix}").unlink(missing_ok=True)
+
+    catalog = load_catalog(args.output_dir)
+    if catalog is None:
+        print(f"❌ No hay metadatos en {args.output_dir}")
+        return
+
+    print(f"🗂️  {catalog.count()} emails en {catalog.catalog_file}")
+    for path, count in catalog.folder_counts().items():
+        print(f"  {path or '(sin carpeta)'}: {count}")
+
+    if any(value is not None for value in (args.folder, args.since, args.until, args.has_attachments, args.attachment_type)):
+        email_ids = catalog.query(args.folder, args.since, args.until, args.has_attachments, args.attachment_type)
+        print(f"\n🔍 {len(email_ids)} emails cumplen los filtros")
+        for email_id in email_ids[:args.limit]:
+            metadata = catalog.get_metadata(email_id)
+            print(f"  {email_id}  {metadata.get('delivery_time') or '':<26}  {(metadata.get('subject') or '')[:60]}")
+
+
+if __name__ == "__main__":
+    main()
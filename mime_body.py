@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Lector Binario de Cuerpos MIME
+Localiza las partes text/plain y text/html de un .eml leyendo solo encabezados
+y fronteras multipart sobre bytes; decodifica únicamente esas partes con su
+charset declarado y nunca materializa el contenido de los adjuntos
+"""
+
+import binascii
+import codecs
+import mmap
+import re
+
+# Partes de texto que se decodifican
+TEXT_TYPES = ('text/plain', 'text/html')
+
+# A partir de este tamaño el archivo se lee con mmap en vez de cargarlo completo
+MMAP_THRESHOLD = 1024 * 1024
+
+# Fin de la sección de encabezados
+HEADER_END_PATTERN = re.compile(rb'\r?\n\r?\n')
+
+# Líneas de continuación de encabezados (RFC 5322, folding)
+HEADER_FOLDING_PATTERN = re.compile(rb'\r?\n[ \t]+')
+
+# Parámetros de Content-Type (boundary, charset), con o sin comillas
+HEADER_PARAM_PATTERN = re.compile(r';\s*([\w-]+)\s*=\s*(?:"([^"]*)"|([^;\s]*))')
+
+# Encabezados MIME que necesita el lector
+MIME_HEADERS = (b'content-type', b'content-transfer-encoding', b'content-disposition')
+
+# Charsets declarados que en la práctica contienen UTF-8 u otros superconjuntos
+CHARSET_ALIASES = {
+    'us-ascii': 'utf-8',
+    'ascii': 'utf-8',
+    'iso-8859-1': 'cp1252',
+    'latin-1': 'cp1252',
+    'latin1': 'cp1252'
+}
+
+
+def parse_mime_headers(header_bytes):
+    """Solo los encabezados MIME de una parte: {nombre en minúsculas: valor}"""
+    headers = {}
+    for line in HEADER_FOLDING_PATTERN.sub(b' ', header_bytes).split(b'\n'):
+        name, separator, value = line.partition(b':')
+        name = name.strip().lower()
+        if separator and name in MIME_HEADERS and name not in headers:
+            headers[name.decode('ascii')] = value.strip().decode('latin-1')
+    return headers
+
+
+def parse_content_type(value):
+    """Tipo MIME y parámetros de un Content-Type (text/plain si falta, como email)"""
+    content_type, _, params = (value or 'text/plain').partition(';')
+    content_type = content_type.strip().lower()
+    if content_type.count('/') != 1:
+        content_type = 'text/plain'
+
+    parameters = {
+        match.group(1).lower(): match.group(2) if match.group(2) is not None else match.group(3)
+        for match in HEADER_PARAM_PATTERN.finditer(';' + params)
+    }
+    return content_type, parameters
+
+
+def split_headers(data, start, end):
+    """Separar encabezados y cuerpo de una parte: (encabezados MIME, inicio_del_cuerpo)"""
+    if data[start:start + 2] == b'\r\n':
+        return {}, start + 2
+    if data[start:start + 1] == b'\n':
+        return {}, start + 1
+
+    match = HEADER_END_PATTERN.search(data, start, end)
+    header_end = match.start() if match else end
+    body_start = match.end() if match else end
+    return parse_mime_headers(bytes(data[start:header_end])), body_start
+
+
+def decode_payload(payload, transfer_encoding):
+    """Deshacer el Content-Transfer-Encoding de una parte de texto"""
+    transfer_encoding = (transfer_encoding or '').strip().lower()
+    try:
+        if transfer_encoding == 'base64':
+            return binascii.a2b_base64(payload)
+        if transfer_encoding == 'quoted-printable':
+            return binascii.a2b_qp(payload)
+    except (binascii.Error, ValueError):
+        pass
+    return payload
+
+
+def decode_text(payload, charset):
+    """Decodificar bytes con el charset declarado (UTF-8 si falta o es desconocido)"""
+    charset = (charset or 'utf-8').strip().strip('"').lower()
+    charset = CHARSET_ALIASES.get(charset, charset)
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = 'utf-8'
+    return payload.decode(charset, errors='ignore')
+
+
+def part_boundaries(data, boundary, start, end):
+    """Rangos (inicio, fin) de cada subparte de un multipart, sin copiar su contenido"""
+    delimiter = b'--' + boundary
+    ranges = []
+    position = data.find(delimiter, start, end)
+
+    while position != -1:
+        line_end = data.find(b'\n', position, end)
+        if line_end == -1:
+            break
+
+        # Delimitador de cierre: --boundary--
+        closing = data[position + len(delimiter):position + len(delimiter) + 2] == b'--'
+        if closing:
+            break
+
+        part_start = line_end + 1
+        next_position = data.find(b'\n' + delimiter, part_start, end)
+        part_end = next_position if next_position != -1 else end
+        if part_end > part_start and data[part_end - 1:part_end] == b'\r':
+            part_end -= 1
+
+        ranges.append((part_start, part_end))
+        position = next_position + 1 if next_position != -1 else -1
+
+    return ranges
+
+
+def scan_parts(data, start, end, content, depth=0):
+    """Recorrer la estructura MIME y decodificar solo las partes de texto"""
+    headers, body_start = split_headers(data, start, end)
+    content_type, params = parse_content_type(headers.get('content-type'))
+    disposition = headers.get('content-disposition', '').lower()
+
+    if content_type.startswith('multipart/') and depth < 20:
+        boundary = params.get('boundary')
+        if not boundary:
+            return
+        for part_start, part_end in part_boundaries(data, boundary.encode('utf-8', 'ignore'), body_start, end):
+            scan_parts(data, part_start, part_end, content, depth + 1)
+
+    elif content_type == 'message/rfc822' and depth < 20:
+        # Mensaje reenviado como adjunto: igual que walk(), se recorre su contenido
+        scan_parts(data, body_start, end, content, depth + 1)
+
+    elif content_type in TEXT_TYPES and not disposition.startswith('attachment'):
+        payload = decode_payload(bytes(data[body_start:end]), headers.get('content-transfer-encoding'))
+        if payload:
+            key = 'plain_text' if content_type == 'text/plain' else 'html_content'
+            content[key] = decode_text(payload, params.get('charset'))
+
+
+def read_text_parts(eml_file):
+    """Texto plano y HTML de un .eml: {'plain_text': ..., 'html_content': ...}
+
+    Como email.message.walk(), si hay varias partes del mismo tipo se conserva
+    la última. Los adjuntos (incluidos los text/* marcados como attachment) se
+    saltan sin decodificar.
+    """
+    content = {'plain_text': '', 'html_content': ''}
+
+    with open(eml_file, 'rb') as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            return content
+        f.seek(0)
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                scan_parts(data, 0, size, content)
+        else:
+            data = f.read()
+            scan_parts(data, 0, size, content)
+
+    return content
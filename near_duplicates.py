@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Detección de Casi Duplicados
+Reenvíos, reenvíos del mismo correo y copias CC producen emails casi idénticos
+con los mismos adjuntos. Dos emails forman un grupo si coinciden su clave
+(asunto, nombres y tamaños de los adjuntos), el hash SHA-1 de los adjuntos,
+los números de su texto, la cantidad de mensajes citados y las palabras clave
+de las reglas de cuerpo que aparecen en el texto nuevo y en el citado, y sus SimHash de
+64 bits del texto normalizado están a distancia de Hamming <=
+SIMHASH_MAX_DISTANCE. Los hashes y la huella del texto solo se calculan
+cuando ya hay otro email con la misma clave. El clasificador analiza
+completo solo al primero de cada grupo y reutiliza su resultado en los demás
+Uso: python near_duplicates.py output [--limit 20]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from mime_body import read_text_parts
+
+# Grupos de casi duplicados dentro de output/classification
+DUPLICATES_FILENAME = "near_duplicates.json"
+
+# Bits distintos tolerados entre SimHash de 64 bits (~95% de similitud)
+SIMHASH_MAX_DISTANCE = 3
+
+# Palabras por shingle del SimHash
+SHINGLE_SIZE = 3
+
+# Etiquetas de las líneas de encabezado de los mensajes citados (cambian entre copias)
+QUOTED_HEADER_PATTERN = re.compile(
+    r'^[ \t]*(de|from|enviado( el)?|sent|fecha|date|para|to|cc|asunto|subject)[ \t]*:.*$',
+    re.IGNORECASE | re.MULTILINE
+)
+# Inicio de cada mensaje citado (De:/From:): un reenvío no se agrupa con su original
+QUOTE_START_PATTERN = re.compile(r'^[ \t]*(de|from)[ \t]*:', re.IGNORECASE | re.MULTILINE)
+HTML_BREAK_PATTERN = re.compile(r'<\s*(br|/p|/div|/tr|hr)[^>]*>', re.IGNORECASE)
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+HTML_ENTITY_PATTERN = re.compile(r'&#?\w+;')
+HTML_HIDDEN_PATTERN = re.compile(r'<(style|script|head)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+WORD_PATTERN = re.compile(r'\w+')
+
+# Números de 3 o más dígitos (pólizas, agentes, OT, importes): deben coincidir exactamente
+NUMBER_PATTERN = re.compile(r'\d{3,}')
+
+
+def body_text(plain_text, html_content):
+    """Texto del cuerpo sin etiquetas HTML (sin parsear con BeautifulSoup)
+
+    Las entidades HTML se descartan en lugar de decodificarse: la huella solo
+    necesita ser igual para copias iguales, no legible.
+    """
+    if html_content:
+        text = HTML_HIDDEN_PATTERN.sub(' ', html_content)
+        text = HTML_TAG_PATTERN.sub(' ', HTML_BREAK_PATTERN.sub('\n', text))
+        text = HTML_ENTITY_PATTERN.sub(' ', text.replace('&nbsp;', ' '))
+    else:
+        text = plain_text or ''
+    return text
+
+
+def normalize_words(text):
+    """Palabras en minúsculas"""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def simhash(words, shingle_size=SHINGLE_SIZE):
+    """SimHash de 64 bits de los shingles de palabras"""
+    if len(words) >= shingle_size:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    else:
+        shingles = {' '.join(words)}
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+         for shingle in shingles],
+        dtype=np.uint64
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int.from_bytes(np.packbits(votes > 0, bitorder='little').tobytes(), 'little')
+
+
+def hamming_distance(a, b):
+    """Bits distintos entre dos SimHash"""
+    return bin(a ^ b).count('1')
+
+
+def attachment_files(attachment_dir):
+    """Adjuntos de un email (os.DirEntry) ordenados por nombre"""
+    try:
+        with os.scandir(attachment_dir) as entries:
+            return sorted((entry for entry in entries if entry.is_file()), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return []
+
+
+def duplicate_key(output_dir, email_id, metadata):
+    """Clave de un email: asunto en mayúsculas y adjuntos (nombre y tamaño, sin leerlos)
+
+    El asunto conserva los prefijos RE:/RV:/FW: porque algunas reglas los leen.
+    """
+    key_source = json.dumps([
+        ' '.join((metadata.get('subject') or '').upper().split()),
+        [(entry.name.upper(), entry.stat().st_size)
+         for entry in attachment_files(os.path.join(output_dir, "attachments", email_id))]
+    ], ensure_ascii=False)
+    return hashlib.sha1(key_source.encode('utf-8')).hexdigest()
+
+
+def content_fingerprint(output_dir, email_id, text_signature=None):
+    """Huella del contenido: ((hashes de adjuntos, mensajes citados, números de 3 o más dígitos[, firma]), SimHash)
+
+    La primera parte debe coincidir exactamente (contenido de los SLIP; las
+    reglas puntúan distinto el texto nuevo y el citado; pólizas, agentes,
+    importes). text_signature(texto_nuevo, texto_citado) agrega las señales del
+    texto que puntúan las reglas (una palabra clave basta para cambiar la
+    clasificación aunque el SimHash casi no cambie). El SimHash, calculado
+    sin los encabezados citados (fechas, destinatarios), tolera diferencias
+    menores del texto (saludos, firmas).
+    """
+    eml_file = Path(output_dir) / "emails" / f"{email_id}.eml"
+    parts = read_text_parts(eml_file) if eml_file.exists() else {}
+    text = body_text(parts.get('plain_text', ''), parts.get('html_content', ''))
+    exact = (
+        tuple(hashlib.sha1(Path(entry.path).read_bytes()).hexdigest()
+              for entry in attachment_files(os.path.join(output_dir, "attachments", email_id))),
+        len(QUOTE_START_PATTERN.findall(text)),
+        tuple(sorted(set(NUMBER_PATTERN.findall(text))))
+    )
+    if text_signature is not None:
+        quote_start = QUOTE_START_PATTERN.search(text)
+        split_at = quote_start.start() if quote_start else len(text)
+        exact += (text_signature(text[:split_at], text[split_at:]),)
+    return exact, simhash(normalize_words(QUOTED_HEADER_PATTERN.sub(' ', text)))
+
+
+class NearDuplicateDetector:
+    """Grupos de casi duplicados construidos a medida que se clasifican los emails"""
+
+    def __init__(self, output_dir="output", max_distance=SIMHASH_MAX_DISTANCE, text_signature=None):
+        self.output_dir = Path(output_dir)
+        self.max_distance = max_distance
+        self.text_signature = text_signature
+        self.buckets = {}
+        self.keys = {}
+        self.content_fingerprints = {}
+        self.clusters = {}
+
+    def content_fingerprint_of(self, email_id):
+        """Huella del contenido (calculada una vez por email)"""
+        if email_id not in self.content_fingerprints:
+            self.content_fingerprints[email_id] = content_fingerprint(self.output_dir, email_id, self.text_signature)
+        return self.content_fingerprints[email_id]
+
+    def match(self, email_id, metadata):
+        """(representante, distancia) del grupo del email, o None"""
+        key = duplicate_key(self.output_dir, email_id, metadata)
+        self.keys[email_id] = key
+        representatives = self.buckets.get(key)
+        if not representatives:
+            return None
+
+        exact, fingerprint_hash = self.content_fingerprint_of(email_id)
+        best = None
+        for representative in representatives:
+            representative_exact, representative_hash = self.content_fingerprint_of(representative)
+            if representative_exact != exact:
+                continue
+            distance = hamming_distance(fingerprint_hash, representative_hash)
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (representative, distance)
+        return best
+
+    def add_representative(self, email_id):
+        """Registrar un email analizado completo (después de match) como representante de su grupo"""
+        self.buckets.setdefault(self.keys.pop(email_id), []).append(email_id)
+        self.clusters.setdefault(email_id, [])
+
+    def add_member(self, email_id, representative):
+        """Registrar un email cuyo resultado se reutilizó del representante"""
+        self.keys.pop(email_id, None)
+        self.content_fingerprints.pop(email_id, None)
+        self.clusters.setdefault(representative, []).append(email_id)
+
+    def groups(self):
+        """Grupos con al menos un duplicado: {representante: [miembros]}"""
+        return {representative: members for representative, members in self.clusters.items() if members}
+
+    def save(self, classification_dir):
+        """Guardar los grupos de la ejecución"""
+        groups = self.groups()
+        duplicates_file = Path(classification_dir) / DUPLICATES_FILENAME
+        temp_file = duplicates_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated': datetime.now().isoformat(),
+                'max_distance': self.max_distance,
+                'total_groups': len(groups),
+                'total_duplicates': sum(len(members) for members in groups.values()),
+                'groups': groups
+            }, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, duplicates_file)
+        return duplicates_file
+
+
+def similarity(distance):
+    """Similitud aproximada del texto a partir de la distancia entre SimHash"""
+    return round(1 - distance / 64, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grupos de casi duplicados de la última clasificación")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--limit', type=int, default=20, help="Grupos a mostrar (los más grandes)")
+    args = parser.parse_args()
+    limit = args.limit
+
+    duplicates_file = Path(args.output_dir) / "classification" / DUPLICATES_FILENAME
+    if not duplicates_file.exists():
+        print(f"❌ No existe {duplicates_file} (ejecute el clasificador)")
+        return
+    with open(duplicates_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    print(f"🧬 {data['total_groups']} grupos de casi duplicados, {data['total_duplicates']} emails reutilizados")
+    largest = sorted(data['groups'].items(), key=lambda item: len(item[1]), reverse=True)
+    for representative, members in largest[:limit]:
+        print(f"  {representative}  +{len(members)}: {', '.join(members[:5])}{' ...' if len(members) > 5 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,12 +12,24 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from pathlib import Path
-import pypff
+from thread_index import ThreadIndex, thread_id_for
+from metadata_catalog import MetadataCatalog
+
+try:
+    import pypff
+except ImportError:
+    # Sin libpff se puede usar un backend alternativo (fake_pypff) vía pst_backend
+    pypff = None
+
+# Propiedad MAPI PR_CONVERSATION_INDEX
+PR_CONVERSATION_INDEX = 0x0071
 
 
 class PSTExtractor:
-    def __init__(self, pst_file_path, output_dir="output"):
+    def __init__(self, pst_file_path, output_dir="output", pst_backend=None):
         self.pst_file_path = pst_file_path
+        # Módulo con la API de pypff (file().open/get_root_folder); por defecto pypff
+        self.pst_backend = pst_backend or pypff
         self.output_dir = Path(output_dir)
         self.emails_dir = self.output_dir / "emails"
         self.attachments_dir = self.output_dir / "attachments"
@@ -32,6 +44,12 @@ class PSTExtractor:
         self.total_count = 0
         self.progress_data = self.load_progress()
 
+        # Índice de hilos de conversación (se actualiza por mensaje)
+        self.thread_index = ThreadIndex(self.output_dir)
+
+        # Catálogo SQLite con los mismos metadatos (consultas sin abrir cada JSON)
+        self.catalog = MetadataCatalog(self.output_dir)
+
     def load_progress(self):
         """Carga el progreso previo si existe"""
         if self.progress_file.exists():
@@ -55,6 +73,23 @@ class PSTExtractor:
         with open(self.progress_file, 'w', encoding='utf-8') as f:
             json.dump(self.progress_data, f, indent=2, ensure_ascii=False)
 
+        self.thread_index.save()
+        self.catalog.commit()
+
+    def get_conversation_index(self, message):
+        """Obtener PR_CONVERSATION_INDEX (hex) de las propiedades del mensaje"""
+        try:
+            for set_index in range(message.get_number_of_record_sets()):
+                record_set = message.get_record_set(set_index)
+                for entry_index in range(record_set.get_number_of_entries()):
+                    entry = record_set.get_entry(entry_index)
+                    if entry.get_entry_type() == PR_CONVERSATION_INDEX:
+                        data = entry.get_data()
+                        return data.hex() if data else None
+        except:
+            pass
+        return None
+
     def extract_email_content(self, message):
         """Extrae el contenido de texto del email"""
         plain_text = ""
@@ -192,6 +227,13 @@ class PSTExtractor:
             if hasattr(message, 'modification_time'):
                 metadata['modification_time'] = message.modification_time.isoformat() if message.modification_time else None
 
+            # Propiedades de conversación para agrupar hilos
+            if hasattr(message, 'conversation_topic') and message.conversation_topic:
+                metadata['conversation_topic'] = message.conversation_topic
+            conversation_index = self.get_conversation_index(message)
+            if conversation_index:
+                metadata['conversation_index'] = conversation_index
+
             # Información de tamaño
             try:
                 metadata['size'] = message.get_size()
@@ -292,11 +334,14 @@ class PSTExtractor:
             metadata['attachments'] = attachments
             metadata['plain_text_length'] = len(plain_text) if plain_text else 0
             metadata['html_content_length'] = len(html_content) if html_content else 0
+            metadata['thread_id'] = thread_id_for(metadata)
+            self.thread_index.add(email_id, metadata['thread_id'])
 
             # Guardar metadatos
             metadata_path = self.metadata_dir / f"{email_id}.json"
             with open(metadata_path, 'w', encoding='utf-8') as f:
                 json.dump(metadata, f, indent=2, ensure_ascii=False)
+            self.catalog.add_email(metadata)
 
             # Actualizar progreso
             self.progress_data['processed_emails'].append(email_id)
@@ -314,8 +359,11 @@ class PSTExtractor:
         try:
             print(f"Abriendo archivo PST: {self.pst_file_path}")
 
+            if self.pst_backend is None:
+                raise RuntimeError("pypff no está instalado (pip install libpff-python)")
+
             # Abrir archivo PST
-            pst_file = pypff.file()
+            pst_file = self.pst_backend.file()
             pst_file.open(self.pst_file_path)
 
             # Inicializar progreso
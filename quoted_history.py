@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Separación del Historial Citado
+Detecta el inicio de la conversación citada en respuestas y reenvíos
+(encabezados De:/Enviado el:/Para: de Outlook, <blockquote>, divRplyFwdMsg)
+para que las reglas analicen primero solo el texto nuevo del email
+"""
+
+import re
+
+# Marcadores HTML de inicio del mensaje citado (Outlook, Gmail, Apple Mail, Thunderbird)
+HTML_QUOTE_MARKERS = re.compile(
+    r'<div[^>]+id=["\']?(?:x_)?divRplyFwdMsg'
+    r'|<hr[^>]+id=["\']?stopSpelling'
+    r'|<div[^>]+class=["\']?(?:gmail_quote|moz-cite-prefix|OutlookMessageHeader)'
+    r'|<div[^>]+style=["\'][^"\']*border-top:\s*solid\s+#(?:E1E1E1|B5C4DF)'
+    r'|<blockquote',
+    re.IGNORECASE
+)
+
+# Encabezados de respuesta en texto (el texto extraído del HTML queda en una sola línea).
+# Los encabezados distinguen mayúsculas para no cortar en frases como "datos para:"
+TEXT_QUOTE_MARKERS = re.compile(
+    r'\bDe:\s.{0,300}?\b(?:Enviado el|Enviado|Fecha):\s.{0,300}?\bPara:'
+    r'|\bFrom:\s.{0,300}?\b(?:Sent|Date):\s.{0,300}?\bTo:'
+    r'|-{2,}\s*(?i:Mensaje original|Original Message|Mensaje reenviado|Forwarded message)\s*-{2,}'
+    r'|\bEl\s.{0,200}?\sescribi[óo]:'
+    r'|\bOn\s.{0,200}?\swrote:',
+    re.DOTALL
+)
+
+# Líneas citadas con ">" en texto plano
+PLAIN_QUOTE_LINE = re.compile(r'^\s*>', re.MULTILINE)
+
+
+def split_html(html_content):
+    """Separar el HTML en (nuevo, citado) en el primer marcador de respuesta"""
+    match = HTML_QUOTE_MARKERS.search(html_content or '')
+    if not match:
+        return html_content or '', ''
+    return html_content[:match.start()], html_content[match.start():]
+
+
+def split_text(text):
+    """Separar texto en (nuevo, citado) en el primer encabezado de respuesta o línea con '>'"""
+    text = text or ''
+    boundaries = [
+        match.start()
+        for match in (TEXT_QUOTE_MARKERS.search(text), PLAIN_QUOTE_LINE.search(text))
+        if match
+    ]
+    if not boundaries:
+        return text, ''
+
+    boundary = min(boundaries)
+    return text[:boundary], text[boundary:]
+
+
+def html_to_text(html_content):
+    """Texto visible de un fragmento HTML"""
+    if not html_content:
+        return ''
+    # Importación diferida: bs4 solo se carga cuando hay un cuerpo HTML que convertir
+    from bs4 import BeautifulSoup
+    try:
+        soup = BeautifulSoup(html_content, 'html.parser')
+        return soup.get_text(separator=' ', strip=True)
+    except:
+        return ''
+
+
+def split_message(plain_text, html_content, quoted_to_text=html_to_text):
+    """Texto nuevo y texto citado de un email
+
+    Con HTML se corta primero por marcadores estructurales y luego por
+    encabezados de texto dentro de la parte nueva (respuestas de Outlook
+    que citan con <p> en vez de <div id=divRplyFwdMsg>). Sin HTML se usa
+    el texto plano. quoted_to_text convierte el HTML citado (el clasificador
+    reutiliza la conversión de otro email del mismo hilo).
+    """
+    if html_content:
+        new_html, quoted_html = split_html(html_content)
+        new_text, quoted_head = split_text(html_to_text(new_html))
+        quoted_text = ' '.join(part for part in (quoted_head, quoted_to_text(quoted_html)) if part)
+    else:
+        new_text, quoted_text = split_text(plain_text)
+
+    return {
+        'new_text': new_text.strip(),
+        'quoted_text': quoted_text.strip()
+    }
@@ -6,128 +6,176 @@ Aplica los nuevos criterios de clasificación mejorados
 
 import json
 import os
+import sqlite3
 from pathlib import Path
 from email_classifier import EmailClassifier
+from dashboard_snapshot import results_lock, stamp_results, write_snapshot
+from aggregate_cube import update_cube
+from entity_index import update_entity_index
+from classification_history import HISTORY_FILENAME, ClassificationHistory, record_classification_run
 from datetime import datetime
 
-def reclassify_all_emails():
-    """Re-clasificar todos los emails con los criterios mejorados"""
+def reclassify_all_emails(output_dir="output", progress=None):
+    """Re-clasificar todos los emails con los criterios mejorados
+
+    progress(procesados, total, mensaje=None) se llama antes de cada email con los
+    ya procesados, y una vez más al guardar; si lanza una excepción (cancelación
+    desde el dashboard) no se escribe nada.
+    Devuelve el resumen de la clasificación nueva (None si no hay resultados).
+    """
     print("🔄 Iniciando re-clasificación de emails con criterios mejorados...")
     print("=" * 60)
 
     # Inicializar el clasificador
-    classifier = EmailClassifier()
+    classifier = EmailClassifier(output_dir)
 
     # Cargar el archivo de clasificación existente
     classification_file = classifier.classification_dir / "classification_results.json"
 
-    if not classification_file.exists():
-        print("❌ Error: No se encontró el archivo de clasificación existente")
-        return
-
-    with open(classification_file, 'r', encoding='utf-8') as f:
-        existing_data = json.load(f)
-
-    print(f"📧 Emails a re-clasificar: {len(existing_data.get('emails', []))}")
-
-    # Estadísticas antes de la re-clasificación
-    stats_before = {
-        'cotizacion': 0,
-        'renovacion': 0,
-        'endoso': 0,
-        'sin_clasificar': 0
-    }
-
-    for email_info in existing_data.get('emails', []):
-        classification_type = email_info['primary_classification']['type']
-        if classification_type in stats_before:
-            stats_before[classification_type] += 1
-
-    print("\n📊 Clasificación ANTES:")
-    for tipo, count in stats_before.items():
-        print(f"   {tipo.capitalize()}: {count}")
-
-    # Re-clasificar cada email
-    reclassified_emails = []
-    improved_count = 0
-
-    for i, email_info in enumerate(existing_data.get('emails', [])):
-        email_id = email_info['email_id']
-
-        # Mostrar progreso
-        if (i + 1) % 100 == 0:
-            print(f"   Procesado: {i + 1}/{len(existing_data['emails'])}")
-
-        # Re-clasificar con los nuevos criterios
-        new_classification = classifier.classify_email(email_id)
-
-        if 'error' not in new_classification:
-            old_type = email_info['primary_classification']['type']
-            new_type = new_classification['primary_classification']['type']
-
-            # Verificar si hubo mejora en la clasificación
-            if old_type == 'sin_clasificar' and new_type != 'sin_clasificar':
-                improved_count += 1
-                print(f"✅ Mejorado: {email_id} - {old_type} → {new_type} ({new_classification['primary_classification']['confidence']}%)")
-            elif old_type != new_type:
-                print(f"🔄 Cambio: {email_id} - {old_type} → {new_type}")
-
-            reclassified_emails.append(new_classification)
-        else:
-            # Mantener clasificación anterior si hay error
-            reclassified_emails.append(email_info)
-
-    # Estadísticas después de la re-clasificación
-    stats_after = {
-        'cotizacion': 0,
-        'renovacion': 0,
-        'endoso': 0,
-        'sin_clasificar': 0
-    }
-
-    for email_info in reclassified_emails:
-        classification_type = email_info['primary_classification']['type']
-        if classification_type in stats_after:
-            stats_after[classification_type] += 1
-
-    print(f"\n📊 Clasificación DESPUÉS:")
-    for tipo, count in stats_after.items():
-        print(f"   {tipo.capitalize()}: {count}")
-
-    print(f"\n🎯 Emails mejorados: {improved_count}")
-
-    # Crear nuevo archivo de resultados
-    new_results = {
-        'classification_summary': {
-            'total_emails': len(reclassified_emails),
-            'cotizacion': stats_after['cotizacion'],
-            'renovacion': stats_after['renovacion'],
-            'endoso': stats_after['endoso'],
-            'sin_clasificar': stats_after['sin_clasificar'],
-            'accuracy_improvement': f"{improved_count} emails mejorados",
-            'reclassification_date': datetime.now().isoformat()
-        },
-        'classification_criteria': {
-            'threshold_lowered': 'Umbral bajado de 50% a 30%',
-            'improved_patterns': 'Patrones de endoso mejorados',
-            'html_analysis': 'Análisis de contenido HTML implementado',
-            'body_analysis': 'Análisis del cuerpo del email añadido'
-        },
-        'emails': reclassified_emails
-    }
-
-    # Guardar backup del archivo anterior
-    backup_file = classifier.classification_dir / f"classification_results_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    print(f"\n💾 Guardando backup en: {backup_file}")
-
-    with open(backup_file, 'w', encoding='utf-8') as f:
-        json.dump(existing_data, f, indent=2, ensure_ascii=False)
-
-    # Guardar nuevos resultados
-    print(f"💾 Guardando resultados mejorados en: {classification_file}")
-
-    with open(classification_file, 'w', encoding='utf-8') as f:
-        json.dump(new_results, f, indent=2, ensure_ascii=False)
+    with results_lock(classifier.classification_dir):
+        if not classification_file.exists():
+            print("❌ Error: No se encontró el archivo de clasificación existente")
+            return
+
+        with open(classification_file, 'r', encoding='utf-8') as f:
+            existing_data = json.load(f)
+
+        print(f"📧 Emails a re-clasificar: {len(existing_data.get('emails', []))}")
+
+        # Historial sin versiones (resultados anteriores al historial): registrar los
+        # resultados actuales como versión base para poder compararlos con esta ejecución
+        try:
+            history = ClassificationHistory(classifier.classification_dir)
+            if not history.has_runs() and existing_data.get('emails'):
+                history.record_run(existing_data['emails'], 'baseline')
+                print("🗃️  Resultados actuales registrados como versión base del historial")
+            history.close()
+        except sqlite3.Error as e:
+            # record_classification_run respalda los resultados actuales antes de sobrescribirlos
+            print(f"⚠️  No se pudo registrar la versión base en el historial: {e}")
+
+        # Estadísticas antes de la re-clasificación
+        stats_before = {
+            'cotizacion': 0,
+            'renovacion': 0,
+            'endoso': 0,
+            'sin_clasificar': 0
+        }
+
+        for email_info in existing_data.get('emails', []):
+            classification_type = email_info['primary_classification']['type']
+            if classification_type in stats_before:
+                stats_before[classification_type] += 1
+
+        print("\n📊 Clasificación ANTES:")
+        for tipo, count in stats_before.items():
+            print(f"   {tipo.capitalize()}: {count}")
+
+        # Re-clasificar cada email
+        reclassified_emails = []
+        improved_count = 0
+
+        for i, email_info in enumerate(existing_data.get('emails', [])):
+            email_id = email_info['email_id']
+
+            # Mostrar progreso
+            if (i + 1) % 100 == 0:
+                print(f"   Procesado: {i + 1}/{len(existing_data['emails'])}")
+            if progress:
+                progress(i, len(existing_data['emails']))
+
+            # Re-clasificar con los nuevos criterios (los casi duplicados reutilizan el análisis de su grupo)
+            new_classification = classifier.classify_or_reuse(email_id)
+
+            if 'error' not in new_classification:
+                old_type = email_info['primary_classification']['type']
+                new_type = new_classification['primary_classification']['type']
+
+                # Verificar si hubo mejora en la clasificación
+                if old_type == 'sin_clasificar' and new_type != 'sin_clasificar':
+                    improved_count += 1
+                    print(f"✅ Mejorado: {email_id} - {old_type} → {new_type} ({new_classification['primary_classification']['confidence']}%)")
+                elif old_type != new_type:
+                    print(f"🔄 Cambio: {email_id} - {old_type} → {new_type}")
+
+                reclassified_emails.append(new_classification)
+            else:
+                # Mantener clasificación anterior si hay error
+                reclassified_emails.append(email_info)
+
+        # Estadísticas después de la re-clasificación
+        stats_after = {
+            'cotizacion': 0,
+            'renovacion': 0,
+            'endoso': 0,
+            'sin_clasificar': 0
+        }
+
+        for email_info in reclassified_emails:
+            classification_type = email_info['primary_classification']['type']
+            if classification_type in stats_after:
+                stats_after[classification_type] += 1
+
+        print(f"\n📊 Clasificación DESPUÉS:")
+        for tipo, count in stats_after.items():
+            print(f"   {tipo.capitalize()}: {count}")
+
+        print(f"\n🎯 Emails mejorados: {improved_count}")
+
+        # Crear nuevo archivo de resultados
+        new_results = {
+            'classification_summary': {
+                'total_emails': len(reclassified_emails),
+                'cotizacion': stats_after['cotizacion'],
+                'renovacion': stats_after['renovacion'],
+                'endoso': stats_after['endoso'],
+                'sin_clasificar': stats_after['sin_clasificar'],
+                'accuracy_improvement': f"{improved_count} emails mejorados",
+                'reclassification_date': datetime.now().isoformat()
+            },
+            'classification_criteria': {
+                'threshold_lowered': 'Umbral bajado de 50% a 30%',
+                'improved_patterns': 'Patrones de endoso mejorados',
+                'html_analysis': 'Análisis de contenido HTML implementado',
+                'body_analysis': 'Análisis del cuerpo del email añadido'
+            },
+            'emails': reclassified_emails
+        }
+
+        if progress:
+            progress(len(reclassified_emails), len(reclassified_emails), 'Guardando resultados')
+
+        # Versión en el historial en lugar de un backup completo: solo los emails que
+        # cambiaron (la versión anterior se reconstruye con classification_history.py --restore)
+        run_id = record_classification_run(classifier, reclassified_emails, 'reclassify_emails', summary=stats_after)
+        if run_id:
+            print(f"\n🗃️  Versión {run_id} registrada en el historial ({classifier.classification_dir / HISTORY_FILENAME})")
+
+        # Guardar nuevos resultados
+        print(f"💾 Guardando resultados mejorados en: {classification_file}")
+
+        stamp_results(new_results)
+        with open(classification_file, 'w', encoding='utf-8') as f:
+            json.dump(new_results, f, indent=2, ensure_ascii=False)
+
+        # Regenerar snapshot binario del dashboard y matriz de reglas
+        write_snapshot(new_results, classification_file)
+        if classifier.duplicates is not None:
+            classifier.duplicates.save(classifier.classification_dir)
+        classifier.save_feature_matrix(reclassified_emails)
+
+        # Cubo de agregados: solo se aplican los emails que cambiaron de celda o de confianza
+        cube_changes = update_cube(classifier.classification_dir, existing_data.get('emails', []),
+                                   reclassified_emails, all_emails=reclassified_emails)
+        print(f"🧊 Cubo de agregados actualizado ({cube_changes} emails)")
+
+        # Índice de pólizas y agentes: solo los emails cuyas entidades cambiaron
+        entity_changes = update_entity_index(classifier.classification_dir, reclassified_emails,
+                                             all_emails=reclassified_emails)
+        print(f"🔎 Índice de entidades actualizado ({entity_changes} emails)")
+
+        # Emails que excedieron su presupuesto (reprocesar con reprocess_quarantine.py)
+        classifier.save_quarantine(email_info['email_id'] for email_info in reclassified_emails)
 
     print("\n✅ Re-clasificación completada!")
     print("=" * 60)
@@ -148,5 +196,7 @@ def reclassify_all_emails():
    • Mejor detección de códigos de agente y pólizas
     """)
 
+    return new_results['classification_summary']
+
 if __name__ == "__main__":
     reclassify_all_emails()
\ No newline at end of file
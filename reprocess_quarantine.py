@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Reprocesar Emails en Cuarentena
+Vuelve a clasificar los emails que excedieron su presupuesto en la ejecución
+principal, con presupuestos ampliados, y actualiza los resultados en su lugar
+Uso: python reprocess_quarantine.py [output_dir] [--budget-scale N] [--no-budget] [--limit N]
+"""
+
+import argparse
+import json
+import sys
+
+from aggregate_cube import update_cube
+from entity_index import update_entity_index
+from classification_history import record_classification_run
+from dashboard_snapshot import results_lock, stamp_results, write_snapshot
+from email_classifier import CATEGORIES, QUARANTINE_FILENAME, EmailClassifier
+
+# Factor por defecto sobre los presupuestos de la ejecución principal
+DEFAULT_BUDGET_SCALE = 10.0
+
+
+def load_quarantine(classifier):
+    """Entradas de cuarentena por email_id"""
+    quarantine_file = classifier.classification_dir / QUARANTINE_FILENAME
+    if not quarantine_file.exists():
+        return {}
+    with open(quarantine_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('emails', {})
+
+
+def update_counts(results):
+    """Recalcular los conteos por categoría (formato de email_classifier o de reclassify_emails)"""
+    emails = results.get('emails', [])
+    counts = {category: 0 for category in CATEGORIES + ['sin_clasificar']}
+    for email_info in emails:
+        primary_type = email_info['primary_classification']['type']
+        if primary_type in counts:
+            counts[primary_type] += 1
+
+    summary = results['classification_summary'] if 'classification_summary' in results else results
+    summary['total_emails'] = len(emails)
+    summary.update(counts)
+    if 'total_threads' in results:
+        results['total_threads'] = len({email_info.get('thread_id') for email_info in emails})
+    if 'quarantined' in results:
+        results['quarantined'] = sum(1 for email_info in emails if 'degraded' in email_info)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocesar emails en cuarentena")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--budget-scale', type=float, default=DEFAULT_BUDGET_SCALE,
+                        help="Multiplicador de los presupuestos de tiempo y tamaño")
+    parser.add_argument('--no-budget', action='store_true', help="Reprocesar sin presupuestos")
+    parser.add_argument('--limit', type=int, default=None, help="Máximo de emails a reprocesar")
+    args = parser.parse_args()
+
+    classifier = EmailClassifier(
+        args.output_dir,
+        budgets=not args.no_budget,
+        budget_scale=args.budget_scale
+    )
+
+    print("🧪 REPROCESO DE EMAILS EN CUARENTENA")
+    print("=" * 60)
+
+    quarantine = load_quarantine(classifier)
+    email_ids = sorted(quarantine)[:args.limit] if args.limit else sorted(quarantine)
+    if not email_ids:
+        print("✅ No hay emails en cuarentena")
+        return
+
+    results_file = classifier.classification_dir / 'classification_results.json'
+    if not results_file.exists():
+        print("❌ Error: No se encontró classification_results.json")
+        sys.exit(1)
+
+    with results_lock(classifier.classification_dir):
+        with open(results_file, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+
+        positions = {email_info['email_id']: i for i, email_info in enumerate(results.get('emails', []))}
+
+        resolved = 0
+        previous = []
+        updated = []
+        for email_id in email_ids:
+            entry = quarantine[email_id]
+            classification = classifier.classify_email(email_id)
+            if 'error' in classification:
+                print(f"⚠️  {email_id}: {classification['error']}")
+                continue
+
+            if email_id in positions:
+                previous.append(results['emails'][positions[email_id]])
+                results['emails'][positions[email_id]] = classification
+            else:
+                results['emails'].append(classification)
+            updated.append(classification)
+
+            if 'degraded' in classification:
+                print(f"⏳ {email_id}: sigue excediendo el presupuesto en '{classification['degraded']['stage']}'")
+            else:
+                resolved += 1
+                print(f"✅ {email_id}: {entry['stage']} → {classification['primary_classification']['type']} "
+                      f"({classification['primary_classification']['confidence']}%)")
+
+        update_counts(results)
+
+        # Versión parcial en el historial: solo los emails reprocesados que cambiaron
+        record_classification_run(classifier, updated, 'reprocess_quarantine', complete=False)
+
+        stamp_results(results)
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+        write_snapshot(results, results_file)
+        classifier.save_feature_matrix(results['emails'])
+        update_cube(classifier.classification_dir, previous, updated, all_emails=results['emails'])
+        update_entity_index(classifier.classification_dir, updated, all_emails=results['emails'])
+        classifier.save_quarantine(email_ids)
+
+        print(f"\n📊 Reprocesados: {len(email_ids)} | Resueltos: {resolved} | "
+              f"En cuarentena: {len(load_quarantine(classifier))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Métricas de Peticiones del Dashboard
+Middleware WSGI con histogramas de latencia y tamaño de respuesta por ruta,
+peticiones en curso, tiempos por etapa (filtro del DataFrame, serialización,
+E/S de archivos, ZIP) y exposición en formato de texto de Prometheus. Opcionalmente
+guarda un perfil cProfile de las peticiones lentas
+"""
+
+import cProfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from flask import g, has_request_context, request
+
+# Buckets de latencia (segundos) y de tamaño de respuesta (bytes)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+
+# Clave del entorno WSGI con la ruta (regla de Flask) de la petición
+ROUTE_ENVIRON_KEY = 'dashboard.route'
+
+# Ruta para peticiones sin regla (404) y etapas fuera de una petición
+UNMATCHED_ROUTE = 'unmatched'
+BACKGROUND_ROUTE = 'background'
+
+
+class Histogram:
+    """Histograma acumulado por combinación de etiquetas (formato Prometheus)"""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            label_text = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def format_labels(names, values):
+    """Etiquetas Prometheus con comillas y barras escapadas"""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class RequestMetrics:
+    """Registro de métricas del proceso (seguro entre hilos)"""
+
+    def __init__(self, slow_request_ms=None, profile_dir=None):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.request_duration = Histogram(
+            'dashboard_request_duration_seconds', 'Duración de las peticiones, incluida la respuesta en streaming',
+            LATENCY_BUCKETS, ('route', 'method', 'status')
+        )
+        self.response_size = Histogram(
+            'dashboard_response_size_bytes', 'Bytes enviados por respuesta', SIZE_BUCKETS, ('route', 'method')
+        )
+        self.stage_duration = Histogram(
+            'dashboard_stage_duration_seconds', 'Duración de etapas internas (filtro, serialización, E/S)',
+            LATENCY_BUCKETS, ('route', 'stage')
+        )
+        self.in_flight = {}
+        self.counters = {}
+
+        # Perfil cProfile de peticiones lentas (desactivado si slow_request_ms es None)
+        self.slow_request_ms = slow_request_ms
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+
+    def add_in_flight(self, route, delta):
+        with self.lock:
+            self.in_flight[route] = self.in_flight.get(route, 0) + delta
+
+    def increment(self, name, labels=(), amount=1):
+        """Contador simple: dashboard_<name>_total"""
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe_request(self, route, method, status, seconds, size):
+        with self.lock:
+            self.request_duration.observe((route, method, status), seconds)
+            if size is not None:
+                self.response_size.observe((route, method), size)
+
+    @contextmanager
+    def stage(self, name):
+        """Medir una etapa; dentro de una petición se suma también a su Server-Timing"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            route = BACKGROUND_ROUTE
+            if has_request_context():
+                route = request.environ.get(ROUTE_ENVIRON_KEY, UNMATCHED_ROUTE)
+                timings = g.setdefault('stage_timings', {})
+                timings[name] = timings.get(name, 0.0) + elapsed
+            with self.lock:
+                self.stage_duration.observe((route, name), elapsed)
+
+    def render(self):
+        """Exposición en formato de texto de Prometheus (versión 0.0.4)"""
+        with self.lock:
+            lines = [
+                "# HELP dashboard_uptime_seconds Segundos desde el arranque del proceso",
+                "# TYPE dashboard_uptime_seconds gauge",
+                f"dashboard_uptime_seconds {time.time() - self.started:.3f}",
+                "# HELP dashboard_requests_in_flight Peticiones en curso por ruta",
+                "# TYPE dashboard_requests_in_flight gauge"
+            ]
+            lines += [f'dashboard_requests_in_flight{{route="{route}"}} {count}'
+                      for route, count in sorted(self.in_flight.items())]
+
+            for name in sorted({name for name, _ in self.counters}):
+                lines += [f"# TYPE dashboard_{name}_total counter"]
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        label_text = format_labels(*zip(*labels)) if labels else ''
+                        lines.append(f"dashboard_{name}_total{{{label_text}}} {value}")
+
+            for histogram in (self.request_duration, self.response_size, self.stage_duration):
+                lines += histogram.render()
+        return "\n".join(lines) + "\n"
+
+    def dump_profile(self, profile, route, seconds):
+        """Guardar el perfil de una petición lenta (abrir con python -m pstats o snakeviz)"""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        safe_route = ''.join(c if c.isalnum() else '_' for c in route).strip('_') or 'root'
+        profile_file = self.profile_dir / (
+            f"{datetime.now():%Y%m%d_%H%M%S_%f}_{safe_route}_{seconds * 1000:.0f}ms.prof"
+        )
+        profile.dump_stats(profile_file)
+        return profile_file
+
+
+class MetricsMiddleware:
+    """Mide cada petición desde que entra hasta que se envía el último byte"""
+
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        state = {'status': '500', 'content_length': None}
+
+        def capture_start_response(status, headers, exc_info=None):
+            state['status'] = status.split(' ', 1)[0]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    state['content_length'] = int(value)
+            return start_response(status, headers, exc_info)
+
+        self.metrics.add_in_flight('*', 1)
+        try:
+            iterable = self.wsgi_app(environ, capture_start_response)
+        except Exception:
+            self.finish(environ, state, start, 0)
+            raise
+
+        return self.iterate(iterable, environ, state, start)
+
+    def iterate(self, iterable, environ, state, start):
+        """Reenviar el cuerpo contando bytes; registrar al cerrar (streaming incluido)"""
+        sent = 0
+        try:
+            for chunk in iterable:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+            self.finish(environ, state, start, sent)
+
+    def finish(self, environ, state, start, sent):
+        route = environ.get(ROUTE_ENVIRON_KEY, UNMATCHED_ROUTE)
+        size = state['content_length'] if state['content_length'] is not None else sent
+        self.metrics.add_in_flight('*', -1)
+        if environ.pop('dashboard.route_in_flight', False):
+            self.metrics.add_in_flight(route, -1)
+        self.metrics.observe_request(route, environ.get('REQUEST_METHOD', 'GET'), state['status'],
+                                     time.perf_counter() - start, size)
+
+
+def install(app, metrics):
+    """Registrar el middleware y los hooks de Flask en la aplicación"""
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics)
+
+    @app.before_request
+    def start_request_metrics():
+        route = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+        request.environ[ROUTE_ENVIRON_KEY] = route
+        request.environ['dashboard.route_in_flight'] = True
+        metrics.add_in_flight(route, 1)
+        g.request_start = time.perf_counter()
+
+        if metrics.slow_request_ms is not None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                g.request_profile = profile
+            except ValueError:
+                # Otro hilo ya está perfilando (un solo perfilador activo por proceso)
+                pass
+
+    @app.after_request
+    def add_server_timing(response):
+        # Tiempos por etapa visibles en las herramientas de desarrollo del navegador
+        timings = g.get('stage_timings')
+        if timings:
+            response.headers['Server-Timing'] = ', '.join(
+                f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()
+            )
+        return response
+
+    @app.teardown_request
+    def stop_request_profile(exc=None):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return
+        profile.disable()
+        seconds = time.perf_counter() - g.get('request_start', time.perf_counter())
+        if seconds * 1000 >= metrics.slow_request_ms:
+            route = request.environ.get(ROUTE_ENVIRON_KEY, UNMATCHED_ROUTE)
+            profile_file = metrics.dump_profile(profile, route, seconds)
+            metrics.increment('slow_request_profiles', (('route', route),))
+            print(f"🐢 Petición lenta {request.path} ({seconds * 1000:.0f} ms): perfil en {profile_file}")
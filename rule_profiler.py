@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Perfil de Reglas del Clasificador
+Acumula, para todo un lote, cuántas veces se evalúa y se cumple cada patrón de
+setup_patterns (y de extracción de agente/póliza), su tiempo de búsqueda, las
+reglas de SCORING_RULES aplicadas y el tiempo por etapa (MIME, HTML, adjuntos,
+Excel, puntuación). Se exporta a JSON/CSV con una tabla resumen
+Uso: python email_classifier.py --profile  |  python rule_profiler.py [output/classification/rule_profile.json]
+"""
+
+import csv
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Archivos de salida (en output/classification)
+PROFILE_JSON_FILENAME = 'rule_profile.json'
+PROFILE_CSV_FILENAME = 'rule_profile.csv'
+
+# Columnas por patrón: evaluaciones, coincidencias, emails con coincidencia, segundos, último email contado
+EVALUATIONS, HITS, EMAILS_HIT, SECONDS, LAST_EMAIL = range(5)
+
+
+class RuleProfiler:
+    """Contadores acumulados de un lote de clasificación
+
+    Los patrones de una misma regla se evalúan en orden y la búsqueda se detiene
+    en la primera coincidencia, así que 'hits' indica qué patrón decidió la regla.
+    """
+
+    def __init__(self):
+        self.patterns = {}
+        self.rules = {}
+        self.stages = {}
+        self.emails = 0
+        self.current_email = None
+        self.started = datetime.now().isoformat()
+
+    def start_email(self, email_id):
+        """Nuevo email: las coincidencias siguientes cuentan para emails_hit una vez"""
+        self.emails += 1
+        self.current_email = email_id
+
+    def record_pattern(self, group, pattern, hit, seconds):
+        """Una búsqueda de un patrón de un grupo (cotizacion_asunto, poliza_number, ...)"""
+        counters = self.patterns.get((group, pattern))
+        if counters is None:
+            counters = self.patterns[(group, pattern)] = [0, 0, 0, 0.0, None]
+        counters[EVALUATIONS] += 1
+        counters[SECONDS] += seconds
+        if hit:
+            counters[HITS] += 1
+            if counters[LAST_EMAIL] != self.current_email:
+                counters[LAST_EMAIL] = self.current_email
+                counters[EMAILS_HIT] += 1
+
+    def record_rule(self, category, signal):
+        """Regla de SCORING_RULES aplicada a la puntuación"""
+        key = (category, signal)
+        self.rules[key] = self.rules.get(key, 0) + 1
+
+    def record_stage(self, stage, seconds):
+        """Duración de una etapa de un email"""
+        counters = self.stages.get(stage)
+        if counters is None:
+            counters = self.stages[stage] = [0, 0.0, 0.0]
+        counters[0] += 1
+        counters[1] += seconds
+        if seconds > counters[2]:
+            counters[2] = seconds
+
+    def pattern_rows(self):
+        """Filas por patrón, de mayor a menor tiempo total"""
+        rows = []
+        for (group, pattern), counters in self.patterns.items():
+            evaluations = counters[EVALUATIONS]
+            rows.append({
+                'group': group,
+                'pattern': pattern,
+                'evaluations': evaluations,
+                'hits': counters[HITS],
+                'emails_hit': counters[EMAILS_HIT],
+                'hit_rate': round(counters[HITS] / evaluations, 4) if evaluations else 0,
+                'total_ms': round(counters[SECONDS] * 1000, 3),
+                'mean_us': round(counters[SECONDS] / evaluations * 1e6, 3) if evaluations else 0
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def stage_rows(self):
+        """Filas por etapa en orden de registro"""
+        return [
+            {
+                'stage': stage,
+                'calls': calls,
+                'total_ms': round(seconds * 1000, 3),
+                'mean_ms': round(seconds / calls * 1000, 4) if calls else 0,
+                'max_ms': round(maximum * 1000, 3)
+            }
+            for stage, (calls, seconds, maximum) in self.stages.items()
+        ]
+
+    def rule_rows(self):
+        """Veces que se aplicó cada regla de puntuación"""
+        rows = [{'category': category, 'signal': signal, 'emails': count}
+                for (category, signal), count in self.rules.items()]
+        rows.sort(key=lambda row: row['emails'], reverse=True)
+        return rows
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'finished': datetime.now().isoformat(),
+            'emails': self.emails,
+            'stages': self.stage_rows(),
+            'rules': self.rule_rows(),
+            'patterns': self.pattern_rows()
+        }
+
+    def save(self, classification_dir):
+        """Escribir rule_profile.json y rule_profile.csv (una fila por patrón)"""
+        classification_dir = Path(classification_dir)
+        profile = self.to_dict()
+
+        json_file = classification_dir / PROFILE_JSON_FILENAME
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2, ensure_ascii=False)
+
+        csv_file = classification_dir / PROFILE_CSV_FILENAME
+        fields = ['group', 'pattern', 'evaluations', 'hits', 'emails_hit', 'hit_rate', 'total_ms', 'mean_us']
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(profile['patterns'])
+
+        return json_file, csv_file
+
+
+def summary_table(profile, top=15):
+    """Tabla de texto con etapas, patrones más costosos y patrones que más coinciden"""
+    emails = max(profile['emails'], 1)
+    lines = [f"PERFIL DE REGLAS ({profile['emails']} emails)", "", "ETAPAS:"]
+    lines.append(f"  {'etapa':<18}{'llamadas':>10}{'total ms':>12}{'ms/email':>10}{'máx ms':>10}")
+    for row in profile['stages']:
+        lines.append(f"  {row['stage']:<18}{row['calls']:>10}{row['total_ms']:>12.1f}"
+                     f"{row['total_ms'] / emails:>10.3f}{row['max_ms']:>10.2f}")
+
+    def pattern_lines(rows):
+        table = [f"  {'grupo':<22}{'patrón':<40}{'evals':>9}{'hits':>8}{'emails':>8}{'total ms':>10}{'µs':>8}"]
+        for row in rows[:top]:
+            pattern = row['pattern'] if len(row['pattern']) <= 38 else row['pattern'][:35] + '...'
+            table.append(f"  {row['group']:<22}{pattern:<40}{row['evaluations']:>9}{row['hits']:>8}"
+                         f"{row['emails_hit']:>8}{row['total_ms']:>10.1f}{row['mean_us']:>8.2f}")
+        return table
+
+    lines += ["", f"PATRONES MÁS COSTOSOS (top {top}):"] + pattern_lines(profile['patterns'])
+    by_hits = sorted(profile['patterns'], key=lambda row: row['emails_hit'], reverse=True)
+    lines += ["", f"PATRONES CON MÁS COINCIDENCIAS (top {top}):"] + pattern_lines(by_hits)
+    never = [row for row in profile['patterns'] if not row['hits']]
+    lines += ["", f"Patrones sin coincidencias: {len(never)}"]
+    lines += [f"  {row['group']}: {row['pattern']}" for row in never[:top]]
+    if len(never) > top:
+        lines.append(f"  ... y {len(never) - top} más (ver rule_profile.csv)")
+
+    lines += ["", "REGLAS APLICADAS:"]
+    lines += [f"  {row['category'] + '.' + row['signal']:<40}{row['emails']:>8} ({row['emails'] / emails:.1%})"
+              for row in profile['rules']]
+    return "\n".join(lines)
+
+
+def main():
+    profile_file = Path(sys.argv[1] if len(sys.argv) > 1 else f"output/classification/{PROFILE_JSON_FILENAME}")
+    if not profile_file.exists():
+        print(f"❌ No existe {profile_file} (ejecute python email_classifier.py --profile)")
+        sys.exit(1)
+
+    with open(profile_file, 'r', encoding='utf-8') as f:
+        print(summary_table(json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
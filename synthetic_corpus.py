@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Generador de Corpus Sintético
+Crea un directorio con la misma estructura que produce PSTExtractor
+(emails/, attachments/, metadata/, progress.json, threads.json) con asuntos
+y cuerpos realistas de seguros, SLIP en Excel y PDFs, para medir el
+extractor, el clasificador y el dashboard sin correo de producción
+Uso: python synthetic_corpus.py <output_dir> --emails 10000 [--seed 42] [--workers 4]
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from metadata_catalog import MetadataCatalog
+from thread_index import ThreadIndex, normalize_subject, thread_id_for
+
+# Carpetas del PST original
+FOLDERS = [
+    ('Principio del archivo de datos de Outlook/ASIGNADOS', 0.46),
+    ('Principio del archivo de datos de Outlook/PRODUCCION ', 0.46),
+    ('Principio del archivo de datos de Outlook/DEPURADOS', 0.08)
+]
+
+# Tipos de email y su proporción en el corpus
+EMAIL_KINDS = [('cotizacion', 0.35), ('renovacion', 0.25), ('endoso', 0.2), ('otro', 0.2)]
+
+CLIENTS = [
+    'ROK EQUIPOS DE CONSTRUCCION', 'TRANSPORTES REFRIGERADOS 5 ESTRELLAS', 'OPERADORA SUMA PARK, S. DE R.L. DE C.V.',
+    'SERVICIOS EDUCATIVOS MOSED SA DE CV', 'PROGILBA DEL SURESTE', 'EVONIK', 'DAYVO DIGITAL', 'BISBA',
+    'RESTAURANTE ENCANTO MASARYK', 'FIDEICOMISO MURANO', 'MSC INDUSTRIALSUPPLY', 'EUROCAST MEXICO'
+]
+PRODUCTS = ['GMM', 'VIDA GRUPO', 'EQ CONTRATISTAS', 'RC ESTACIONAMIENTO', 'AP ESCOLAR', 'OBRA CIVIL',
+            'AUTO RC', 'EMPRESARIAL', 'TRANSPORTE DE CARGA', 'HOGAR']
+SENDERS = [
+    ('Liliana Añorve Cortez', 'lanorve@agentes.mx'), ('Jorge Rodrigo Bélchez', 'jbelchez@promotoria.mx'),
+    ('Gabriela Fesh', 'gfesh@segurosfesh.mx'), ('Francisco José Narváez', 'fnarvaez@miurarisk.mx'),
+    ('Mesa de Control SURA', 'mesacontrol@sura.mx'), ('Ana Luisa Ortega', 'aortega@agentes.mx')
+]
+
+SUBJECT_TEMPLATES = {
+    'cotizacion': [
+        'COTIZACIÓN {product} | {client} | AGENTE {agent}',
+        'Solicitud de cotización {product} - {client}',
+        'COT RESIDENCIAL AG {agent} {client}',
+        'AGENTE: {agent} / COTIZACION POLIZA {product} / {client}',
+        'Apoyo para cotizar Seguro de {product} /{agent} {client}'
+    ],
+    'renovacion': [
+        'RENOVACIÓN Póliza {poliza} {client}',
+        'SOLICITUD DE RENOVACION POLIZA {product} // {client}',
+        '{client} | RENOVACIÓN {product} | VIG 25-26',
+        'Renovar póliza {poliza} - {product}'
+    ],
+    'endoso': [
+        'ENDOSO A póliza {poliza} {client}',
+        'ENDOSO (MODIFICACIÓN) OT-{ot} {client}',
+        '{poliza} {client} ENDOSO',
+        'Alta de participantes - endoso B {product} {client}'
+    ],
+    'otro': [
+        'PAGO DIFERENCIA {product} PÓLIZA {poliza}',
+        'PLD// {client}// ESTATUS',
+        'Portal SURA - EMISIÓN NUEVO NEGOCIO {product}',
+        'Confirmación de recepción de documentos',
+        'Reunión de seguimiento {client}'
+    ]
+}
+
+BODY_TEMPLATES = {
+    'cotizacion': 'Buen día, solicito su apoyo cotizando {product} para {client}. AGENTE {agent}. Adjunto SLIP con la información.',
+    'renovacion': 'Estimados, la vigencia de la póliza {poliza} está próxima a vencer, favor de renovar conforme a condiciones de renovación.',
+    'endoso': 'Favor de realizar la corrección de datos del inciso {inciso} de la póliza {poliza} mediante endoso.',
+    'otro': 'Quedo atento a sus comentarios. Saludos cordiales.'
+}
+
+REPLY_PREFIXES = ['RE: ', 'RV: ', 'Re: ', 'Fwd: ']
+
+# Proporción de emails que responden a un hilo existente
+REPLY_RATE = 0.4
+
+# Proporción por defecto de copias (CC, reenvíos del mismo correo) de un email anterior
+DEFAULT_DUPLICATE_RATE = 0.0
+
+# Tamaño por defecto de los PDFs sintéticos
+DEFAULT_PDF_KB = 40
+
+# Emails por tarea al generar en paralelo
+CHUNK_SIZE = 2000
+
+
+def weighted_choice(rng, options):
+    """Elegir un valor de [(valor, peso), ...]"""
+    values, weights = zip(*options)
+    return rng.choices(values, weights=weights)[0]
+
+
+def build_slip(filled_rows):
+    """Bytes de un SLIP en Excel con filled_rows filas de datos"""
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Concepto', 'Valor'])
+    for row in range(filled_rows):
+        sheet.append([f'Dato {row + 1}', f'Valor {row + 1}'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def build_pdf(size_kb):
+    """Bytes de un PDF mínimo válido, rellenado hasta size_kb"""
+    header = b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n2 0 obj << /Type /Pages /Kids [] /Count 0 >> endobj\n'
+    trailer = b'trailer << /Root 1 0 R >>\n%%EOF\n'
+    padding = max(0, size_kb * 1024 - len(header) - len(trailer))
+    return header + b'%' + b'0' * max(0, padding - 2) + b'\n' + trailer
+
+
+class CorpusTemplates:
+    """Adjuntos binarios generados una sola vez y copiados a cada email"""
+
+    def __init__(self, pdf_kb=DEFAULT_PDF_KB):
+        self.slip_complete = build_slip(6)
+        self.slip_empty = build_slip(0)
+        self.pdf = build_pdf(pdf_kb)
+        self.jpg = b'\xff\xd8\xff\xe0' + b'\x00' * 4096 + b'\xff\xd9'
+
+
+def thread_topic(seed, thread_key):
+    """Asunto base, tipo y valores de un hilo (deterministas por hilo)"""
+    rng = random.Random(seed * 1_000_003 + thread_key)
+    kind = weighted_choice(rng, EMAIL_KINDS)
+    values = {
+        'client': rng.choice(CLIENTS),
+        'product': rng.choice(PRODUCTS),
+        'agent': rng.randint(1000, 99999),
+        'poliza': f"{rng.randint(1, 9)}-{rng.randint(100, 999)}-{rng.randint(10000, 99999)}",
+        'ot': f"{rng.randint(0, 9999999):07d}",
+        'inciso': rng.randint(1, 12)
+    }
+    subject = rng.choice(SUBJECT_TEMPLATES[kind]).format(**values)
+    return kind, subject, BODY_TEMPLATES[kind].format(**values), values
+
+
+def attachments_for(rng, kind, values, templates, attachment_rate):
+    """Lista de (nombre, bytes) según el tipo de email"""
+    if rng.random() > attachment_rate:
+        return []
+
+    client = values['client'].split(',')[0][:30]
+    if kind == 'cotizacion':
+        files = [(f"SLIP {client}.xlsx", templates.slip_complete if rng.random() < 0.6 else templates.slip_empty)]
+        if rng.random() < 0.5:
+            files.append((f"COTIZACION {values['product']}.pdf", templates.pdf))
+    elif kind == 'renovacion':
+        files = [(f"CONDICIONES DE RENOVACION {values['poliza']}.pdf", templates.pdf)]
+        if rng.random() < 0.5:
+            files.append((f"POLIZA {values['poliza']}.pdf", templates.pdf))
+    elif kind == 'endoso':
+        files = [(f"ENDOSO {values['poliza']}.pdf", templates.pdf)]
+        if rng.random() < 0.3:
+            files.append((f"MODIFICACION INCISO {values['inciso']}.xlsx", templates.slip_complete))
+    else:
+        files = [('imagen001.jpg', templates.jpg)] if rng.random() < 0.5 else [('RECIBO.pdf', templates.pdf)]
+
+    return files
+
+
+def html_body(body, quoted=None):
+    """Cuerpo HTML con estilo de Outlook; las respuestas incluyen el mensaje citado"""
+    html = f"<html><head><meta charset=\"utf-8\"></head><body><div><p>{body}</p></div>"
+    if quoted:
+        sender_name, sender_email, sent, original_subject, original_body = quoted
+        html += (
+            '<hr style="display:inline-block;width:98%" tabindex="-1">'
+            '<div id="divRplyFwdMsg" dir="ltr">'
+            f'<b>De:</b> {sender_name} &lt;{sender_email}&gt;<br>'
+            f'<b>Enviado el:</b> {sent}<br>'
+            '<b>Para:</b> Mesa de Control SURA<br>'
+            f'<b>Asunto:</b> {original_subject}</div>'
+            f'<div><p>{original_body}</p></div>'
+        )
+    return html + "</body></html>"
+
+
+def write_eml(path, subject, sender_name, sender_email, delivery_time, plain_text, html_content):
+    """Mismo formato que PSTExtractor.create_eml_file"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"{sender_name} <{sender_email}>"
+    msg['Date'] = delivery_time.strftime("%a, %d %b %Y %H:%M:%S %z")
+    msg.attach(MIMEText(plain_text, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(msg))
+
+
+def generate_range(output_dir, start, end, seed, attachment_rate, pdf_kb, duplicate_rate=DEFAULT_DUPLICATE_RATE):
+    """Generar los emails start..end-1 (1-based); devuelve [(email_id, thread_id)]"""
+    output_dir = Path(output_dir)
+    templates = CorpusTemplates(pdf_kb)
+    extraction_date = datetime(2025, 9, 19, 12, 0, 0)
+    base_date = datetime(2025, 1, 1, 8, 0, 0)
+    threads = []
+    generated = []
+
+    for number in range(start, end):
+        rng = random.Random(seed * 7_919 + number)
+        email_id = f"email_{number:06d}"
+
+        if generated and rng.random() < duplicate_rate:
+            # Copia de un email anterior (CC a otra carpeta o reenvío del mismo correo)
+            source = rng.choice(generated)
+            is_reply, thread_key = source['is_reply'], source['thread_key']
+            kind, values = source['kind'], source['values']
+            subject, plain_text, html_content = source['subject'], source['plain_text'], source['html_content']
+            sender_name, sender_email = source['sender']
+            delivery_time = source['delivery_time'] + timedelta(minutes=rng.randint(1, 120))
+            files = source['files']
+        else:
+            # Respuesta a un hilo anterior o conversación nueva
+            is_reply = number > 3 and rng.random() < REPLY_RATE
+            thread_key = rng.randrange(1, number) if is_reply else number
+            kind, base_subject, base_body, values = thread_topic(seed, thread_key)
+
+            sender_name, sender_email = rng.choice(SENDERS)
+            delivery_time = base_date + timedelta(minutes=rng.randint(0, 365 * 24 * 60), microseconds=rng.randint(0, 999999))
+
+            if is_reply:
+                subject = rng.choice(REPLY_PREFIXES) + base_subject
+                body = rng.choice(['Gracias, quedo atento.', 'Se envía información complementaria.', base_body])
+                original_sender = SENDERS[thread_key % len(SENDERS)]
+                quoted = (original_sender[0], original_sender[1], 'lunes, 4 de agosto de 2025 10:15',
+                          base_subject, base_body)
+            else:
+                subject, body, quoted = base_subject, base_body, None
+
+            html_content = html_body(body, quoted)
+            plain_text = body
+            files = attachments_for(rng, kind, values, templates, attachment_rate)
+            if duplicate_rate:
+                generated.append({
+                    'is_reply': is_reply, 'thread_key': thread_key, 'kind': kind, 'values': values,
+                    'subject': subject, 'plain_text': plain_text, 'html_content': html_content,
+                    'sender': (sender_name, sender_email), 'delivery_time': delivery_time, 'files': files
+                })
+
+        eml_path = output_dir / "emails" / f"{email_id}.eml"
+        write_eml(eml_path, subject, sender_name, sender_email, delivery_time, plain_text, html_content)
+
+        attachments = []
+        if files:
+            attachment_dir = output_dir / "attachments" / email_id
+            attachment_dir.mkdir(exist_ok=True)
+            for filename, data in files:
+                (attachment_dir / filename).write_bytes(data)
+                attachments.append({
+                    'filename': filename,
+                    'size': len(data),
+                    'path': f"attachments/{email_id}/{filename}"
+                })
+
+        # Mismas claves y orden que PSTExtractor.extract_metadata + process_message
+        conversation_index = (
+            f"01{thread_key:010x}{seed & 0xffffffff:08x}".ljust(44, '0')
+            + ''.join(f"{rng.randrange(256):02x}" for _ in range(5 if is_reply else 0))
+        )
+        metadata = {
+            'id': email_id,
+            'folder': weighted_choice(rng, FOLDERS),
+            'extraction_date': extraction_date.isoformat(),
+            'subject': subject,
+            'sender_name': sender_name,
+            'sender_email': sender_email,
+            'delivery_time': delivery_time.isoformat(),
+            'creation_time': (delivery_time + timedelta(hours=1)).isoformat(),
+            'modification_time': (delivery_time + timedelta(hours=2)).isoformat(),
+            'conversation_topic': normalize_subject(base_subject).title(),
+            'conversation_index': conversation_index,
+            'size': eml_path.stat().st_size + sum(item['size'] for item in attachments),
+            'attachment_count': len(attachments),
+            'eml_file': f"emails/{email_id}.eml",
+            'attachments': attachments,
+            'plain_text_length': len(plain_text),
+            'html_content_length': len(html_content)
+        }
+        metadata['thread_id'] = thread_id_for(metadata)
+        threads.append((email_id, metadata['thread_id']))
+
+        with open(output_dir / "metadata" / f"{email_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    return threads
+
+
+def generate_corpus(output_dir, emails, seed=42, workers=1, attachment_rate=0.7, pdf_kb=DEFAULT_PDF_KB,
+                    duplicate_rate=DEFAULT_DUPLICATE_RATE):
+    """Generar un corpus completo; devuelve estadísticas de la generación"""
+    output_dir = Path(output_dir)
+    for directory in ("emails", "attachments", "metadata"):
+        (output_dir / directory).mkdir(parents=True, exist_ok=True)
+
+    start_time = time.perf_counter()
+    ranges = [(start, min(start + CHUNK_SIZE, emails + 1)) for start in range(1, emails + 1, CHUNK_SIZE)]
+    args = [(str(output_dir), start, end, seed, attachment_rate, pdf_kb, duplicate_rate) for start, end in ranges]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(generate_range, *zip(*args)))
+    else:
+        chunks = [generate_range(*chunk_args) for chunk_args in args]
+
+    # Índice de hilos y progreso, como al terminar una extracción
+    index = ThreadIndex(output_dir)
+    email_ids = []
+    for chunk in chunks:
+        for email_id, thread_id in chunk:
+            index.add(email_id, thread_id)
+            email_ids.append(email_id)
+    index.save()
+
+    # Catálogo SQLite de metadatos, como el que escribe PSTExtractor
+    MetadataCatalog(output_dir).sync()
+
+    now = datetime.now().isoformat()
+    with open(output_dir / "progress.json", 'w', encoding='utf-8') as f:
+        json.dump({
+            'processed_emails': email_ids,
+            'total_processed': len(email_ids),
+            'start_time': now,
+            'last_update': now
+        }, f, indent=2, ensure_ascii=False)
+
+    return {
+        'emails': len(email_ids),
+        'threads': len(index.threads),
+        'seconds': round(time.perf_counter() - start_time, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generar un corpus sintético con la estructura de output/")
+    parser.add_argument('output_dir')
+    parser.add_argument('--emails', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--attachment-rate', type=float, default=0.7)
+    parser.add_argument('--pdf-kb', type=int, default=DEFAULT_PDF_KB)
+    parser.add_argument('--duplicate-rate', type=float, default=DEFAULT_DUPLICATE_RATE,
+                        help="Proporción de copias CC / reenvíos idénticos de emails anteriores")
+    parser.add_argument('--classify', action='store_true', help="Clasificar el corpus al terminar")
+    args = parser.parse_args()
+
+    print(f"🧬 Generando {args.emails} emails en {args.output_dir} (semilla {args.seed})...")
+    stats = generate_corpus(args.output_dir, args.emails, args.seed, args.workers, args.attachment_rate, args.pdf_kb,
+                            args.duplicate_rate)
+    print(f"✅ {stats['emails']} emails en {stats['threads']} hilos ({stats['seconds']:.1f} s)")
+
+    if args.classify:
+        from email_classifier import EmailClassifier
+
+        results = EmailClassifier(args.output_dir).classify_all_emails()
+        print(f"🔍 Clasificados: {results['total_emails']} "
+              f"(cotización {results['cotizacion']}, renovación {results['renovacion']}, "
+              f"endoso {results['endoso']}, sin clasificar {results['sin_clasificar']})")
+
+
+if __name__ == "__main__":
+    main()
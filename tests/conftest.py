@@ -0,0 +1,67 @@
+"""
+Fixtures compartidas: un corpus sintético pequeño (synthetic_corpus.py), ya
+clasificado, copiado a un directorio temporal por prueba.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# web_app crea su dashboard y jobs.sqlite al importarse: que no toque output/ del repositorio
+os.environ.setdefault('DASHBOARD_OUTPUT_DIR', tempfile.mkdtemp(prefix='dashboard_test_'))
+
+CORPUS_EMAILS = 120
+CORPUS_SEED = 7
+
+
+@pytest.fixture(scope='session')
+def corpus_template(tmp_path_factory):
+    from synthetic_corpus import generate_corpus
+
+    output_dir = tmp_path_factory.mktemp('corpus') / 'output'
+    generate_corpus(output_dir, CORPUS_EMAILS, seed=CORPUS_SEED)
+    return output_dir
+
+
+@pytest.fixture(scope='session')
+def classified_template(tmp_path_factory, corpus_template):
+    from email_classifier import EmailClassifier
+
+    output_dir = tmp_path_factory.mktemp('classified') / 'output'
+    shutil.copytree(corpus_template, output_dir)
+    EmailClassifier(output_dir).classify_all_emails()
+    return output_dir
+
+
+@pytest.fixture
+def corpus(tmp_path, corpus_template):
+    """Corpus sin clasificar, propio de la prueba"""
+    return Path(shutil.copytree(corpus_template, tmp_path / 'output'))
+
+
+@pytest.fixture
+def classified(tmp_path, classified_template):
+    """Corpus clasificado, propio de la prueba"""
+    return Path(shutil.copytree(classified_template, tmp_path / 'output'))
+
+
+@pytest.fixture
+def client(monkeypatch, classified):
+    """Cliente de prueba de Flask sobre el corpus clasificado; los trabajos se encolan sin pool"""
+    import web_app
+    from background_jobs import JobManager
+
+    job_manager = JobManager(classified)
+    monkeypatch.setattr(job_manager, 'dispatch', lambda job_id: None)
+    monkeypatch.setattr(web_app, 'dashboard', web_app.EmailDashboard(str(classified)))
+    monkeypatch.setattr(web_app, 'jobs', job_manager)
+    web_app.app.config['TESTING'] = True
+    yield web_app.app.test_client()
+    job_manager.store.close()
@@ -0,0 +1,78 @@
+"""Cubo de agregados: la actualización incremental equivale a reconstruirlo completo"""
+
+import copy
+import json
+
+from aggregate_cube import AggregateCube, save_cube_for_results, update_cube
+
+QUERIES = [
+    {},
+    {'group_by': ['classification']},
+    {'group_by': ['month', 'folder']},
+    {'group_by': ['week', 'slip_status'], 'filters': {'classification': ['cotizacion', 'endoso']}},
+    {'group_by': ['agent'], 'order': 'emails', 'limit': 5},
+]
+
+
+def load_emails(classified):
+    results = json.loads((classified / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    return results['emails']
+
+
+def changed_emails(emails):
+    """Cambio de prueba: reclasificados, movidos, uno eliminado y uno agregado
+
+    Devuelve los emails anteriores, los nuevos y el conjunto completo tras el cambio.
+    """
+    old = emails[:12]
+    new = copy.deepcopy(old)
+    for position, email in enumerate(new[:8]):
+        primary = email['primary_classification']
+        if position % 2:
+            primary['type'] = 'renovacion' if primary['type'] != 'renovacion' else 'endoso'
+        primary['confidence'] = (primary['confidence'] + 17) % 100
+    new[8]['metadata']['folder'] = 'ARCHIVO/REVISADOS'
+    new[9]['attachment_analysis'] = dict(new[9]['attachment_analysis'], has_slip=True, slip_complete=True)
+    deleted = new.pop(10)
+
+    added = copy.deepcopy(emails[-1])
+    added['email_id'] = 'email_999999'
+    added['metadata']['delivery_time'] = '2031-01-05T08:30:00'
+    new.append(added)
+
+    new_ids = {email['email_id'] for email in new}
+    all_after = [email for email in emails if email['email_id'] not in new_ids and email['email_id'] != deleted['email_id']]
+    return old, new, all_after + new
+
+
+def test_update_matches_full_rebuild(classified):
+    emails = load_emails(classified)
+    old, new, all_after = changed_emails(emails)
+
+    cube = AggregateCube.from_results(emails)
+    assert cube.update(old, new) == 12
+    rebuilt = AggregateCube.from_results(all_after)
+    assert cube.cells == rebuilt.cells
+    assert cube.total == len(all_after)
+    for params in QUERIES:
+        assert cube.query(**params) == rebuilt.query(**params), params
+
+    # Aplicar otra vez el mismo cambio no mueve nada
+    assert cube.update(new, new) == 0
+    assert cube.cells == rebuilt.cells
+
+
+def test_saved_cube_update_matches_rebuild(classified):
+    classification_dir = classified / 'classification'
+    emails = load_emails(classified)
+    old, new, all_after = changed_emails(emails)
+
+    save_cube_for_results(classification_dir, emails)
+    assert update_cube(classification_dir, old, new) == 12
+    loaded = AggregateCube.load(classification_dir)
+    rebuilt = AggregateCube.from_results(all_after)
+    assert loaded.cells == rebuilt.cells
+    assert loaded.query(group_by=['day', 'classification'], since='2031-01-01') == [
+        {'day': '2031-01-05', 'classification': new[-1]['primary_classification']['type'], 'emails': 1,
+         'avg_confidence': float(new[-1]['primary_classification']['confidence'])}
+    ]
@@ -0,0 +1,91 @@
+"""Trabajos en segundo plano: cola, progreso, cancelación y reanudación tras un reinicio"""
+
+import json
+import threading
+import time
+
+import pytest
+
+import background_jobs
+from background_jobs import STALE_AFTER, JobManager, run_job
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.05)
+    raise AssertionError("Tiempo de espera agotado")
+
+
+@pytest.fixture
+def queued_manager(monkeypatch, classified):
+    """JobManager que solo encola (los trabajos se ejecutan a mano en la prueba)"""
+    manager = JobManager(classified)
+    monkeypatch.setattr(manager, 'dispatch', lambda job_id: None)
+    yield manager
+    manager.store.close()
+
+
+def slow_job(context, params, output_dir):
+    for processed in range(1000):
+        context.progress(processed, total=1000, force=True)
+        time.sleep(0.01)
+    return {}
+
+
+def test_queue_progress_cancel(monkeypatch, queued_manager):
+    monkeypatch.setitem(background_jobs.JOB_HANDLERS, 'reclassify', slow_job)
+    job = queued_manager.submit('reclassify')
+    assert job['status'] == 'pending'
+
+    statuses = []
+    worker = threading.Thread(target=lambda: statuses.append(run_job(queued_manager.store.db_path, job['job_id'])))
+    worker.start()
+    running = wait_for(lambda: (lambda current: current if current['processed'] > 0 else None)(
+        queued_manager.get(job['job_id'])))
+    assert running['status'] == 'running'
+    assert 0 < running['progress'] < 100
+
+    assert queued_manager.cancel(job['job_id'])['cancel_requested']
+    worker.join(timeout=30)
+    assert statuses == ['cancelled']
+    job = queued_manager.get(job['job_id'])
+    assert job['status'] == 'cancelled'
+    assert job['message'] == 'Cancelado por el usuario'
+
+
+def test_cancel_pending_job(queued_manager):
+    job = queued_manager.submit('reclassify')
+    assert queued_manager.cancel(job['job_id'])['status'] == 'cancelled'
+    assert run_job(queued_manager.store.db_path, job['job_id']) is None
+
+
+def test_restart_resumes_interrupted_job(queued_manager, classified):
+    job = queued_manager.submit('reclassify')
+
+    # El proceso que lo ejecutaba murió con el servidor: sin latido desde hace más de STALE_AFTER
+    store = queued_manager.store
+    assert store.claim(job['job_id'], 999999)
+    store.connection.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ?",
+                             (time.time() - STALE_AFTER - 1, job['job_id']))
+
+    # Nuevo arranque: el trabajo vuelve a la cola y corre en su propio proceso
+    manager = JobManager(classified, workers=1)
+    try:
+        assert manager.resume() == (1, 1)
+        finished = wait_for(lambda: (lambda current: current if current['status'] not in ('pending', 'running')
+                                     else None)(manager.store.get(job['job_id'])))
+    finally:
+        manager.shutdown()
+        manager.store.close()
+
+    log = manager.log_path(job['job_id']).read_text(encoding='utf-8')
+    assert finished['status'] == 'completed', finished['error'] or log
+    assert finished['attempts'] == 2
+    assert finished['result']['summary']
+
+    results = json.loads((classified / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    assert results['classification_summary'] == finished['result']['summary']
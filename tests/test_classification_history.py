@@ -0,0 +1,53 @@
+"""Historial de clasificaciones: dos versiones, diferencias y restauración"""
+
+import json
+import sys
+
+import classification_history
+from classification_history import ClassificationHistory, classification_view, restore_results
+from email_classifier import CLASSIFICATION_THRESHOLDS, EmailClassifier
+
+
+def load_results(classification_dir, name='classification_results.json'):
+    return json.loads((classification_dir / name).read_text(encoding='utf-8'))
+
+
+def test_two_runs_diff_and_restore(classified, monkeypatch, capsys):
+    classification_dir = classified / 'classification'
+    first = load_results(classification_dir)
+
+    # Segunda versión con un umbral principal más alto
+    EmailClassifier(classified, thresholds=dict(CLASSIFICATION_THRESHOLDS, primary=60)).classify_all_emails()
+    second = load_results(classification_dir)
+
+    history = ClassificationHistory(classification_dir)
+    run_a, run_b = [run['run_id'] for run in history.runs()][-2:]
+
+    # changes_between informa exactamente los emails cuya clasificación cambió
+    first_views = {email['email_id']: classification_view(email) for email in first['emails']}
+    second_views = {email['email_id']: classification_view(email) for email in second['emails']}
+    expected = sorted(email_id for email_id in first_views if first_views[email_id] != second_views[email_id])
+    differences = history.changes_between(run_a, run_b)
+    assert expected
+    assert [difference['email_id'] for difference in differences] == expected
+    for difference in differences:
+        assert difference['before']['type'] == first_views[difference['email_id']]['primary_classification']['type']
+        assert difference['after']['type'] == second_views[difference['email_id']]['primary_classification']['type']
+
+    # state_at reconstruye cada versión a partir de los cambios
+    assert history.state_at(run_a) == first_views
+    assert history.state_at(run_b) == second_views
+    history.close()
+
+    # restore_results y --restore devuelven la primera versión exacta
+    restored = restore_results(classified, run_a)
+    assert restored['emails'] == sorted(first['emails'], key=lambda email: email['email_id'])
+    for key in ('total_emails', 'total_threads', 'cotizacion', 'renovacion', 'endoso', 'sin_clasificar'):
+        assert restored[key] == first[key], key
+
+    target = classified / 'restored.json'
+    monkeypatch.setattr(sys, 'argv', ['classification_history.py', str(classified), '--restore', str(run_a),
+                                      '--to', str(target)])
+    classification_history.main()
+    assert f"Versión {run_a}" in capsys.readouterr().out
+    assert load_results(classified, 'restored.json')['emails'] == restored['emails']
@@ -0,0 +1,114 @@
+"""Servicio de clasificación: rutas, errores 400/404/413 y micro-lotes"""
+
+import base64
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from classification_service import MAX_BATCH_SIZE, ClassificationService, create_server
+
+
+@pytest.fixture
+def service_url(classified):
+    """URL base de un servicio atendiendo en un puerto libre"""
+    service = ClassificationService(classified)
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def request(url, body=None, content_type='application/json'):
+    """(status, JSON) de una solicitud; body en bytes, o un objeto que se envía como JSON"""
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    headers = {'Content-Type': content_type} if body is not None else {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers), timeout=60) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_classify_by_id_and_health(service_url, classified):
+    status, data = request(f"{service_url}/classify/email_000001")
+    assert status == 200
+    assert data['email_id'] == 'email_000001'
+    assert data['cached'] is False
+    assert data['result']['primary_classification']['type']
+
+    status, data = request(f"{service_url}/classify", {'email_id': 'email_000001'})
+    assert status == 200
+    assert data['cached'] is True
+
+    eml = (classified / 'emails' / 'email_000001.eml').read_bytes()
+    status, data = request(f"{service_url}/classify", eml, content_type='message/rfc822')
+    assert status == 200
+    assert data['email_id'].startswith('eml-')
+
+    status, data = request(f"{service_url}/health")
+    assert status == 200
+    assert data['status'] == 'ok'
+    assert data['classified'] == 2
+    assert data['cache_hits'] == 1
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'{no es json', "JSON inválido"),
+    ([{'email_id': 'email_000001'}], "El cuerpo debe ser un objeto JSON"),
+    ({}, "Se requiere email_id o eml"),
+    ({'folder': 'ASIGNADOS'}, "Se requiere email_id o eml"),
+    ({'eml': 'abc'}, "eml y attachments deben estar en base64"),
+    ({'eml': base64.b64encode(b'From: a@b.mx\n\nHola').decode('ascii'), 'attachments': {'a.pdf': 'abc'}},
+     "eml y attachments deben estar en base64"),
+    ({'eml': ''}, "El .eml está vacío"),
+    ({'email_id': '../metadata/email_000001'}, "email_id inválido"),
+    ({'email_id': '.oculto'}, "email_id inválido"),
+])
+def test_classify_bad_requests(service_url, body, message):
+    status, data = request(f"{service_url}/classify", body)
+    assert status == 400
+    assert message in data['error']
+
+
+def test_bad_requests_on_other_routes(service_url):
+    status, data = request(f"{service_url}/classify", b'', content_type='message/rfc822')
+    assert status == 400
+    assert "El .eml está vacío" in data['error']
+
+    status, data = request(f"{service_url}/classify/.oculto")
+    assert status == 400
+    assert "email_id inválido" in data['error']
+
+    status, data = request(f"{service_url}/classify/batch", {'emails': 'email_000001'})
+    assert status == 400
+    assert "emails debe ser una lista" in data['error']
+
+    status, data = request(f"{service_url}/classify/batch", {})
+    assert status == 400
+
+    status, data = request(f"{service_url}/classify/email_inexistente")
+    assert status == 404
+    assert request(f"{service_url}/otra-ruta")[0] == 404
+    assert request(f"{service_url}/otra-ruta", {})[0] == 404
+
+
+def test_batch_reports_errors_per_email(service_url):
+    status, data = request(f"{service_url}/classify/batch", {'emails': [
+        {'email_id': 'email_000001'}, 'email_000002', {'eml': 'abc'}, {'email_id': 'email_inexistente'},
+    ]})
+    assert status == 200
+    assert data['total'] == 4
+    assert data['errors'] == 3
+    assert data['results'][0]['email_id'] == 'email_000001'
+    assert [item.get('status') for item in data['results'][1:]] == [400, 400, 404]
+
+    status, data = request(f"{service_url}/classify/batch",
+                           {'emails': [{'email_id': 'email_000001'}] * (MAX_BATCH_SIZE + 1)})
+    assert status == 413
@@ -0,0 +1,97 @@
+"""Snapshot binario del dashboard: versiones y puntero CURRENT"""
+
+import json
+import shutil
+import threading
+
+from dashboard_snapshot import (SNAPSHOT_DIRNAME, SNAPSHOT_POINTER, SNAPSHOT_VERSION_PREFIX, current_snapshot_dir,
+                                load_snapshot, stamp_results, write_snapshot)
+
+
+def load_results(classified):
+    results_file = classified / 'classification' / 'classification_results.json'
+    return results_file, json.loads(results_file.read_text(encoding='utf-8'))
+
+
+def versions(snapshot_dir):
+    return sorted(path.name for path in snapshot_dir.iterdir() if path.name.startswith(SNAPSHOT_VERSION_PREFIX))
+
+
+def test_each_write_switches_the_pointer(classified):
+    results_file, results = load_results(classified)
+    snapshot_dir = results_file.parent / SNAPSHOT_DIRNAME
+
+    written = []
+    for _ in range(3):
+        stamp_results(results)
+        written.append((write_snapshot(results, results_file), results['results_id']))
+
+        version_dir, results_id = written[-1]
+        assert (snapshot_dir / SNAPSHOT_POINTER).read_text(encoding='utf-8') == version_dir.name
+        assert current_snapshot_dir(snapshot_dir) == version_dir
+        snapshot = load_snapshot(snapshot_dir, results_id)
+        assert snapshot is not None
+        assert snapshot['meta']['rows'] == len(results['emails'])
+
+    # Se conservan la versión vigente y la anterior
+    assert versions(snapshot_dir) == sorted(path.name for path, _ in written[-2:])
+    assert load_snapshot(snapshot_dir, written[0][1]) is None
+
+
+def test_mapped_snapshot_survives_later_writes(classified):
+    results_file, results = load_results(classified)
+    snapshot_dir = results_file.parent / SNAPSHOT_DIRNAME
+    snapshot = load_snapshot(snapshot_dir)
+    email_ids = list(snapshot['columns']['email_id'])
+
+    for _ in range(3):
+        stamp_results(results)
+        write_snapshot(results, results_file)
+    assert list(snapshot['columns']['email_id']) == email_ids
+
+
+def test_readers_always_find_a_snapshot(classified):
+    results_file, results = load_results(classified)
+    snapshot_dir = results_file.parent / SNAPSHOT_DIRNAME
+    done = threading.Event()
+    missing = []
+
+    def read():
+        while not done.is_set():
+            if load_snapshot(snapshot_dir) is None:
+                missing.append(True)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(10):
+            stamp_results(results)
+            write_snapshot(results, results_file)
+    finally:
+        done.set()
+        reader.join()
+    assert not missing
+
+
+def test_unversioned_snapshot_is_read_and_replaced(classified):
+    results_file, results = load_results(classified)
+    snapshot_dir = results_file.parent / SNAPSHOT_DIRNAME
+
+    # Formato anterior: los archivos directamente en dashboard_snapshot/
+    version_dir = current_snapshot_dir(snapshot_dir)
+    for path in version_dir.iterdir():
+        shutil.move(str(path), snapshot_dir / path.name)
+    version_dir.rmdir()
+    (snapshot_dir / SNAPSHOT_POINTER).unlink()
+    assert load_snapshot(snapshot_dir, results['results_id']) is not None
+
+    stamp_results(results)
+    new_dir = write_snapshot(results, results_file)
+    assert sorted(path.name for path in snapshot_dir.iterdir()) == [SNAPSHOT_POINTER, new_dir.name]
+    assert load_snapshot(snapshot_dir, results['results_id']) is not None
+
+
+def test_copied_output_keeps_its_snapshot(classified, tmp_path):
+    results_file, results = load_results(classified)
+    copy = shutil.copytree(classified, tmp_path / 'copia')
+    assert load_snapshot(copy / 'classification' / SNAPSHOT_DIRNAME, results['results_id']) is not None
@@ -0,0 +1,57 @@
+"""Índice de pólizas y códigos de agente"""
+
+import json
+
+from entity_index import ENTITY_INDEX_FILENAME, EntityIndex, normalize_entity
+
+
+def email(email_id, poliza=(), agente=()):
+    return {'email_id': email_id, 'entities': {'poliza': list(poliza), 'agente': list(agente)}}
+
+
+def test_digit_groups_are_kept():
+    assert normalize_entity('AGENTE 430') == '430'
+    assert normalize_entity('1/284/97186') == normalize_entity('1-284-97186') == '1-284-97186'
+    assert normalize_entity('123-45') != normalize_entity('12-345')
+    assert normalize_entity(None) == ''
+
+
+def test_lookup_does_not_merge_groupings(tmp_path):
+    index = EntityIndex.from_results([
+        email('a', poliza=['123-45']),
+        email('b', poliza=['12-345']),
+        email('c', poliza=['12345'], agente=['430']),
+        email('d', poliza=['1/284/97186', '1-284-97186']),
+    ])
+    assert index.lookup('poliza', '123-45') == ['a']
+    assert index.lookup('poliza', '12-345') == ['b']
+    assert index.lookup('poliza', '12345') == ['c']
+    assert index.lookup('poliza', '1-284-97186') == ['d']
+    assert index.lookup('agente', 'Agente 430') == ['c']
+
+    # Guardado y carga conservan las claves; un índice de otro formato se descarta
+    index.save(tmp_path)
+    loaded = EntityIndex.load(tmp_path)
+    assert loaded.lookup('poliza', '123-45') == ['a']
+    assert loaded.lookup('poliza', '12-345') == ['b']
+
+    index_file = tmp_path / ENTITY_INDEX_FILENAME
+    data = json.loads(index_file.read_text(encoding='utf-8'))
+    index_file.write_text(json.dumps(dict(data, format_version=1)), encoding='utf-8')
+    assert EntityIndex.load(tmp_path) is None
+
+
+def test_api_entities_matches_results(client, classified):
+    results = json.loads((classified / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    expected = {}
+    for email_result in results['emails']:
+        for value in email_result['entities']['poliza']:
+            expected.setdefault(normalize_entity(value), set()).add(email_result['email_id'])
+    assert expected
+
+    for value, email_ids in list(expected.items())[:10]:
+        response = client.get(f'/api/entities/poliza/{value}')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['value'] == value
+        assert {row['email_id'] for row in data['emails']} == email_ids
@@ -0,0 +1,73 @@
+"""Facetas de /api/search comparadas con un groupby de pandas sobre los resultados"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from web_app import FACET_CLASSIFICATIONS, NO_DATE_LABEL, SLIP_STATUS_LABELS
+
+
+@pytest.fixture
+def emails_frame(classified):
+    """Una fila por email con los valores de cada faceta, a partir del JSON de resultados"""
+    results = json.loads((classified / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    rows = []
+    for email in results['emails']:
+        analysis = email['attachment_analysis']
+        has_slip = analysis.get('has_slip', False)
+        rows.append({
+            'classification': email['primary_classification']['type'],
+            'folder': email['metadata'].get('folder', ''),
+            'has_attachments': 'true' if analysis.get('total_attachments', 0) > 0 else 'false',
+            'slip_status': SLIP_STATUS_LABELS[int(has_slip) + int(has_slip and analysis.get('slip_complete', False))],
+            'delivery_time': email['metadata'].get('delivery_time', ''),
+        })
+    frame = pd.DataFrame(rows)
+    months = pd.to_datetime(frame['delivery_time'], errors='coerce').dt.strftime('%Y-%m')
+    frame['month'] = months.fillna(NO_DATE_LABEL)
+    return frame
+
+
+def grouped(frame, facet):
+    return {str(label): int(count) for label, count in frame.groupby(facet).size().items()}
+
+
+def facets(client, **params):
+    response = client.get('/api/search', query_string=dict(params, facets='true', per_page=1))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['facets']
+
+
+def test_facets_without_filters(client, emails_frame):
+    counts = facets(client)
+    expected_classification = dict.fromkeys(FACET_CLASSIFICATIONS, 0)
+    expected_classification.update(grouped(emails_frame, 'classification'))
+    assert counts['classification'] == expected_classification
+    assert counts['folder'] == grouped(emails_frame, 'folder')
+    assert counts['has_attachments'] == dict({'false': 0, 'true': 0}, **grouped(emails_frame, 'has_attachments'))
+    assert counts['slip_status'] == dict(dict.fromkeys(SLIP_STATUS_LABELS, 0), **grouped(emails_frame, 'slip_status'))
+    assert counts['month'] == grouped(emails_frame, 'month')
+
+
+def test_facets_skip_their_own_filter(client, emails_frame):
+    folder = emails_frame['folder'].value_counts().index[0]
+    counts = facets(client, classification='cotizacion', folder=folder, has_attachments='true')
+
+    in_class = emails_frame['classification'] == 'cotizacion'
+    in_folder = emails_frame['folder'] == folder
+    with_attachments = emails_frame['has_attachments'] == 'true'
+    selected = emails_frame[in_class & in_folder & with_attachments]
+
+    # Cada faceta con filtro propio se cuenta sin ese filtro
+    expected_classification = dict.fromkeys(FACET_CLASSIFICATIONS, 0)
+    expected_classification.update(grouped(emails_frame[in_folder & with_attachments], 'classification'))
+    assert counts['classification'] == expected_classification
+    assert counts['folder'] == grouped(emails_frame[in_class & with_attachments], 'folder')
+    assert counts['has_attachments'] == dict({'false': 0, 'true': 0},
+                                             **grouped(emails_frame[in_class & in_folder], 'has_attachments'))
+
+    # SLIP y mes se cuentan sobre el conjunto filtrado
+    assert counts['slip_status'] == dict(dict.fromkeys(SLIP_STATUS_LABELS, 0), **grouped(selected, 'slip_status'))
+    assert counts['month'] == grouped(selected, 'month')
+    assert sum(counts['slip_status'].values()) == len(selected) > 0
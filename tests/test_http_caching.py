@@ -0,0 +1,60 @@
+"""Cache HTTP: ETag con 304 en las APIs y descargas de adjuntos reanudables (206)"""
+
+import pytest
+
+
+@pytest.fixture
+def attachment(classified):
+    """Primer adjunto del corpus con más de 10 bytes: (email_id, nombre, contenido)"""
+    for path in sorted((classified / 'attachments').glob('*/*')):
+        content = path.read_bytes()
+        if len(content) > 10:
+            return path.parent.name, path.name, content
+    pytest.fail("El corpus no tiene adjuntos")
+
+
+@pytest.mark.parametrize('url', ['/api/search?classification=cotizacion&per_page=5', '/api/stats'])
+def test_api_revalidates_with_etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+
+
+def test_search_etag_depends_on_query(client):
+    first = client.get('/api/search', query_string={'per_page': 5})
+    other = client.get('/api/search', query_string={'per_page': 5, 'page': 2},
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != first.headers['ETag']
+
+
+def test_attachment_range_and_revalidation(client, attachment):
+    email_id, filename, content = attachment
+    url = f'/download/attachment/{email_id}/{filename}'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == content
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'private' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+
+    partial = client.get(url, headers={'Range': 'bytes=0-9'})
+    assert partial.status_code == 206
+    assert partial.data == content[:10]
+    assert partial.headers['Content-Range'] == f'bytes 0-9/{len(content)}'
+
+    # Reanudar desde el byte 10 con If-Range completa el archivo
+    rest = client.get(url, headers={'Range': 'bytes=10-', 'If-Range': etag})
+    assert rest.status_code == 206
+    assert partial.data + rest.data == content
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
@@ -0,0 +1,57 @@
+"""POST /api/jobs: cuerpos JSON y de formulario"""
+
+import json
+
+
+def endoso_count(classified):
+    results = json.loads((classified / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    return results['endoso']
+
+
+def test_json_export_keeps_filters_and_format(client, classified):
+    response = client.post('/api/jobs', json={
+        'kind': 'export',
+        'format': 'csv',
+        'filters': {'classification': 'endoso', 'hide_duplicates': False},
+        'sort': 'sender',
+        'order': 'asc'
+    })
+    assert response.status_code == 202, response.get_json()
+
+    import web_app
+    job = web_app.jobs.get(response.get_json()['job_id'])
+    assert job['kind'] == 'export'
+    assert job['params']['format'] == 'csv'
+    assert job['params']['filters']['classification'] == 'endoso'
+    assert job['params']['filters']['hide_duplicates'] is False
+    assert job['params']['sort'] == 'sender'
+    assert job['params']['order'] == 'asc'
+    assert job['total'] == endoso_count(classified)
+
+
+def test_form_export_keeps_filters(client, classified):
+    response = client.post('/api/jobs', data={'kind': 'export', 'format': 'xlsx', 'classification': 'endoso'})
+    assert response.status_code == 202, response.get_json()
+
+    import web_app
+    job = web_app.jobs.get(response.get_json()['job_id'])
+    assert job['params']['format'] == 'xlsx'
+    assert job['params']['filters']['classification'] == 'endoso'
+    assert job['total'] == endoso_count(classified)
+
+
+def test_non_object_bodies_are_rejected(client):
+    for body in ([], ['export'], 'export', 3):
+        response = client.post('/api/jobs', json=body)
+        assert response.status_code == 400, body
+        assert 'error' in response.get_json()
+
+
+def test_filters_must_be_an_object(client):
+    response = client.post('/api/jobs', json={'kind': 'export', 'filters': ['endoso']})
+    assert response.status_code == 400
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.post('/api/jobs', json={'kind': 'export', 'format': 'pdf'})
+    assert response.status_code == 400
@@ -0,0 +1,63 @@
+"""Evaluación perezosa frente a la evaluación completa"""
+
+import json
+
+import numpy as np
+
+from email_classifier import EmailClassifier
+from what_if_scoring import load_feature_matrix
+
+
+def email_ids(output_dir):
+    return sorted(path.stem for path in (output_dir / 'metadata').glob('*.json') if path.name != 'progress.json')
+
+
+def saved_emails(output_dir):
+    results = json.loads((output_dir / 'classification' / 'classification_results.json').read_text(encoding='utf-8'))
+    return {email['email_id']: email for email in results['emails']}
+
+
+def test_lazy_keeps_primary_type_and_status(corpus):
+    full = EmailClassifier(corpus, dedup=False)
+    lazy = EmailClassifier(corpus, lazy_evaluation=True, dedup=False)
+
+    skipped = 0
+    for email_id in email_ids(corpus):
+        expected = full.classify_email(email_id)
+        actual = lazy.classify_email(email_id)
+        evaluation = actual.pop('evaluation')
+
+        assert actual['primary_classification']['type'] == expected['primary_classification']['type'], email_id
+        assert actual['primary_classification']['status'] == expected['primary_classification']['status'], email_id
+        if evaluation['complete']:
+            assert actual == expected, email_id
+        else:
+            skipped += 1
+
+    # El corpus debe ejercitar las etapas omitidas
+    assert skipped > 0
+    assert lazy.evaluation_stats['body_skipped'] > 0
+
+
+def test_saved_results_are_always_complete(tmp_path, corpus_template):
+    import shutil
+
+    full_dir = shutil.copytree(corpus_template, tmp_path / 'full')
+    lazy_dir = shutil.copytree(corpus_template, tmp_path / 'lazy')
+    EmailClassifier(full_dir).classify_all_emails()
+    lazy = EmailClassifier(lazy_dir, lazy_evaluation=True)
+    lazy.classify_all_emails()
+
+    # El clasificador sigue siendo perezoso para classify_email
+    assert lazy.lazy_evaluation
+    assert lazy.evaluation_stats['body_skipped'] == 0
+
+    full_emails = saved_emails(full_dir)
+    lazy_emails = saved_emails(lazy_dir)
+    assert lazy_emails == full_emails
+    assert not any('evaluation' in email for email in lazy_emails.values())
+
+    full_matrix = load_feature_matrix(full_dir)
+    lazy_matrix = load_feature_matrix(lazy_dir)
+    for key in ('features', 'email_ids', 'primary_types'):
+        assert np.array_equal(lazy_matrix[key], full_matrix[key]), key
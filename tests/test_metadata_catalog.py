@@ -0,0 +1,92 @@
+"""Catálogo de metadatos: las consultas coinciden con filtrar metadata/*.json"""
+
+import json
+from collections import Counter
+
+import pytest
+
+from metadata_catalog import CATALOG_FILENAME, load_catalog
+
+
+@pytest.fixture
+def metadata(corpus):
+    """Metadatos por email_id leídos directamente de los JSON"""
+    return {
+        path.stem: json.loads(path.read_text(encoding='utf-8'))
+        for path in (corpus / 'metadata').glob('*.json') if path.name != 'progress.json'
+    }
+
+
+def folder_name(path):
+    return path.rstrip('/').rsplit('/', 1)[-1].strip()
+
+
+def check_query(catalog, metadata, expected, **filters):
+    """La consulta devuelve exactamente los ids esperados, en orden de fecha"""
+    email_ids = catalog.query(**filters)
+    assert sorted(email_ids) == sorted(expected), filters
+    times = [metadata[email_id]['delivery_time'] for email_id in email_ids]
+    assert times == sorted(times), filters
+    return email_ids
+
+
+def test_queries_match_json_metadata(corpus, metadata):
+    catalog = load_catalog(corpus)
+    assert catalog.count() == len(metadata)
+    assert catalog.folder_counts() == dict(Counter(item['folder'] for item in metadata.values()))
+    for email_id, item in list(metadata.items())[:20]:
+        assert catalog.get_metadata(email_id) == item
+        assert [attachment['filename'] for attachment in catalog.get_attachments(email_id)] == [
+            attachment['filename'] for attachment in item['attachments']
+        ]
+    assert catalog.get_metadata('email_inexistente') is None
+
+    check_query(catalog, metadata, metadata)
+
+    # Carpeta por ruta completa, por nombre y por ruta padre
+    path = Counter(item['folder'] for item in metadata.values()).most_common(1)[0][0]
+    in_path = [email_id for email_id, item in metadata.items() if item['folder'] == path]
+    check_query(catalog, metadata, in_path, folder=path)
+    name = folder_name(path)
+    check_query(catalog, metadata, [email_id for email_id, item in metadata.items()
+                                    if folder_name(item['folder']) == name], folder=name)
+    parent = path.rsplit('/', 1)[0]
+    check_query(catalog, metadata, [email_id for email_id, item in metadata.items()
+                                    if item['folder'].startswith(parent + '/')], folder=parent)
+
+    # Rango de fechas inclusivo (until sin hora incluye todo el día)
+    days = sorted({item['delivery_time'][:10] for item in metadata.values()})
+    since, until = days[len(days) // 4], days[3 * len(days) // 4]
+    in_range = [email_id for email_id, item in metadata.items() if since <= item['delivery_time'][:10] <= until]
+    check_query(catalog, metadata, in_range, since=since, until=until)
+
+    # Adjuntos y combinación de filtros
+    with_attachments = {email_id for email_id, item in metadata.items() if item['attachments']}
+    assert with_attachments
+    check_query(catalog, metadata, with_attachments, has_attachments=True)
+    check_query(catalog, metadata, set(metadata) - with_attachments, has_attachments=False)
+    check_query(catalog, metadata, set(in_path) & set(in_range) & with_attachments,
+                folder=path, since=since, until=until, has_attachments=True)
+
+    thread_id = metadata[in_path[0]]['thread_id']
+    check_query(catalog, metadata, [email_id for email_id, item in metadata.items()
+                                    if item['thread_id'] == thread_id], thread_id=thread_id)
+    assert catalog.query(limit=5) == catalog.query()[:5]
+    catalog.close()
+
+
+def test_sync_follows_metadata_dir(corpus, metadata):
+    # Sin catálogo se reconstruye a partir de los JSON
+    (corpus / CATALOG_FILENAME).unlink()
+    catalog = load_catalog(corpus)
+    assert catalog.count() == len(metadata)
+    assert sorted(catalog.query()) == sorted(metadata)
+
+    # Un JSON eliminado desaparece del catálogo en el siguiente sync
+    removed = sorted(metadata)[0]
+    (corpus / 'metadata' / f'{removed}.json').unlink()
+    assert catalog.sync() == (0, 1)
+    assert catalog.get_metadata(removed) is None
+    assert removed not in catalog.query()
+    assert catalog.sync() == (0, 0)
+    catalog.close()
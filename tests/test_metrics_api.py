@@ -0,0 +1,9 @@
+"""GET /metrics: formato de texto de Prometheus"""
+
+
+def test_metrics_content_type(client):
+    client.get('/api/search')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    assert '# TYPE' in response.get_data(as_text=True)
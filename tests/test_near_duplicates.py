@@ -0,0 +1,60 @@
+"""Casi duplicados: solo se reutiliza la clasificación si el texto puntúa igual"""
+
+import json
+from datetime import datetime
+
+from email_classifier import EmailClassifier
+from near_duplicates import hamming_distance, normalize_words, simhash
+from synthetic_corpus import write_eml
+
+WORDS = "flotilla unidad conductor sucursal planta ruta servicio contrato entrega revisión documento cliente".split()
+LINES = [f"La {WORDS[i % 12]} de la zona {chr(65 + i % 26)} queda a cargo de {WORDS[(i * 5) % 12]} y "
+         f"{WORDS[(i * 7) % 12]}." for i in range(40)]
+SUBJECT = 'RV: Flotilla Servicios del Norte'
+
+
+def body(verb):
+    return f"Buen día, solicito su apoyo {verb} la flotilla del cliente.\n" + "\n".join(LINES)
+
+
+def add_email(output_dir, email_id, text):
+    delivery_time = datetime(2025, 3, 3, 9, 0)
+    write_eml(output_dir / 'emails' / f'{email_id}.eml', SUBJECT, 'Ana Ruiz', 'ana@agentes.mx', delivery_time,
+              text, '<html><body><p>' + text.replace('\n', '<br>') + '</p></body></html>')
+    metadata = {'id': email_id, 'folder': 'ASIGNADOS', 'subject': SUBJECT, 'sender_name': 'Ana Ruiz',
+                'sender_email': 'ana@agentes.mx', 'delivery_time': delivery_time.isoformat(), 'attachment_count': 0,
+                'eml_file': f'emails/{email_id}.eml', 'attachments': []}
+    (output_dir / 'metadata' / f'{email_id}.json').write_text(json.dumps(metadata), encoding='utf-8')
+
+
+def classify(output_dir):
+    return {email['email_id']: email for email in EmailClassifier(output_dir).classify_all_emails()['emails']}
+
+
+def test_scored_keyword_difference_is_not_reused(corpus):
+    # 'cotizando' puntúa CA3; 'analizando' no, y el texto sigue a 1 bit de SimHash
+    assert hamming_distance(simhash(normalize_words(body('cotizando'))), simhash(normalize_words(body('analizando')))) <= 3
+    add_email(corpus, 'email_900001', body('cotizando'))
+    add_email(corpus, 'email_900002', body('analizando'))
+
+    results = classify(corpus)
+    original, copy = results['email_900001'], results['email_900002']
+    assert 'duplicate_of' not in copy
+    assert 'CA3: Palabra clave en cuerpo del email' in original['classifications']['cotizacion']['criteria_met']
+    assert 'CA3: Palabra clave en cuerpo del email' not in copy['classifications']['cotizacion']['criteria_met']
+
+    # El resultado coincide con el análisis completo del email
+    expected = EmailClassifier(corpus, dedup=False).classify_email('email_900002')
+    for field in ('classifications', 'primary_classification', 'entities'):
+        assert copy[field] == expected[field], field
+
+
+def test_same_keywords_are_reused(corpus):
+    add_email(corpus, 'email_900001', body('cotizando'))
+    add_email(corpus, 'email_900002', body('cotizando') + "\nSaludos.")
+
+    copy = classify(corpus)['email_900002']
+    assert copy['duplicate_of']['email_id'] == 'email_900001'
+    expected = EmailClassifier(corpus, dedup=False).classify_email('email_900002')
+    for field in ('classifications', 'primary_classification', 'entities'):
+        assert copy[field] == expected[field], field
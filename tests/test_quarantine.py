@@ -0,0 +1,53 @@
+"""Cuarentena: los emails que exceden su presupuesto se reprocesan y quedan como el análisis completo"""
+
+import json
+import sys
+
+import reprocess_quarantine
+from aggregate_cube import AggregateCube
+from email_classifier import QUARANTINE_FILENAME, EmailClassifier
+
+
+def load_json(path):
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_quarantine_round_trip(corpus, monkeypatch, capsys):
+    classification_dir = corpus / 'classification'
+
+    # Presupuestos mínimos: buena parte del corpus queda degradada y en cuarentena
+    EmailClassifier(corpus, budget_scale=0.001).classify_all_emails()
+    results = load_json(classification_dir / 'classification_results.json')
+    quarantine = load_json(classification_dir / QUARANTINE_FILENAME)['emails']
+    degraded = sorted(email['email_id'] for email in results['emails'] if 'degraded' in email)
+    assert degraded
+    assert sorted(quarantine) == degraded
+    assert results['quarantined'] == len(degraded)
+    assert all(entry['stage'] for entry in quarantine.values())
+
+    monkeypatch.setattr(sys, 'argv', ['reprocess_quarantine.py', str(corpus), '--no-budget'])
+    reprocess_quarantine.main()
+    assert "En cuarentena: 0" in capsys.readouterr().out
+
+    # Cuarentena vacía y resultados iguales al análisis sin presupuestos
+    assert load_json(classification_dir / QUARANTINE_FILENAME)['emails'] == {}
+    results = load_json(classification_dir / 'classification_results.json')
+    assert results['quarantined'] == 0
+    assert not any('degraded' in email for email in results['emails'])
+
+    reprocessed = {email['email_id']: email for email in results['emails'] if email['email_id'] in quarantine}
+    full = EmailClassifier(corpus, budgets=False)
+    for email_id in degraded:
+        expected = full.classify_email(email_id)
+        for field in ('classifications', 'primary_classification', 'entities', 'attachment_analysis'):
+            assert reprocessed[email_id][field] == expected[field], (email_id, field)
+
+    # Conteos y cubo reflejan los emails reprocesados
+    for category in ('cotizacion', 'renovacion', 'endoso', 'sin_clasificar'):
+        assert results[category] == sum(1 for email in results['emails']
+                                         if email['primary_classification']['type'] == category), category
+    assert AggregateCube.load(classification_dir).cells == AggregateCube.from_results(results['emails']).cells
+
+    # Sin cuarentena, reprocesar otra vez no hace nada
+    reprocess_quarantine.main()
+    assert "No hay emails en cuarentena" in capsys.readouterr().out
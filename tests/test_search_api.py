@@ -0,0 +1,82 @@
+"""GET /api/search: paginación por página y por cursor"""
+
+import pytest
+
+QUERIES = [
+    {},
+    {'sort': 'confidence', 'order': 'asc'},
+    {'sort': 'sender', 'order': 'desc', 'classification': 'cotizacion'},
+    {'sort': 'date', 'order': 'asc', 'collapse_threads': 'true'},
+    {'sort': 'confidence', 'order': 'desc', 'hide_duplicates': 'true', 'has_attachments': 'true'},
+]
+
+
+def search(client, **params):
+    response = client.get('/api/search', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def offset_pages(client, query, per_page):
+    ids = []
+    page = 1
+    while True:
+        data = search(client, **query, page=page, per_page=per_page)
+        ids.extend(row['email_id'] for row in data['results'])
+        if not data['pagination']['has_next']:
+            return ids, data['pagination']['total']
+        page += 1
+
+
+def cursor_pages(client, query, per_page):
+    ids = []
+    cursor = None
+    while True:
+        params = dict(query, per_page=per_page)
+        if cursor:
+            params['cursor'] = cursor
+        data = search(client, **params)
+        ids.extend(row['email_id'] for row in data['results'])
+        cursor = data['pagination']['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_cursor_walk_matches_offset_paging(client, query):
+    per_page = 7
+    offset_ids, total = offset_pages(client, query, per_page)
+    cursor_ids = cursor_pages(client, query, per_page)
+
+    assert len(offset_ids) == total > 0
+    assert len(set(offset_ids)) == len(offset_ids)
+    assert cursor_ids == offset_ids
+
+
+def test_page_and_per_page_are_clamped(client):
+    import web_app
+
+    data = search(client, page=0, per_page=0)
+    assert data['pagination']['page'] == 1
+    assert data['pagination']['per_page'] == 1
+    assert len(data['results']) == 1
+
+    data = search(client, page=-3, per_page=-10)
+    assert data['pagination']['page'] == 1
+    assert data['pagination']['per_page'] == 1
+
+    data = search(client, per_page=web_app.MAX_PER_PAGE * 10)
+    assert data['pagination']['per_page'] == web_app.MAX_PER_PAGE
+    assert len(data['results']) == data['pagination']['total']
+
+
+@pytest.mark.parametrize('params', [
+    {'page': 'dos'},
+    {'per_page': 'muchos'},
+    {'page': '1.5'},
+    {'per_page': ''},
+])
+def test_non_integer_paging_is_rejected(client, params):
+    response = client.get('/api/search', query_string=params)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,40 @@
+"""POST /api/what-if: validación del cuerpo"""
+
+import pytest
+
+
+URL = '/api/what-if'
+
+
+def test_default_weights_change_nothing(client):
+    response = client.post(URL, json={})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['changed_total'] == 0
+    assert result['counts_before'] == result['counts_after']
+
+
+def test_alternative_threshold(client):
+    response = client.post(URL, json={'thresholds': {'endoso': '100'}, 'limit': 5})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['counts_after']['endoso'] <= result['counts_before']['endoso']
+    assert len(result['changed']) <= 5
+
+
+@pytest.mark.parametrize('body', [
+    [],
+    ['weights'],
+    {'weights': ['cotizacion.agente', 10]},
+    {'thresholds': 40},
+    {'weights': {'cotizacion.agente': 'alto'}},
+    {'thresholds': {'endoso': None}},
+    {'limit': 'todos'},
+    {'limit': -1},
+    {'weights': {'cotizacion.inexistente': 10}},
+    {'thresholds': {'inexistente': 10}},
+])
+def test_invalid_bodies_are_rejected(client, body):
+    response = client.post(URL, json=body)
+    assert response.status_code == 400, body
+    assert 'error' in response.get_json()
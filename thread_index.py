@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Índice de Hilos de Conversación
+Agrupa emails por hilo usando el índice de conversación del PST
+o, en su defecto, el asunto normalizado (sin prefijos RE:/RV:/FW:)
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+# Nombre del índice de hilos dentro del directorio de salida
+THREAD_INDEX_FILENAME = "threads.json"
+
+# Prefijos de respuesta/reenvío de Outlook en español e inglés
+REPLY_PREFIX_PATTERN = re.compile(
+    r'^\s*((RE|RV|FW|FWD|RES|REF|TR|AW|WG|REENVIAR|RESPONDER)\s*(\[\d+\])?\s*:\s*)+',
+    re.IGNORECASE
+)
+
+# Los primeros 22 bytes del PR_CONVERSATION_INDEX identifican el hilo
+CONVERSATION_HEADER_BYTES = 22
+
+
+def normalize_subject(subject):
+    """Asunto sin prefijos de respuesta, sin acentos, en mayúsculas y con espacios colapsados"""
+    if not subject:
+        return ''
+
+    normalized = REPLY_PREFIX_PATTERN.sub('', subject)
+    normalized = unicodedata.normalize('NFKD', normalized)
+    normalized = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return ' '.join(normalized.upper().split())
+
+
+def thread_id_for(metadata):
+    """Identificador de hilo de un email a partir de sus metadatos"""
+    if metadata.get('thread_id'):
+        return metadata['thread_id']
+
+    conversation_index = metadata.get('conversation_index')
+    if conversation_index and len(conversation_index) >= CONVERSATION_HEADER_BYTES * 2:
+        return f"conv-{conversation_index[:CONVERSATION_HEADER_BYTES * 2].lower()}"
+
+    topic = normalize_subject(metadata.get('conversation_topic') or metadata.get('subject') or '')
+    if not topic:
+        # Sin asunto: el email forma su propio hilo
+        return f"email-{metadata.get('id', '')}"
+
+    return f"subj-{hashlib.sha1(topic.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ThreadIndex:
+    """Índice persistente hilo → emails"""
+
+    def __init__(self, output_dir="output"):
+        self.index_file = Path(output_dir) / THREAD_INDEX_FILENAME
+        self.threads = {}
+        self.email_threads = {}
+
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self.threads = json.load(f).get('threads', {})
+            except:
+                self.threads = {}
+
+        for thread_id, email_ids in self.threads.items():
+            for email_id in email_ids:
+                self.email_threads[email_id] = thread_id
+
+    def add(self, email_id, thread_id):
+        """Registrar un email en su hilo"""
+        if self.email_threads.get(email_id) == thread_id:
+            return
+        self.email_threads[email_id] = thread_id
+        self.threads.setdefault(thread_id, []).append(email_id)
+
+    def thread_of(self, email_id):
+        """Hilo de un email (None si no está indexado)"""
+        return self.email_threads.get(email_id)
+
+    def save(self):
+        """Guardar el índice en disco"""
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'total_threads': len(self.threads),
+                'total_emails': len(self.email_threads),
+                'threads': self.threads
+            }, f, indent=2, ensure_ascii=False)
+
+
+def build_thread_index(output_dir="output"):
+    """Construir el índice de hilos desde los metadatos ya extraídos"""
+    from metadata_catalog import load_catalog
+
+    index = ThreadIndex(output_dir)
+    metadata_dir = Path(output_dir) / "metadata"
+
+    catalog = load_catalog(output_dir)
+    if catalog:
+        for metadata in catalog.iter_metadata():
+            index.add(metadata['id'], thread_id_for(metadata))
+        index.save()
+        return index
+
+    for metadata_file in sorted(metadata_dir.glob('*.json')):
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e:
+            print(f"Error leyendo {metadata_file}: {e}")
+            continue
+        index.add(metadata_file.stem, thread_id_for(metadata))
+
+    index.save()
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "output"
+    index = build_thread_index(output_dir)
+    print(f"🧵 {len(index.email_threads)} emails agrupados en {len(index.threads)} hilos")
+    print(f"💾 Índice guardado en: {index.index_file}")
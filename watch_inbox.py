@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Ingesta Incremental por Carpeta Vigilada
+Vigila una carpeta de entrada donde se dejan archivos .pst y .eml, y el
+directorio output/emails (emails escritos por otra extracción). Cada archivo
+nuevo se extrae con ids consecutivos, solo los emails nuevos se clasifican y
+se agregan a classification_results.json, al snapshot del dashboard, al cubo
+de agregados, al índice de entidades y al historial, sin reclasificar el
+resto. El dashboard toma los cambios en su siguiente recarga (segundos).
+
+Usa inotify (Linux, vía libc) y, si no está disponible, revisa las carpetas
+cada --interval segundos. Los eventos se agrupan hasta que pasan --debounce
+segundos sin cambios; un archivo que se sigue escribiendo espera a estar quieto.
+
+Uso: python watch_inbox.py output --inbox inbox [--folder Entrada] [--poll] [--once]
+"""
+
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import select
+import shutil
+import signal
+import struct
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from aggregate_cube import update_cube
+from classification_history import record_classification_run
+from dashboard_snapshot import results_lock, results_version, stamp_results, write_snapshot
+from email_classifier import EmailClassifier
+from eml_import import import_eml
+from entity_index import update_entity_index
+from metadata_catalog import MetadataCatalog
+from pst_extractor import PSTExtractor
+from reprocess_quarantine import update_counts
+from thread_index import ThreadIndex, thread_id_for
+
+# Estado de los archivos de la carpeta de entrada ya procesados (en output/classification)
+WATCH_STATE_FILENAME = "watch_state.json"
+
+# Directorio temporal de extracción de PST (dentro de output)
+STAGING_DIRNAME = "inbox_staging"
+
+# Tipos de archivo que se ingieren desde la carpeta de entrada
+INBOX_EXTENSIONS = ('.eml', '.pst')
+
+# Segundos sin eventos (y sin cambios en el archivo) antes de procesar
+DEBOUNCE_SECONDS = 1.0
+
+# Intervalo de revisión sin inotify
+POLL_INTERVAL = 2.0
+
+# Carpeta asignada a los .eml sueltos
+DEFAULT_FOLDER = "Entrada"
+
+EMAIL_ID_PATTERN = re.compile(r'^email_(\d+)$')
+
+# inotify(7): archivo cerrado tras escribir, movido a la carpeta, creado o borrado
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Eventos de inotify de varias carpetas (solo indica que hubo cambios)"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify no disponible")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        for directory in directories:
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory}")
+        self.name = 'inotify'
+
+    def wait(self, timeout):
+        """True si hubo eventos antes de timeout segundos"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        events = 0
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            # Con IN_Q_OVERFLOW se perdieron eventos: no importa, run_once revisa las carpetas completas
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                _, _, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size + name_length
+                events += 1
+        return events > 0
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Revisión periódica de nombres, tamaños y fechas de las carpetas"""
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self.directories = [Path(directory) for directory in directories]
+        self.interval = interval
+        self.signature = self.scan()
+        self.name = 'polling'
+
+    def scan(self):
+        signature = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            signature[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                continue
+        return signature
+
+    def wait(self, timeout):
+        """True si algo cambió; revisa cada interval segundos hasta timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(max(0.0, min(self.interval, deadline - time.monotonic())))
+            signature = self.scan()
+            if signature != self.signature:
+                self.signature = signature
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        pass
+
+
+def create_watcher(directories, poll=False, interval=POLL_INTERVAL):
+    """inotify si está disponible (y no se pidió --poll); si no, revisión periódica"""
+    if not poll:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify no disponible ({e}); se revisarán las carpetas cada {interval}s")
+    return PollingWatcher(directories, interval)
+
+
+def adopt_staged_email(staging_dir, output_dir, staged_id, email_id):
+    """Mover un email extraído en staging_dir a output_dir con un nuevo id; devuelve sus metadatos"""
+    with open(staging_dir / "metadata" / f"{staged_id}.json", 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+
+    eml_file = staging_dir / "emails" / f"{staged_id}.eml"
+    if eml_file.exists():
+        shutil.move(eml_file, output_dir / "emails" / f"{email_id}.eml")
+        metadata['eml_file'] = f"emails/{email_id}.eml"
+    attachment_dir = staging_dir / "attachments" / staged_id
+    if attachment_dir.exists():
+        shutil.move(attachment_dir, output_dir / "attachments" / email_id)
+    for attachment in metadata.get('attachments') or []:
+        attachment['path'] = f"attachments/{email_id}/{attachment['filename']}"
+
+    # El hilo se recalcula: sin índice de conversación ni asunto depende del id
+    metadata['id'] = email_id
+    metadata.pop('thread_id', None)
+    metadata['thread_id'] = thread_id_for(metadata)
+
+    with open(output_dir / "metadata" / f"{email_id}.json", 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return metadata
+
+
+class InboxIngestor:
+    """Extracción y clasificación incremental de los archivos nuevos"""
+
+    def __init__(self, output_dir="output", inbox_dir="inbox", folder=DEFAULT_FOLDER, debounce=DEBOUNCE_SECONDS,
+                 pst_backend=None):
+        self.output_dir = Path(output_dir)
+        self.inbox_dir = Path(inbox_dir)
+        self.folder = folder
+        self.debounce = debounce
+        # Backend de PSTExtractor (pypff por defecto; fake_pypff para pruebas)
+        self.pst_backend = pst_backend
+        for directory in (self.inbox_dir, self.output_dir / "emails", self.output_dir / "metadata",
+                          self.output_dir / "attachments"):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.classifier = EmailClassifier(self.output_dir, dedup=False)
+        self.results_file = self.classifier.classification_dir / 'classification_results.json'
+        self.state_file = self.classifier.classification_dir / WATCH_STATE_FILENAME
+        self.state = self.load_state()
+
+        self.results = None
+        self.results_version = None
+        self.positions = {}
+        self.encoded = []
+        self.next_number = None
+
+    def load_state(self):
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {'files': {}}
+
+    def save_state(self):
+        self.state['updated'] = datetime.now().isoformat()
+        temp_file = self.state_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, self.state_file)
+
+    def load_results(self):
+        """Resultados actuales (se recargan si otra ejecución reescribió el archivo)"""
+        current = results_version(self.results_file) if self.results_file.exists() else None
+        if self.results is None or current != self.results_version:
+            if current is None:
+                self.results = {'total_emails': 0, 'total_threads': 0, 'cotizacion': 0, 'renovacion': 0,
+                                'endoso': 0, 'sin_clasificar': 0, 'quarantined': 0, 'emails': []}
+            else:
+                with open(self.results_file, 'r', encoding='utf-8') as f:
+                    self.results = json.load(f)
+            self.results_version = current
+            self.positions = {email_info['email_id']: i for i, email_info in enumerate(self.results['emails'])}
+            # JSON de cada email serializado una vez: cada publicación solo serializa los nuevos
+            self.encoded = [json.dumps(email_info, ensure_ascii=False) for email_info in self.results['emails']]
+        return self.results
+
+    def write_results(self):
+        """Reescribir classification_results.json con el JSON ya serializado de cada email
+
+        Se escribe sin sangría (serializar 20k emails con indent tarda segundos) y
+        se reemplaza de forma atómica para que el dashboard nunca lea un archivo a medias.
+        """
+        stamp_results(self.results)
+        summary = json.dumps({key: value for key, value in self.results.items() if key != 'emails'},
+                             ensure_ascii=False)
+        separator = ', ' if summary != '{}' else ''
+        temp_file = self.results_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(summary[:-1] + separator + '"emails": [')
+            f.write(', '.join(self.encoded))
+            f.write(']}')
+        os.replace(temp_file, self.results_file)
+        self.results_version = results_version(self.results_file)
+
+    def allocate_email_id(self):
+        """Siguiente id email_NNNNNN libre (después del mayor ya extraído)"""
+        if self.next_number is None:
+            numbers = [int(match.group(1)) for match in
+                       (EMAIL_ID_PATTERN.match(name[:-5]) for name in os.listdir(self.output_dir / "metadata")
+                        if name.endswith('.json')) if match]
+            self.next_number = max(numbers, default=0) + 1
+        # Otra extracción pudo escribir ids en output/metadata desde la última revisión
+        while (self.output_dir / "metadata" / f"email_{self.next_number:06d}.json").exists():
+            self.next_number += 1
+        email_id = f"email_{self.next_number:06d}"
+        self.next_number += 1
+        return email_id
+
+    def pending_inbox_files(self):
+        """(listos, esperando): archivos nuevos de la carpeta de entrada
+
+        Un archivo modificado hace menos de debounce segundos se sigue escribiendo.
+        """
+        ready, waiting = [], []
+        now = time.time()
+        with os.scandir(self.inbox_dir) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if not entry.is_file() or not entry.name.lower().endswith(INBOX_EXTENSIONS):
+                    continue
+                stat = entry.stat()
+                known = self.state['files'].get(entry.name)
+                if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+                if now - stat.st_mtime < self.debounce:
+                    waiting.append(entry.name)
+                else:
+                    ready.append((entry.name, stat))
+        return ready, waiting
+
+    def ingest_eml(self, path):
+        """Escribir un .eml de la carpeta de entrada en output con un id nuevo"""
+        email_id = self.allocate_email_id()
+        return [import_eml(self.output_dir, path.read_bytes(), email_id, self.folder)]
+
+    def ingest_pst(self, path):
+        """Extraer un PST en un directorio temporal y adoptar sus emails con ids nuevos"""
+        staging_dir = self.output_dir / STAGING_DIRNAME / path.stem
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        try:
+            # El extractor informa cada carpeta y cada 10 emails: se silencia en el demonio
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                PSTExtractor(str(path), staging_dir, pst_backend=self.pst_backend).extract()
+
+            staged_ids = sorted(name[:-5] for name in os.listdir(staging_dir / "metadata") if name.endswith('.json'))
+            return [adopt_staged_email(staging_dir, self.output_dir, staged_id, self.allocate_email_id())
+                    for staged_id in staged_ids]
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def register(self, metadata_list):
+        """Agregar los emails nuevos al catálogo y al índice de hilos"""
+        if not metadata_list:
+            return
+        catalog = MetadataCatalog(self.output_dir)
+        for metadata in metadata_list:
+            catalog.add_email(metadata)
+        catalog.commit()
+        catalog.close()
+
+        thread_index = ThreadIndex(self.output_dir)
+        for metadata in metadata_list:
+            thread_index.add(metadata['id'], metadata['thread_id'])
+        thread_index.save()
+
+    def unclassified_emails(self):
+        """Emails con .eml y metadatos en output que todavía no están en los resultados"""
+        self.load_results()
+        email_ids = []
+        with os.scandir(self.output_dir / "emails") as entries:
+            for entry in entries:
+                email_id = entry.name[:-4]
+                if entry.name.endswith('.eml') and email_id not in self.positions:
+                    if (self.output_dir / "metadata" / f"{email_id}.json").exists():
+                        email_ids.append(email_id)
+        return sorted(email_ids)
+
+    def classify_and_append(self, email_ids):
+        """Clasificar solo los emails indicados y actualizar resultados, snapshot e índices"""
+        with results_lock(self.classifier.classification_dir):
+            results = self.load_results()
+            previous = []
+            updated = []
+            for email_id in email_ids:
+                metadata = self.classifier.load_metadata(email_id)
+                classification = self.classifier.classify_email(email_id, metadata)
+                if 'error' in classification:
+                    print(f"⚠️  {email_id}: {classification['error']}")
+                    continue
+                encoded = json.dumps(classification, ensure_ascii=False)
+                if email_id in self.positions:
+                    previous.append(results['emails'][self.positions[email_id]])
+                    results['emails'][self.positions[email_id]] = classification
+                    self.encoded[self.positions[email_id]] = encoded
+                else:
+                    self.positions[email_id] = len(results['emails'])
+                    results['emails'].append(classification)
+                    self.encoded.append(encoded)
+                updated.append(classification)
+
+            if not updated:
+                return updated
+
+            update_counts(results)
+            record_classification_run(self.classifier, updated, 'watch_inbox', complete=False)
+            self.write_results()
+
+            write_snapshot(results, self.results_file, encoded_records=self.encoded)
+            self.classifier.save_feature_matrix(results['emails'])
+            update_cube(self.classifier.classification_dir, previous, updated, all_emails=results['emails'])
+            update_entity_index(self.classifier.classification_dir, updated)
+            self.classifier.save_quarantine(email['email_id'] for email in updated)
+            return updated
+
+    def run_once(self):
+        """Procesar todo lo pendiente; devuelve (emails agregados, archivos que siguen escribiéndose)"""
+        ready, waiting = self.pending_inbox_files()
+        imported = []
+        for name, stat in ready:
+            path = self.inbox_dir / name
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'ingested': datetime.now().isoformat()}
+            try:
+                metadata_list = self.ingest_pst(path) if name.lower().endswith('.pst') else self.ingest_eml(path)
+                entry['email_ids'] = [metadata['id'] for metadata in metadata_list]
+                imported.extend(metadata_list)
+            except Exception as e:
+                entry['error'] = f"{type(e).__name__}: {e}"
+                print(f"❌ {name}: {entry['error']}")
+            self.state['files'][name] = entry
+
+        self.register(imported)
+        updated = self.classify_and_append(self.unclassified_emails())
+        if ready:
+            self.save_state()
+        return updated, waiting
+
+
+def run(ingestor, watcher, debounce=DEBOUNCE_SECONDS):
+    """Bucle del demonio: esperar eventos, agruparlos y procesar lo nuevo"""
+    retry = None
+    while True:
+        if not watcher.wait(retry if retry is not None else 3600):
+            if retry is None:
+                continue
+        else:
+            # Agrupar la ráfaga de eventos (copias de varios archivos, extracción en curso)
+            while watcher.wait(debounce):
+                pass
+
+        start = time.perf_counter()
+        updated, waiting = ingestor.run_once()
+        retry = debounce if waiting else None
+        if updated:
+            print(f"📥 {len(updated)} emails nuevos clasificados y publicados en "
+                  f"{time.perf_counter() - start:.2f}s ({datetime.now():%H:%M:%S})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta incremental de PST/EML desde una carpeta vigilada")
+    parser.add_argument('output_dir', nargs='?', default='output')
+    parser.add_argument('--inbox', default='inbox', help="Carpeta donde se dejan los .pst y .eml")
+    parser.add_argument('--folder', default=DEFAULT_FOLDER, help="Carpeta asignada a los .eml sueltos")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS)
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="Intervalo de revisión sin inotify")
+    parser.add_argument('--poll', action='store_true', help="No usar inotify")
+    parser.add_argument('--once', action='store_true', help="Procesar lo pendiente y salir")
+    args = parser.parse_args()
+
+    ingestor = InboxIngestor(args.output_dir, args.inbox, args.folder, args.debounce)
+
+    start = time.perf_counter()
+    updated, waiting = ingestor.run_once()
+    print(f"📥 Pendientes al iniciar: {len(updated)} emails clasificados en {time.perf_counter() - start:.2f}s")
+    if args.once:
+        return
+
+    watcher = create_watcher([ingestor.inbox_dir, ingestor.output_dir / "emails"], args.poll, args.interval)
+    print(f"👀 Vigilando {ingestor.inbox_dir} y {ingestor.output_dir / 'emails'} ({watcher.name})")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run(ingestor, watcher, args.debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,31 @@ Email Classification Web Dashboard
 Aplicación web para visualizar y analizar emails clasificados
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, abort
+from flask import Flask, render_template, request, jsonify, send_file, abort, Response, stream_with_context, g
 import json
-import pandas as pd
-import plotly.graph_objs as go
-import plotly.utils
+import numpy as np
 from pathlib import Path
-import email
 import zipfile
 import io
 from datetime import datetime
 import re
 import mimetypes
 import os
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+
+from dashboard_snapshot import (
+    SNAPSHOT_DIRNAME, SORT_FIELDS, build_dataframe, build_sort_indexes, build_sort_ranks,
+    dataframe_to_columns, find_position, find_positions, load_snapshot, read_record, results_version
+)
+from mime_body import read_text_parts
+from metadata_catalog import load_catalog
+from aggregate_cube import CUBE_DIMENSIONS, CUBE_FILENAME, GROUP_DIMENSIONS, NO_DATE, AggregateCube
+from entity_index import ENTITY_INDEX_FILENAME, ENTITY_KINDS, EntityIndex, normalize_entity
+from request_metrics import RequestMetrics, install as install_metrics
+from background_jobs import JOB_KINDS, FINISHED_STATUSES, JobConflict, JobManager, zip_compress_type
 
 # Configuración de Google Drive
 try:
@@ -26,94 +38,710 @@ except ImportError:
 
 app = Flask(__name__)
 
+# pandas y plotly se importan solo en las rutas que los necesitan (arranque rápido)
+
+# Directorio de datos del dashboard y uso del snapshot binario precalculado
+DASHBOARD_OUTPUT_DIR = os.environ.get('DASHBOARD_OUTPUT_DIR', 'output')
+DASHBOARD_USE_SNAPSHOT = os.environ.get('DASHBOARD_USE_SNAPSHOT', '1') != '0'
+
+# Cada proceso comprueba cada DASHBOARD_RELOAD_INTERVAL segundos si los resultados
+# se regeneraron y cambia al snapshot nuevo; si el snapshot no aparece en
+# DASHBOARD_SNAPSHOT_WAIT segundos tras el JSON, recarga desde el JSON
+DASHBOARD_RELOAD_INTERVAL = float(os.environ.get('DASHBOARD_RELOAD_INTERVAL', '2'))
+DASHBOARD_SNAPSHOT_WAIT = float(os.environ.get('DASHBOARD_SNAPSHOT_WAIT', '30'))
+
+# Perfil cProfile de peticiones más lentas que este umbral en ms (desactivado si no se define)
+DASHBOARD_PROFILE_SLOW_MS = os.environ.get('DASHBOARD_PROFILE_SLOW_MS')
+DASHBOARD_PROFILE_DIR = os.environ.get('DASHBOARD_PROFILE_DIR', os.path.join(DASHBOARD_OUTPUT_DIR, 'profiles'))
+
+# Latencia, tamaño de respuesta y etapas internas por ruta (expuestas en /metrics)
+metrics = RequestMetrics(
+    slow_request_ms=float(DASHBOARD_PROFILE_SLOW_MS) if DASHBOARD_PROFILE_SLOW_MS else None,
+    profile_dir=DASHBOARD_PROFILE_DIR
+)
+install_metrics(app, metrics)
+
+# Número máximo de combinaciones de filtros cacheadas
+SEARCH_CACHE_SIZE = 64
+
+# Resultados por página de /api/search (per_page se ajusta a 1..MAX_PER_PAGE)
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+# Facetas de /api/search (facets=true) y el filtro propio que se omite al contarlas
+FACET_NAMES = ('classification', 'folder', 'has_attachments', 'slip_status', 'month')
+FACET_FILTERS = {'classification': 'classification', 'folder': 'folder', 'has_attachments': 'has_attachments'}
+FACET_CLASSIFICATIONS = ['cotizacion', 'renovacion', 'endoso', 'sin_clasificar']
+SLIP_STATUS_LABELS = ('sin_slip', 'incompleto', 'completo')
+NO_DATE_LABEL = 'sin_fecha'
+
+# Columnas de cada email en las respuestas de /api/entities
+ENTITY_ROW_COLUMNS = ('email_id', 'subject', 'sender_name', 'sender_email', 'folder', 'delivery_time',
+                      'classification_type', 'confidence', 'status', 'agente_code', 'poliza_number', 'thread_id')
+
+# Tamaño de bloque para lectura de archivos al generar ZIPs en streaming
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Cache HTTP: las APIs se revalidan siempre (ETag); los adjuntos no cambian nunca
+API_CACHE_MAX_AGE = 0
+ATTACHMENT_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Progreso de trabajos por Server-Sent Events: intervalo de lectura de la tabla y duración
+# máxima de cada conexión (el navegador se reconecta solo, así un worker web no queda tomado)
+JOB_EVENTS_INTERVAL = 0.5
+JOB_EVENTS_TIMEOUT = 30
+JOB_EVENTS_RETRY_MS = 1000
+
+# Tipos MIME de los archivos que dejan los trabajos
+JOB_FILE_MIMETYPES = {
+    'zip': 'application/zip',
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'txt': 'text/plain; charset=utf-8'
+}
+
+# Formatos soportados por la exportación masiva
+EXPORT_FORMATS = ('zip', 'csv', 'xlsx')
+
+# Filtros de /api/search y /api/export, en el orden de parse_search_filters
+SEARCH_FILTER_NAMES = ('query', 'classification', 'folder', 'has_attachments', 'date_from', 'date_to',
+                       'hide_duplicates')
+
+# Columnas del manifiesto de exportación
+EXPORT_COLUMNS = {
+    'email_id': 'ID',
+    'subject': 'Asunto',
+    'sender_name': 'Remitente',
+    'sender_email': 'Email Remitente',
+    'classification_type': 'Clasificación',
+    'confidence': 'Confianza',
+    'status': 'Estado',
+    'agente_code': 'Agente',
+    'poliza_number': 'Póliza',
+    'total_attachments': 'Adjuntos',
+    'folder': 'Carpeta',
+    'delivery_time': 'Fecha',
+    'duplicate_of': 'Duplicado de'
+}
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Destino de escritura no posicionable que acumula los bytes hasta ser drenados"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Generar un ZIP por bloques a partir de (ruta, nombre en el archivo) sin cargarlo completo en memoria"""
+    buffer = ZipStreamBuffer()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file_path, arcname in entries:
+            file_path = Path(file_path)
+            if not file_path.is_file():
+                continue
+
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            zinfo.compress_type = zip_compress_type(file_path)
+
+            with open(file_path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=True) as dest:
+                while True:
+                    with metrics.stage('file_io'):
+                        chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    with metrics.stage('zip'):
+                        dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # Directorio central del ZIP
+    yield buffer.drain()
+
+class DashboardState:
+    """Datos del dashboard para una versión de los resultados
+
+    No se modifica después de construirse: refresh reemplaza el objeto completo y
+    cada petición toma el estado una sola vez al comenzar, así que termina con la
+    versión con la que empezó aunque los resultados cambien a mitad de camino.
+    El cache de búsqueda, las facetas y el JSON cargado bajo demanda pertenecen a
+    la versión y se descartan con ella.
+    """
+
+    def __init__(self, classification_file, results_version='empty', columns=None, sort_indexes=None,
+                 sort_ranks=None, email_order=None, records=None, record_offsets=None, data=None, df=None):
+        self.classification_file = classification_file
+        self.results_version = results_version
+        self.columns = columns or {}
+        self.sort_indexes = dict(sort_indexes or {})
+        self.sort_ranks = dict(sort_ranks) if sort_ranks is not None else build_sort_ranks(self.sort_indexes)
+        self.email_order = email_order
+        self.records = records
+        self.record_offsets = record_offsets
+        self._data = data
+        self._df = df
+        self._email_positions = None
+        self._facet_codes = None
+        self.search_cache = OrderedDict()
+    @property
+    def total_rows(self):
+        """Número de emails clasificados"""
+        return len(self.columns['email_id']) if self.columns else 0
+
+    @property
+    def data(self):
+        """Resultados completos de clasificación (JSON cargado bajo demanda)"""
+        if self._data is None:
+            with open(self.classification_file, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        return self._data
+
+    @property
+    def df(self):
+        """DataFrame del dashboard (construido bajo demanda desde las columnas)
+
+        Las rutas usan rows_frame para no retener una copia por proceso; se
+        mantiene para análisis interactivo y scripts.
+        """
+        if self._df is None:
+            self._df = self.rows_frame()
+        return self._df
+
+    def rows_frame(self, positions=None, columns=None):
+        """DataFrame temporal con las filas (y columnas) pedidas, en el orden de positions"""
+        import pandas as pd
+
+        if not self.columns:
+            return pd.DataFrame()
+
+        names = columns or list(self.columns)
+        if positions is None:
+            df = pd.DataFrame({name: np.asarray(self.columns[name]) for name in names})
+        else:
+            df = pd.DataFrame({name: np.asarray(self.columns[name][positions]) for name in names})
+        if 'delivery_time' in df:
+            df['delivery_time'] = df['delivery_time'].where(df['delivery_time'] != '', None)
+        return df
+
+    def position_of(self, email_id):
+        """Fila de un email_id (búsqueda binaria en el snapshot; diccionario sin él)"""
+        if self.email_order is not None:
+            return find_position(self.columns['email_id'], self.email_order, email_id)
+        if self._email_positions is None:
+            ids = self.columns.get('email_id', [])
+            self._email_positions = {str(email_id): pos for pos, email_id in enumerate(ids)}
+        return self._email_positions.get(email_id)
+
+    def positions_of(self, email_ids):
+        """Filas de varios email_ids (los que no están en los resultados se omiten)"""
+        if self.email_order is not None:
+            return find_positions(self.columns['email_id'], self.email_order, email_ids)
+        positions = [self.position_of(email_id) for email_id in email_ids]
+        return np.array([pos for pos in positions if pos is not None], dtype=np.int64)
+
+    def get_classification(self, email_id):
+        """Resultado de clasificación de un email (del snapshot mapeado, sin cargar el JSON completo)"""
+        if self.records is not None:
+            position = self.position_of(email_id)
+            return read_record(self.records, self.record_offsets, position) if position is not None else None
+        for email_info in self.data.get('emails', []):
+            if email_info['email_id'] == email_id:
+                return email_info
+        return None
+
+    def get_folders(self):
+        """Carpetas de origen en orden de aparición"""
+        return list(dict.fromkeys(self.columns['folder'].tolist())) if self.total_rows else []
+
+    def get_summary_stats(self):
+        """Obtener estadísticas resumen"""
+        total = self.total_rows
+
+        if total == 0:
+            return {}
+
+        types = self.columns['classification_type']
+        stats = {
+            'total_emails': total,
+            'cotizacion': int(np.count_nonzero(types == 'cotizacion')),
+            'renovacion': int(np.count_nonzero(types == 'renovacion')),
+            'endoso': int(np.count_nonzero(types == 'endoso')),
+            'sin_clasificar': int(np.count_nonzero(types == 'sin_clasificar')),
+            'with_attachments': int(np.count_nonzero(self.columns['total_attachments'] > 0)),
+            'with_slip': int(np.count_nonzero(self.columns['has_slip'])),
+            'complete_slip': int(np.count_nonzero(self.columns['slip_complete']))
+        }
+
+        return stats
+
+    def filter_masks(self, query="", classification="", folder="", has_attachments=None, date_from="", date_to="", hide_duplicates=False):
+        """Máscara booleana de cada filtro activo (en orden de las columnas), por nombre de filtro
+
+        Opera sobre las columnas mapeadas; solo el filtro de texto crea series temporales.
+        """
+        import pandas as pd
+
+        columns = self.columns
+        masks = {}
+
+        # Filtrar por query en asunto
+        if query:
+            masks['query'] = (
+                pd.Series(columns['subject']).str.contains(query, case=False, na=False) |
+                pd.Series(columns['sender_name']).str.contains(query, case=False, na=False)
+            ).to_numpy()
+
+        # Filtrar por clasificación
+        if classification and classification != 'all':
+            masks['classification'] = columns['classification_type'] == classification
+
+        # Filtrar por carpeta
+        if folder and folder != 'all':
+            masks['folder'] = columns['folder'] == folder
+
+        # Filtrar por adjuntos
+        if has_attachments is not None:
+            if has_attachments:
+                masks['has_attachments'] = columns['total_attachments'] > 0
+            else:
+                masks['has_attachments'] = columns['total_attachments'] == 0
+
+        # Filtrar por fechas (NaT no cumple ninguna comparación)
+        if date_from or date_to:
+            date_mask = np.ones(self.total_rows, dtype=bool)
+            if date_from:
+                date_mask &= columns['delivery_date'] >= pd.Timestamp(date_from).to_datetime64()
+            if date_to:
+                date_mask &= columns['delivery_date'] <= pd.Timestamp(date_to).to_datetime64()
+            masks['date'] = date_mask
+
+        # Ocultar las copias casi duplicadas (se muestra solo el representante del grupo)
+        if hide_duplicates:
+            masks['duplicates'] = columns['duplicate_of'] == ''
+
+        return masks
+
+    def combine_masks(self, masks, exclude=None):
+        """AND de las máscaras de filtro (todas las filas si no hay ninguna)"""
+        mask = np.ones(self.total_rows, dtype=bool)
+        for name, filter_mask in masks.items():
+            if name != exclude:
+                mask &= filter_mask
+        return mask
+
+    def filter_mask(self, query="", classification="", folder="", has_attachments=None, date_from="", date_to="", hide_duplicates=False):
+        """Calcular máscara booleana (en orden de las columnas) para los filtros de búsqueda"""
+        return self.combine_masks(
+            self.filter_masks(query, classification, folder, has_attachments, date_from, date_to, hide_duplicates)
+        )
+
+    @property
+    def facet_codes(self):
+        """Código entero por fila y etiquetas de cada faceta (calculados una vez por versión)"""
+        if self._facet_codes is None:
+            columns = self.columns
+            codes = {}
+            for facet, column in (('classification', 'classification_type'), ('folder', 'folder')):
+                labels, inverse = np.unique(columns[column], return_inverse=True)
+                codes[facet] = (inverse.ravel().astype(np.int32), [str(label) for label in labels])
+
+            codes['has_attachments'] = (
+                (columns['total_attachments'] > 0).astype(np.int32), ['false', 'true']
+            )
+            has_slip = np.asarray(columns['has_slip'], dtype=bool)
+            slip_complete = np.asarray(columns['slip_complete'], dtype=bool)
+            codes['slip_status'] = (
+                has_slip.astype(np.int32) + (has_slip & slip_complete), list(SLIP_STATUS_LABELS)
+            )
+
+            # Mes de entrega; las fechas inválidas (NaT) van a la última etiqueta
+            months = np.asarray(columns['delivery_date']).astype('datetime64[M]')
+            valid = ~np.isnat(months)
+            labels, inverse = np.unique(months[valid], return_inverse=True)
+            month_codes = np.full(len(months), len(labels), dtype=np.int32)
+            month_codes[valid] = inverse.ravel()
+            codes['month'] = (month_codes, [str(label) for label in labels] + [NO_DATE_LABEL])
+
+            self._facet_codes = codes
+        return self._facet_codes
+
+    def facet_counts(self, masks, combined):
+        """Conteos por faceta para los filtros actuales
+
+        Las facetas con filtro propio (clasificación, carpeta, adjuntos) se cuentan
+        sin ese filtro, para mostrar cuántos emails habría al cambiar la opción;
+        SLIP y mes se cuentan sobre el conjunto filtrado. Se cuentan emails (no hilos).
+        """
+        counts = {}
+        for facet, (codes, labels) in self.facet_codes.items():
+            own_filter = FACET_FILTERS.get(facet)
+            mask = self.combine_masks(masks, exclude=own_filter) if own_filter in masks else combined
+            totals = np.bincount(codes[mask], minlength=len(labels))
+            counts[facet] = {label: int(total) for label, total in zip(labels, totals)
+                             if total or facet in ('has_attachments', 'slip_status')}
+
+        # Todas las clasificaciones del dashboard, aunque no tengan emails
+        for classification in FACET_CLASSIFICATIONS:
+            counts['classification'].setdefault(classification, 0)
+        return counts
+
+    def get_facets(self, filters, masks=None):
+        """Conteos por faceta (cacheados por combinación de filtros, sin importar el orden)"""
+        cache_key = ('facets', filters)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            self.search_cache.move_to_end(cache_key)
+            return cached
+
+        with metrics.stage('facets'):
+            if masks is None:
+                masks = self.filter_masks(*filters)
+            facets = self.facet_counts(masks, self.combine_masks(masks))
+
+        self.search_cache[cache_key] = facets
+        if len(self.search_cache) > SEARCH_CACHE_SIZE:
+            self.search_cache.popitem(last=False)
+        return facets
+
+    def get_sorted_matches(self, filters, sort='date', order='desc', collapse_threads=False, masks=None):
+        """Obtener posiciones ordenadas que cumplen los filtros (cacheado por combinación)
+
+        Con collapse_threads se conserva solo el primer email de cada hilo en el
+        orden pedido y se devuelve, por posición, cuántos emails del hilo coinciden.
+        masks permite reutilizar las máscaras ya calculadas para las facetas.
+        """
+        cache_key = (filters, sort, order, collapse_threads)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            self.search_cache.move_to_end(cache_key)
+            metrics.increment('search_cache', (('result', 'hit'),))
+            return cached
+        metrics.increment('search_cache', (('result', 'miss'),))
+
+        permutation = self.sort_indexes[(sort, order)]
+        with metrics.stage('filter'):
+            mask = self.filter_mask(*filters) if masks is None else self.combine_masks(masks)
+            matches = permutation[mask[permutation]]
+
+        thread_sizes = None
+        if collapse_threads and len(matches):
+            with metrics.stage('collapse_threads'):
+                _, first_idx, inverse = np.unique(
+                    self.columns['thread_id'][matches], return_index=True, return_inverse=True
+                )
+                counts = np.bincount(inverse.ravel())
+                keep = np.sort(first_idx)
+                thread_sizes = counts[inverse.ravel()[keep]]
+                matches = matches[keep]
+
+        # Rangos crecientes dentro de la permutación, usados para búsqueda por cursor
+        match_ranks = self.sort_ranks[(sort, order)][matches]
+
+        self.search_cache[cache_key] = (matches, match_ranks, thread_sizes)
+        if len(self.search_cache) > SEARCH_CACHE_SIZE:
+            self.search_cache.popitem(last=False)
+
+        return matches, match_ranks, thread_sizes
+
+    def get_export_rows(self, filters, sort='date', order='desc', collapse_threads=False):
+        """Obtener todas las filas que cumplen los filtros para exportación masiva"""
+        import pandas as pd
+
+        if self.total_rows == 0:
+            return pd.DataFrame(columns=list(EXPORT_COLUMNS))
+
+        matches, _, _ = self.get_sorted_matches(filters, sort, order, collapse_threads)
+        return self.rows_frame(matches, list(EXPORT_COLUMNS))
+
+    def search_emails(self, query="", classification="", folder="", has_attachments=None, date_from="", date_to="", hide_duplicates=False, page=1, per_page=DEFAULT_PER_PAGE, sort='date', order='desc', cursor=None, collapse_threads=False, facets=False):
+        """Buscar emails con filtros, ordenamiento y paginación (por página o por cursor)
+
+        Con facets se agregan los conteos por faceta, calculados con las mismas
+        máscaras de filtro que el resultado.
+        """
+        import pandas as pd
+
+        if sort not in SORT_FIELDS:
+            sort = 'date'
+        if order not in ('asc', 'desc'):
+            order = 'desc'
+
+        page = max(page, 1)
+        per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+        filters = (query, classification, folder, has_attachments, date_from, date_to, hide_duplicates)
+        facet_counts = None
+
+        if self.total_rows > 0:
+            masks = None
+            if facets:
+                # Una sola pasada de filtros para el resultado y las facetas
+                if ('facets', filters) not in self.search_cache:
+                    with metrics.stage('filter'):
+                        masks = self.filter_masks(*filters)
+                facet_counts = self.get_facets(filters, masks)
+            matches, match_ranks, thread_sizes = self.get_sorted_matches(filters, sort, order, collapse_threads, masks)
+        else:
+            matches = match_ranks = np.array([], dtype=np.int64)
+            thread_sizes = None
+            if facets:
+                facet_counts = {facet: {} for facet in FACET_NAMES}
+
+        # Calcular paginación
+        total_results = len(matches)
+        total_pages = (total_results + per_page - 1) // per_page
+
+        if cursor:
+            # Paginación por cursor (keyset): continuar después del último email entregado
+            cursor_pos = self.position_of(cursor)
+            if cursor_pos is None:
+                start_idx = 0
+            else:
+                cursor_rank = self.sort_ranks[(sort, order)][cursor_pos]
+                start_idx = int(np.searchsorted(match_ranks, cursor_rank, side='right'))
+            page = start_idx // per_page + 1
+        else:
+            start_idx = (page - 1) * per_page
+        end_idx = start_idx + per_page
+
+        # Aplicar paginación y convertir a diccionario
+        with metrics.stage('to_records'):
+            df_paginated = self.rows_frame(matches[start_idx:end_idx])
+            results = df_paginated.to_dict('records')
+
+        # Cantidad de emails del hilo que cumplen los filtros (solo al agrupar)
+        if thread_sizes is not None:
+            for result, size in zip(results, thread_sizes[start_idx:end_idx]):
+                result['thread_size'] = int(size)
+
+        # Limpiar fechas NaT en los resultados
+        for result in results:
+            if pd.isna(result.get('delivery_time')):
+                result['delivery_time'] = None
+            if pd.isna(result.get('delivery_date')):
+                result['delivery_date'] = None
+
+        has_next = end_idx < total_results
+
+        response = {
+            'results': results,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total_results,
+                'pages': total_pages,
+                'has_prev': page > 1,
+                'has_next': has_next,
+                'prev_page': page - 1 if page > 1 else None,
+                'next_page': page + 1 if has_next else None,
+                'sort': sort,
+                'order': order,
+                'next_cursor': results[-1]['email_id'] if has_next and results else None,
+                'collapse_threads': collapse_threads
+            }
+        }
+
+        if facet_counts is not None:
+            response['facets'] = facet_counts
+
+        return response
+
+    def get_entity_emails(self, index, kind, value, sort='date', order='desc', limit=None):
+        """Emails del índice de entidades que mencionan una póliza o un código de agente, ordenados como la búsqueda
+
+        Devuelve (total, filas); los email_ids que ya no están en los resultados se omiten.
+        """
+        positions = self.positions_of(index.lookup(kind, value))
+        if len(positions) == 0:
+            return 0, []
+
+        total = len(positions)
+        positions = positions[np.argsort(self.sort_ranks[(sort, order)][positions], kind='stable')]
+        if limit:
+            positions = positions[:limit]
+
+        columns = {name: self.columns[name][positions].tolist() for name in ENTITY_ROW_COLUMNS}
+        rows = [dict(zip(ENTITY_ROW_COLUMNS, values)) for values in zip(*columns.values())]
+        for row in rows:
+            row['delivery_time'] = row['delivery_time'] or None
+        return total, rows
+
+
 class EmailDashboard:
-    def __init__(self, output_dir="output"):
+    def __init__(self, output_dir="output", use_snapshot=True):
         self.output_dir = Path(output_dir)
         self.classification_file = self.output_dir / "classification" / "classification_results.json"
+        self.snapshot_dir = self.output_dir / "classification" / SNAPSHOT_DIRNAME
         self.emails_dir = self.output_dir / "emails"
         self.attachments_dir = self.output_dir / "attachments"
         self.metadata_dir = self.output_dir / "metadata"
+        self.exports_dir = self.output_dir / "exports"
+        self.cube_file = self.output_dir / "classification" / CUBE_FILENAME
+        self.entity_index_file = self.output_dir / "classification" / ENTITY_INDEX_FILENAME
+        self.use_snapshot = use_snapshot
+        self._catalog = None
+        self._cube = None
+        self._entity_index = None
+        self.reload_lock = threading.Lock()
 
         # Cargar datos de clasificación
         self.load_classification_data()
 
     def load_classification_data(self):
-        """Cargar datos de clasificación"""
+        """Cargar datos de clasificación (snapshot binario si está vigente, si no el JSON)"""
+        self.apply_state(self.read_classification_state())
+
+    def read_classification_state(self, snapshot=None):
+        """Estado completo del dashboard (DashboardState) para la versión vigente de los resultados"""
+        if not self.classification_file.exists():
+            print(f"Archivo de clasificación no encontrado: {self.classification_file}")
+            return DashboardState(self.classification_file, data={'emails': []})
+
         try:
-            if not self.classification_file.exists():
-                print(f"Archivo de clasificación no encontrado: {self.classification_file}")
-                self.data = {'emails': []}
-                self.df = pd.DataFrame()
-                return
+            # Versión de los resultados: cambia con cada ejecución de clasificación
+            version = results_version(self.classification_file)
+
+            if snapshot is None and self.use_snapshot:
+                snapshot = load_snapshot(self.snapshot_dir, version)
+            if snapshot is not None:
+                # Columnas, índices y resultados mapeados en memoria (compartidos entre
+                # procesos); el JSON y el DataFrame completos no se cargan
+                return DashboardState(
+                    self.classification_file, version, snapshot['columns'], snapshot['sort_indexes'],
+                    snapshot['sort_ranks'], snapshot['email_order'], snapshot['records'], snapshot['record_offsets']
+                )
 
+            if self.use_snapshot:
+                # Cada proceso construye su propio DataFrame: se pierde el arranque rápido
+                # y la memoria compartida (regenerar con el clasificador o reclassify_emails.py)
+                print(f"⚠️  Sin snapshot vigente en {self.snapshot_dir} para los resultados "
+                      f"{version}: se carga el JSON completo")
             with open(self.classification_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+                data = json.load(f)
 
             # Convertir a DataFrame para análisis
-            emails_data = []
-            for email_info in self.data.get('emails', []):
-                row = {
-                    'email_id': email_info['email_id'],
-                    'subject': email_info['metadata'].get('subject', ''),
-                    'sender_name': email_info['metadata'].get('sender_name', ''),
-                    'sender_email': email_info['metadata'].get('sender_email', ''),
-                    'folder': email_info['metadata'].get('folder', ''),
-                    'delivery_time': email_info['metadata'].get('delivery_time', ''),
-                    'size': email_info['metadata'].get('size', 0),
-                    'attachment_count': email_info['metadata'].get('attachment_count', 0),
-                    'classification_type': email_info['primary_classification']['type'],
-                    'confidence': email_info['primary_classification']['confidence'],
-                    'status': email_info['primary_classification']['status'],
-                    'agente_code': email_info['primary_classification']['details'].get('agente_code', ''),
-                    'poliza_number': email_info['primary_classification']['details'].get('poliza_number', ''),
-                    'has_slip': email_info['attachment_analysis'].get('has_slip', False),
-                    'slip_complete': email_info['attachment_analysis'].get('slip_complete', False),
-                    'total_attachments': email_info['attachment_analysis'].get('total_attachments', 0)
-                }
-                emails_data.append(row)
-
-            self.df = pd.DataFrame(emails_data)
-
-            # Limpiar fechas
-            self.df['delivery_date'] = pd.to_datetime(self.df['delivery_time'], errors='coerce')
-
-            # Convertir fechas NaT a None para evitar errores de serialización JSON
-            self.df['delivery_time'] = self.df['delivery_time'].where(pd.notnull(self.df['delivery_time']), None)
+            df = build_dataframe(data)
+            if len(df) == 0:
+                return DashboardState(self.classification_file, version, data=data, df=df)
+            return DashboardState(self.classification_file, version, dataframe_to_columns(df),
+                                  build_sort_indexes(df), data=data, df=df)
 
         except Exception as e:
             print(f"Error cargando datos: {e}")
-            self.data = {'emails': []}
-            self.df = pd.DataFrame()
+            return DashboardState(self.classification_file, data={'emails': []})
 
-    def get_summary_stats(self):
-        """Obtener estadísticas resumen"""
-        total = len(self.df)
+    def apply_state(self, state):
+        """Reemplazar el estado en una sola asignación (las peticiones en curso conservan el anterior)"""
+        self.state = state
+        self.next_refresh_check = time.monotonic() + DASHBOARD_RELOAD_INTERVAL
 
-        if total == 0:
-            return {}
+    def refresh(self):
+        """Cambiar a los resultados regenerados (se comprueba como mucho cada DASHBOARD_RELOAD_INTERVAL s)
 
-        stats = {
-            'total_emails': total,
-            'cotizacion': len(self.df[self.df['classification_type'] == 'cotizacion']),
-            'renovacion': len(self.df[self.df['classification_type'] == 'renovacion']),
-            'endoso': len(self.df[self.df['classification_type'] == 'endoso']),
-            'sin_clasificar': len(self.df[self.df['classification_type'] == 'sin_clasificar']),
-            'with_attachments': len(self.df[self.df['total_attachments'] > 0]),
-            'with_slip': len(self.df[self.df['has_slip'] == True]),
-            'complete_slip': len(self.df[self.df['slip_complete'] == True])
-        }
+        Con snapshot se espera a que el clasificador termine de escribir el snapshot
+        de la nueva versión; si no aparece en DASHBOARD_SNAPSHOT_WAIT s se lee el JSON.
+        """
+        if time.monotonic() < self.next_refresh_check:
+            return False
+        self.next_refresh_check = time.monotonic() + DASHBOARD_RELOAD_INTERVAL
 
-        return stats
-
-    def create_charts(self):
+        try:
+            version = results_version(self.classification_file)
+            modified = self.classification_file.stat().st_mtime
+        except OSError:
+            return False
+        if version == self.state.results_version:
+            return False
+
+        with self.reload_lock:
+            if version == self.state.results_version:
+                return False
+            snapshot = load_snapshot(self.snapshot_dir, version) if self.use_snapshot else None
+            if snapshot is None and self.use_snapshot and time.time() - modified < DASHBOARD_SNAPSHOT_WAIT:
+                return False
+            self.apply_state(self.read_classification_state(snapshot))
+            print(f"🔄 Resultados actualizados (versión {self.state.results_version})")
+            return True
+
+    @property
+    def catalog(self):
+        """Catálogo SQLite de metadatos (abierto bajo demanda; None si no está disponible)"""
+        if self._catalog is None:
+            self._catalog = load_catalog(self.output_dir) or False
+        return self._catalog or None
+
+    def get_cube(self, state):
+        """Cubo de agregados y su sello (se recarga si el clasificador lo actualizó)
+
+        Sin aggregate_cube.npz (resultados anteriores al cubo) se construye una vez
+        por versión de resultados a partir de las columnas del estado.
+        """
+        try:
+            stamp = ('file', self.cube_file.stat().st_mtime_ns)
+        except OSError:
+            stamp = ('columns', state.results_version)
+
+        # Cubo y sello en una sola tupla: otra petición nunca ve uno sin el otro
+        cached = self._cube
+        if cached is None or cached[1] != stamp:
+            cube = AggregateCube.load(self.cube_file.parent) if stamp[0] == 'file' else None
+            if cube is None:
+                cube = AggregateCube.from_columns(state.columns) if state.columns else AggregateCube()
+            cached = self._cube = (cube, stamp)
+        return cached
+
+    def get_entity_index(self, state):
+        """Índice de pólizas y códigos de agente y su sello (se recarga si el clasificador lo actualizó)
+
+        Sin entity_index.json (resultados anteriores al índice) se construye una vez
+        por versión de resultados con la primera coincidencia de cada email.
+        """
+        try:
+            stamp = ('file', self.entity_index_file.stat().st_mtime_ns)
+        except OSError:
+            stamp = ('columns', state.results_version)
+
+        cached = self._entity_index
+        if cached is None or cached[1] != stamp:
+            index = EntityIndex.load(self.entity_index_file.parent) if stamp[0] == 'file' else None
+            if index is None:
+                index = EntityIndex.from_columns(state.columns) if state.columns else EntityIndex()
+            cached = self._entity_index = (index, stamp)
+        return cached
+
+    def create_charts(self, state):
         """Crear gráficos para el dashboard"""
+        import plotly.graph_objs as go
+
         charts = {}
 
-        if len(self.df) == 0:
+        if state.total_rows == 0:
             return charts
 
+        # DataFrame temporal con las columnas de los gráficos
+        df = state.rows_frame(columns=['classification_type', 'confidence'])
+
         # Gráfico de clasificación
-        class_counts = self.df['classification_type'].value_counts()
+        class_counts = df['classification_type'].value_counts()
 
         charts['classification_pie'] = {
             'data': [go.Pie(
@@ -127,39 +755,35 @@ class EmailDashboard:
             )
         }
 
-        # Gráfico de emails por fecha
-        if 'delivery_date' in self.df.columns:
-            df_with_dates = self.df.dropna(subset=['delivery_date'])
-            if len(df_with_dates) > 0:
-                df_with_dates = df_with_dates.copy()
-                df_with_dates['date_only'] = df_with_dates['delivery_date'].dt.date
-                date_counts = df_with_dates.groupby(['date_only', 'classification_type']).size().reset_index(name='count')
-
-                charts['timeline'] = {
-                    'data': [],
-                    'layout': go.Layout(
-                        title='Emails por Fecha y Clasificación',
-                        height=400,
-                        xaxis={'title': 'Fecha'},
-                        yaxis={'title': 'Cantidad de Emails'}
-                    )
-                }
-
-                for class_type in date_counts['classification_type'].unique():
-                    class_data = date_counts[date_counts['classification_type'] == class_type]
-                    charts['timeline']['data'].append(
-                        go.Scatter(
-                            x=class_data['date_only'],
-                            y=class_data['count'],
-                            mode='lines+markers',
-                            name=class_type
-                        )
+        # Gráfico de emails por fecha (roll-up del cubo de agregados, sin groupby sobre los emails)
+        cube, _ = self.get_cube(state)
+        date_counts = [row for row in cube.query(['day', 'classification']) if row['day'] != NO_DATE]
+        if date_counts:
+            charts['timeline'] = {
+                'data': [],
+                'layout': go.Layout(
+                    title='Emails por Fecha y Clasificación',
+                    height=400,
+                    xaxis={'title': 'Fecha'},
+                    yaxis={'title': 'Cantidad de Emails'}
+                )
+            }
+
+            for class_type in dict.fromkeys(row['classification'] for row in date_counts):
+                class_data = [row for row in date_counts if row['classification'] == class_type]
+                charts['timeline']['data'].append(
+                    go.Scatter(
+                        x=[row['day'] for row in class_data],
+                        y=[row['emails'] for row in class_data],
+                        mode='lines+markers',
+                        name=class_type
                     )
+                )
 
         # Gráfico de confianza por clasificación
         conf_data = []
         for class_type in ['cotizacion', 'renovacion', 'endoso']:
-            class_df = self.df[self.df['classification_type'] == class_type]
+            class_df = df[df['classification_type'] == class_type]
             if len(class_df) > 0:
                 conf_data.append(go.Box(
                     y=class_df['confidence'],
@@ -179,71 +803,6 @@ class EmailDashboard:
 
         return charts
 
-    def search_emails(self, query="", classification="", folder="", has_attachments=None, date_from="", date_to="", page=1, per_page=50):
-        """Buscar emails con filtros y paginación"""
-        df_filtered = self.df.copy()
-
-        # Filtrar por query en asunto
-        if query:
-            df_filtered = df_filtered[
-                df_filtered['subject'].str.contains(query, case=False, na=False) |
-                df_filtered['sender_name'].str.contains(query, case=False, na=False)
-            ]
-
-        # Filtrar por clasificación
-        if classification and classification != 'all':
-            df_filtered = df_filtered[df_filtered['classification_type'] == classification]
-
-        # Filtrar por carpeta
-        if folder and folder != 'all':
-            df_filtered = df_filtered[df_filtered['folder'] == folder]
-
-        # Filtrar por adjuntos
-        if has_attachments is not None:
-            if has_attachments:
-                df_filtered = df_filtered[df_filtered['total_attachments'] > 0]
-            else:
-                df_filtered = df_filtered[df_filtered['total_attachments'] == 0]
-
-        # Filtrar por fechas
-        if date_from:
-            df_filtered = df_filtered[df_filtered['delivery_date'] >= date_from]
-        if date_to:
-            df_filtered = df_filtered[df_filtered['delivery_date'] <= date_to]
-
-        # Calcular paginación
-        total_results = len(df_filtered)
-        total_pages = (total_results + per_page - 1) // per_page
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-
-        # Aplicar paginación
-        df_paginated = df_filtered.iloc[start_idx:end_idx]
-
-        # Convertir a diccionario y limpiar valores problemáticos
-        results = df_paginated.to_dict('records')
-
-        # Limpiar fechas NaT en los resultados
-        for result in results:
-            if pd.isna(result.get('delivery_time')):
-                result['delivery_time'] = None
-            if pd.isna(result.get('delivery_date')):
-                result['delivery_date'] = None
-
-        return {
-            'results': results,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total_results,
-                'pages': total_pages,
-                'has_prev': page > 1,
-                'has_next': page < total_pages,
-                'prev_page': page - 1 if page > 1 else None,
-                'next_page': page + 1 if page < total_pages else None
-            }
-        }
-
     def get_file_type_info(self, filename):
         """Obtener información del tipo de archivo"""
         # Detectar tipo MIME
@@ -332,70 +891,198 @@ class EmailDashboard:
 
         return file_info
 
-    def get_email_content(self, email_id):
+    def get_email_content(self, email_id, state):
         """Obtener contenido completo del email"""
         try:
-            # Cargar metadatos
-            metadata_file = self.metadata_dir / f"{email_id}.json"
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-
-            # Cargar contenido del .eml
-            eml_file = self.emails_dir / f"{email_id}.eml"
-            content = {"plain_text": "", "html_content": ""}
-
-            if eml_file.exists():
-                with open(eml_file, 'r', encoding='utf-8') as f:
-                    msg = email.message_from_file(f)
-
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain":
-                            content["plain_text"] = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        elif part.get_content_type() == "text/html":
-                            content["html_content"] = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-
-            # Listar adjuntos
-            attachments = []
-            attachment_dir = self.attachments_dir / email_id
-            if attachment_dir.exists():
-                for file_path in attachment_dir.iterdir():
-                    if file_path.is_file():
-                        file_type_info = self.get_file_type_info(file_path.name)
+            with metrics.stage('file_io'):
+                # Cargar metadatos (catálogo SQLite; el JSON solo si el email no está catalogado)
+                catalog = self.catalog
+                metadata = catalog.get_metadata(email_id) if catalog else None
+                if metadata is None:
+                    metadata_file = self.metadata_dir / f"{email_id}.json"
+                    with open(metadata_file, 'r', encoding='utf-8') as f:
+                        metadata = json.load(f)
+                    catalog = None
+
+                # Cargar contenido del .eml
+                eml_file = self.emails_dir / f"{email_id}.eml"
+                content = {"plain_text": "", "html_content": ""}
+
+                if eml_file.exists():
+                    # Solo se decodifican las partes text/plain y text/html (sin adjuntos)
+                    content.update(read_text_parts(eml_file))
+
+                # Listar adjuntos (tamaños del catálogo, sin recorrer el directorio)
+                attachments = []
+                attachment_dir = self.attachments_dir / email_id
+                if catalog:
+                    for attachment in catalog.get_attachments(email_id):
+                        file_type_info = self.get_file_type_info(attachment['filename'])
                         attachments.append({
-                            'name': file_path.name,
-                            'size': file_path.stat().st_size,
-                            'path': str(file_path),
+                            'name': attachment['filename'],
+                            'size': attachment['size'],
+                            'path': str(attachment_dir / attachment['filename']),
                             'type': file_type_info['category'],
                             'extension': file_type_info['extension'],
                             'color_class': file_type_info['color_class'],
                             'mime_type': file_type_info['mime_type']
                         })
-
-            # Obtener clasificación específica
-            classification_info = None
-            for email_info in self.data.get('emails', []):
-                if email_info['email_id'] == email_id:
-                    classification_info = email_info
-                    break
+                elif attachment_dir.exists():
+                    for file_path in attachment_dir.iterdir():
+                        if file_path.is_file():
+                            file_type_info = self.get_file_type_info(file_path.name)
+                            attachments.append({
+                                'name': file_path.name,
+                                'size': file_path.stat().st_size,
+                                'path': str(file_path),
+                                'type': file_type_info['category'],
+                                'extension': file_type_info['extension'],
+                                'color_class': file_type_info['color_class'],
+                                'mime_type': file_type_info['mime_type']
+                            })
 
             return {
                 'metadata': metadata,
                 'content': content,
                 'attachments': attachments,
-                'classification': classification_info
+                'classification': state.get_classification(email_id)
             }
 
         except Exception as e:
             return {'error': str(e)}
 
 # Instancia global del dashboard
-dashboard = EmailDashboard()
+dashboard = EmailDashboard(DASHBOARD_OUTPUT_DIR, use_snapshot=DASHBOARD_USE_SNAPSHOT)
+
+@app.before_request
+def refresh_dashboard():
+    # Cambiar al snapshot nuevo si el clasificador regeneró los resultados; la petición
+    # usa de principio a fin el estado vigente al comenzar (g.state)
+    dashboard.refresh()
+    g.state = dashboard.state
+
+# Re-clasificación, reportes y exportaciones masivas en procesos aparte (background_jobs.py)
+jobs = JobManager(DASHBOARD_OUTPUT_DIR)
+
+# Al arrancar el servidor: reencolar lo que un reinicio dejó a medias
+jobs.resume()
+
+
+def public_job(job):
+    """Trabajo para la API: sin rutas del servidor, con la URL de descarga si dejó un archivo"""
+    job = dict(job)
+    result = dict(job['result'] or {})
+    if result.pop('file', None):
+        job['download_url'] = f"/download/jobs/{job['job_id']}"
+    job['result'] = result or None
+    job['params'] = {key: value for key, value in job['params'].items() if key != 'output_dir'}
+
+    # Compatibilidad con /api/export/<job_id>: formato y tamaño en el primer nivel
+    if job['kind'] == 'export':
+        job['format'] = job['params'].get('format')
+        job['size'] = result.get('size')
+    return job
+
+
+def create_export_job(params):
+    """Encolar una exportación masiva con los mismos filtros que /api/search"""
+    export_format = params.get('format', 'zip')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato no soportado: {export_format}'}), 400
+
+    filters = parse_search_filters(params)
+    sort = params.get('sort', 'date')
+    if sort not in SORT_FIELDS:
+        sort = 'date'
+    order = params.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        order = 'desc'
+    collapse_threads = params.get('collapse_threads') == 'true'
+    rows = g.state.get_export_rows(filters, sort, order, collapse_threads)
+
+    # Las filas viajan al proceso del pool por la tabla de trabajos: sobreviven a un reinicio
+    manifest = rows.rename(columns=EXPORT_COLUMNS)
+    job = jobs.submit(
+        'export',
+        {'format': export_format, 'id_column': EXPORT_COLUMNS['email_id'],
+         'filters': dict(zip(SEARCH_FILTER_NAMES, filters)),
+         'sort': sort, 'order': order, 'collapse_threads': collapse_threads},
+        payload=manifest.to_json(orient='split', index=False, force_ascii=False),
+        total=len(rows)
+    )
+    return jsonify(public_job(job)), 202
+
+
+def job_events(job_id):
+    """Eventos SSE con el progreso de un trabajo hasta que termina (o hasta JOB_EVENTS_TIMEOUT)"""
+    deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+    last_state = None
+    yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+
+    while True:
+        job = jobs.get(job_id)
+        if job is None:
+            yield "event: gone\ndata: {}\n\n"
+            return
+
+        state = (job['status'], job['processed'], job['total'], job['message'])
+        if state != last_state:
+            last_state = state
+            event = 'done' if job['status'] in FINISHED_STATUSES else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(public_job(job), ensure_ascii=False)}\n\n"
+            if event == 'done':
+                return
+
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(JOB_EVENTS_INTERVAL)
+
+
+def job_params(params):
+    """Parámetros de POST /api/jobs como en la query string de /api/search
+
+    Los filtros pueden venir anidados en 'filters' (JSON) y los booleanos JSON
+    se convierten a 'true'/'false'. ValueError si 'filters' no es un objeto.
+    """
+    flat = dict(params)
+    filters = flat.pop('filters', None)
+    if filters is not None:
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' debe ser un objeto JSON")
+        flat.update(filters)
+    return {key: str(value).lower() if isinstance(value, bool) else value for key, value in flat.items()}
+
+
+def parse_search_filters(args):
+    """Leer los filtros de búsqueda comunes a /api/search y /api/export"""
+    has_attachments = args.get('has_attachments')
+
+    # Convertir has_attachments a boolean
+    if has_attachments == 'true':
+        has_attachments = True
+    elif has_attachments == 'false':
+        has_attachments = False
+    else:
+        has_attachments = None
+
+    return (
+        args.get('query', ''),
+        args.get('classification', ''),
+        args.get('folder', ''),
+        has_attachments,
+        args.get('date_from', ''),
+        args.get('date_to', ''),
+        args.get('hide_duplicates') == 'true'
+    )
 
 @app.route('/')
 def index():
     """Página principal del dashboard"""
-    stats = dashboard.get_summary_stats()
-    charts = dashboard.create_charts()
+    import plotly.utils
+
+    stats = g.state.get_summary_stats()
+    with metrics.stage('charts'):
+        charts = dashboard.create_charts(g.state)
 
     # Convertir gráficos a JSON para enviar al frontend
     charts_json = {}
@@ -411,7 +1098,7 @@ def index():
 def search():
     """Página de búsqueda avanzada"""
     # Obtener opciones para filtros
-    folders = dashboard.df['folder'].unique().tolist() if len(dashboard.df) > 0 else []
+    folders = g.state.get_folders()
     classifications = ['cotizacion', 'renovacion', 'endoso', 'sin_clasificar']
 
     return render_template('search.html', folders=folders, classifications=classifications)
@@ -419,31 +1106,151 @@ def search():
 @app.route('/api/search')
 def api_search():
     """API de búsqueda con paginación"""
-    query = request.args.get('query', '')
-    classification = request.args.get('classification', '')
-    folder = request.args.get('folder', '')
-    has_attachments = request.args.get('has_attachments')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
+    filters = parse_search_filters(request.args)
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', DEFAULT_PER_PAGE)), 1), MAX_PER_PAGE)
+    except ValueError:
+        return jsonify({'error': 'page y per_page deben ser enteros'}), 400
+    sort = request.args.get('sort', 'date')
+    order = request.args.get('order', 'desc')
+    cursor = request.args.get('cursor') or None
+    collapse_threads = request.args.get('collapse_threads') == 'true'
+    facets = request.args.get('facets') == 'true'
+
+    # ETag: versión de resultados + parámetros de la consulta
+    query_key = json.dumps(sorted(request.args.items(multi=True)), ensure_ascii=False)
+    state = g.state
+    etag = f"search-{state.results_version}-{hashlib.sha1(query_key.encode('utf-8')).hexdigest()}"
+
+    return cached_json_response(
+        etag,
+        lambda: state.search_emails(*filters, page, per_page, sort, order, cursor, collapse_threads, facets)
+    )
+
+@app.route('/api/export', methods=['POST'])
+def api_export():
+    """Iniciar exportación masiva con los mismos filtros que /api/search"""
+    return create_export_job(request.values)
+
+@app.route('/api/export/<job_id>')
+def api_export_status(job_id):
+    """Consultar progreso de una exportación masiva"""
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'export':
+        abort(404)
+    return jsonify(public_job(job))
+
+@app.route('/jobs')
+def jobs_page():
+    """Página de trabajos en segundo plano (re-clasificación, reportes, exportaciones)"""
+    return render_template('jobs.html', jobs=[public_job(job) for job in jobs.list()])
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    """Listar trabajos (GET) o iniciar uno (POST kind=reclassify|report|export)
+
+    report acepta scan_quoted y dedup (como --no-quoted y --no-dedup);
+    export acepta los filtros de /api/search y format.
+    """
+    if request.method == 'GET':
+        kind = request.args.get('kind') or None
+        try:
+            limit = min(int(request.args.get('limit', 50)), 500)
+        except ValueError:
+            return jsonify({'error': 'limit debe ser un entero'}), 400
+        return jsonify({'jobs': [public_job(job) for job in jobs.list(kind, limit)]})
+
+    params = request.get_json(silent=True)
+    if params is None:
+        params = request.values.to_dict()
+    if not isinstance(params, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+    try:
+        params = job_params(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    kind = params.get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Tipo de trabajo desconocido: {kind}', 'kinds': list(JOB_KINDS)}), 400
+
+    if kind == 'export':
+        return create_export_job(params)
+
+    options = {}
+    if kind == 'report':
+        options = {
+            'scan_quoted': str(params.get('scan_quoted', 'true')).lower() != 'false',
+            'dedup': str(params.get('dedup', 'true')).lower() != 'false'
+        }
 
-    # Convertir has_attachments a boolean
-    if has_attachments == 'true':
-        has_attachments = True
-    elif has_attachments == 'false':
-        has_attachments = False
-    else:
-        has_attachments = None
+    try:
+        job = jobs.submit(kind, options)
+    except JobConflict as e:
+        return jsonify({'error': str(e), 'job': public_job(e.job)}), 409
+    return jsonify(public_job(job)), 202
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Estado y progreso de un trabajo"""
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(public_job(job))
 
-    results = dashboard.search_emails(query, classification, folder, has_attachments, date_from, date_to, page, per_page)
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_job_cancel(job_id):
+    """Cancelar un trabajo pendiente o en curso"""
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    if job['status'] in FINISHED_STATUSES:
+        return jsonify({'error': f"El trabajo ya terminó ({job['status']})", 'job': public_job(job)}), 409
+    return jsonify(public_job(jobs.cancel(job_id))), 202
+
+@app.route('/api/jobs/<job_id>/events')
+def api_job_events(job_id):
+    """Progreso de un trabajo por Server-Sent Events (eventos progress y done)"""
+    if jobs.get(job_id) is None:
+        abort(404)
+    response = Response(stream_with_context(job_events(job_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/jobs/<job_id>/log')
+def api_job_log(job_id):
+    """Salida de la re-clasificación o del reporte (lo que los scripts imprimen por consola)"""
+    log_path = jobs.log_path(job_id)
+    if jobs.get(job_id) is None or not log_path.exists():
+        abort(404)
+    return send_file(log_path, mimetype='text/plain; charset=utf-8')
+
+@app.route('/download/jobs/<job_id>')
+@app.route('/download/export/<job_id>')
+def download_job_file(job_id):
+    """Descargar el archivo de una exportación masiva o de un reporte"""
+    job = jobs.get(job_id)
+    result = (job or {}).get('result') or {}
+    if not job or job['status'] != 'completed' or not result.get('file') or not Path(result['file']).exists():
+        abort(404)
+
+    file_format = result.get('format')
+    prefix = 'emails_export' if job['kind'] == 'export' else 'classification_report'
 
-    return jsonify(results)
+    # send_file entrega el archivo desde disco por bloques
+    return send_file(
+        result['file'],
+        mimetype=JOB_FILE_MIMETYPES.get(file_format, 'application/octet-stream'),
+        as_attachment=True,
+        download_name=f"{prefix}_{job_id[:8]}.{file_format}"
+    )
 
 @app.route('/email/<email_id>')
 def view_email(email_id):
     """Ver email individual"""
-    email_data = dashboard.get_email_content(email_id)
+    email_data = dashboard.get_email_content(email_id, g.state)
 
     if 'error' in email_data:
         abort(404)
@@ -455,44 +1262,51 @@ def view_email(email_id):
 
 @app.route('/download/<email_id>')
 def download_email_files(email_id):
-    """Descargar todos los archivos de un email como ZIP"""
-    try:
-        # Crear ZIP en memoria
-        memory_file = io.BytesIO()
-
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # Añadir archivo .eml
-            eml_file = dashboard.emails_dir / f"{email_id}.eml"
-            if eml_file.exists():
-                zf.write(eml_file, f"{email_id}.eml")
-
-            # Añadir metadatos
-            metadata_file = dashboard.metadata_dir / f"{email_id}.json"
-            if metadata_file.exists():
-                zf.write(metadata_file, f"{email_id}_metadata.json")
-
-            # Añadir adjuntos
-            attachment_dir = dashboard.attachments_dir / email_id
-            if attachment_dir.exists():
-                for file_path in attachment_dir.iterdir():
-                    if file_path.is_file():
-                        zf.write(file_path, f"attachments/{file_path.name}")
-
-        memory_file.seek(0)
-
-        return send_file(
-            io.BytesIO(memory_file.read()),
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f"{email_id}_complete.zip"
-        )
+    """Descargar todos los archivos de un email como ZIP (generado en streaming)"""
+    def email_entries():
+        # Añadir archivo .eml
+        yield dashboard.emails_dir / f"{email_id}.eml", f"{email_id}.eml"
+
+        # Añadir metadatos
+        yield dashboard.metadata_dir / f"{email_id}.json", f"{email_id}_metadata.json"
+
+        # Añadir adjuntos
+        attachment_dir = dashboard.attachments_dir / email_id
+        if attachment_dir.exists():
+            for file_path in attachment_dir.iterdir():
+                if file_path.is_file():
+                    yield file_path, f"attachments/{file_path.name}"
+
+    return Response(
+        stream_with_context(stream_zip(email_entries())),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{email_id}_complete.zip"'}
+    )
+
+def file_etag(file_path):
+    """ETag de un archivo a partir de su huella (ruta, tamaño y fecha de modificación)"""
+    stat = file_path.stat()
+    fingerprint = f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+def cached_json_response(etag, build_payload):
+    """Responder JSON con ETag, devolviendo 304 sin recalcular si el cliente ya lo tiene"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        payload = build_payload()
+        with metrics.stage('serialize'):
+            response = jsonify(payload)
 
-    except Exception as e:
-        abort(500)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = API_CACHE_MAX_AGE
+    return response
 
 @app.route('/download/attachment/<email_id>/<filename>')
 def download_attachment(email_id, filename):
-    """Descargar adjunto específico"""
+    """Descargar adjunto específico (soporta If-None-Match y peticiones Range)"""
     try:
         attachment_path = dashboard.attachments_dir / email_id / filename
 
@@ -502,13 +1316,22 @@ def download_attachment(email_id, filename):
         # Obtener información del tipo de archivo para envío correcto
         file_type_info = dashboard.get_file_type_info(filename)
 
-        return send_file(
+        # conditional=True habilita respuestas 304 y 206 (descargas reanudables)
+        response = send_file(
             attachment_path,
             as_attachment=True,
             download_name=filename,
-            mimetype=file_type_info['mime_type']
+            mimetype=file_type_info['mime_type'],
+            conditional=True,
+            etag=file_etag(attachment_path),
+            max_age=ATTACHMENT_CACHE_MAX_AGE
         )
 
+        # Correo corporativo: solo el navegador del usuario puede guardar copia
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
     except Exception as e:
         print(f"Error descargando adjunto {filename} del email {email_id}: {e}")
         abort(500)
@@ -516,8 +1339,116 @@ def download_attachment(email_id, filename):
 @app.route('/api/stats')
 def api_stats():
     """API para estadísticas en tiempo real"""
-    stats = dashboard.get_summary_stats()
-    return jsonify(stats)
+    state = g.state
+    etag = f"stats-{state.results_version}"
+    return cached_json_response(etag, state.get_summary_stats)
+
+@app.route('/api/what-if', methods=['POST'])
+def api_what_if():
+    """Recalcular conteos con pesos/umbrales alternativos sin reparsear emails"""
+    from what_if_scoring import load_feature_matrix, what_if
+
+    params = request.get_json(silent=True)
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+
+    weights = params.get('weights') or {}
+    thresholds = params.get('thresholds') or {}
+    if not isinstance(weights, dict) or not isinstance(thresholds, dict):
+        return jsonify({'error': "'weights' y 'thresholds' deben ser objetos JSON"}), 400
+    try:
+        weights = {key: int(value) for key, value in weights.items()}
+        thresholds = {key: int(value) for key, value in thresholds.items()}
+        max_changed = int(params.get('limit', 100))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Pesos, umbrales y limit deben ser enteros'}), 400
+    if max_changed < 0:
+        return jsonify({'error': 'limit no puede ser negativo'}), 400
+
+    try:
+        matrix = load_feature_matrix(dashboard.output_dir)
+        result = what_if(matrix, weights=weights, thresholds=thresholds, max_changed=max_changed)
+    except FileNotFoundError:
+        return jsonify({'error': 'Matriz de reglas no encontrada; ejecute el clasificador'}), 404
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result)
+
+@app.route('/api/aggregate')
+def api_aggregate():
+    """Agregaciones del cubo: ?group_by=week,folder&classification=renovacion&since=2025-08-01
+
+    group_by: day, week, month, year, classification, folder, agent, slip_status.
+    Filtros repetibles: classification, folder, agent, slip_status; since/until inclusivos.
+    """
+    group_by = [dimension.strip() for dimension in request.args.get('group_by', '').split(',') if dimension.strip()]
+    unknown = [dimension for dimension in group_by if dimension not in GROUP_DIMENSIONS]
+    if unknown:
+        return jsonify({'error': f"Dimensiones desconocidas: {', '.join(unknown)}",
+                        'dimensions': list(GROUP_DIMENSIONS)}), 400
+
+    filters = {dimension: request.args.getlist(dimension) for dimension in CUBE_DIMENSIONS[1:]
+               if request.args.getlist(dimension)}
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    order = 'emails' if request.args.get('order') == 'emails' else 'key'
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un entero'}), 400
+
+    cube, stamp = dashboard.get_cube(g.state)
+    query_key = json.dumps(sorted(request.args.items(multi=True)), ensure_ascii=False)
+    etag = (f"aggregate-{stamp[1]}-"
+            f"{hashlib.sha1(query_key.encode('utf-8')).hexdigest()}")
+
+    def build_payload():
+        with metrics.stage('aggregate'):
+            rows = cube.query(group_by, filters, since, until, order, limit)
+        return {'group_by': group_by, 'filters': filters, 'since': since, 'until': until,
+                'cells': len(cube.cells), 'rows': rows}
+
+    return cached_json_response(etag, build_payload)
+
+@app.route('/api/entities/<kind>/<value>')
+def api_entities(kind, value):
+    """Emails que mencionan una póliza o un código de agente: /api/entities/poliza/12345
+
+    Parámetros opcionales: sort y order (como /api/search) y limit.
+    """
+    if kind not in ENTITY_KINDS:
+        return jsonify({'error': f"Tipo de entidad desconocido: {kind}", 'kinds': list(ENTITY_KINDS)}), 404
+
+    sort = request.args.get('sort', 'date')
+    order = request.args.get('order', 'desc')
+    if sort not in SORT_FIELDS:
+        sort = 'date'
+    if order not in ('asc', 'desc'):
+        order = 'desc'
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un entero'}), 400
+
+    state = g.state
+    index, stamp = dashboard.get_entity_index(state)
+    etag = (f"entities-{state.results_version}-{stamp[1]}-"
+            f"{kind}-{normalize_entity(value)}-{sort}-{order}-{limit}")
+
+    def build_payload():
+        with metrics.stage('entity_lookup'):
+            total, emails = state.get_entity_emails(index, kind, value, sort, order, limit)
+        return {'kind': kind, 'value': normalize_entity(value), 'total': total, 'emails': emails}
+
+    return cached_json_response(etag, build_payload)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Métricas del dashboard en formato de texto de Prometheus"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     print("🌐 Iniciando Dashboard de Clasificación de Emails")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Análisis What-If de Pesos y Umbrales
+Puntúa todo el corpus de forma vectorizada a partir de la matriz de reglas
+cumplidas que guarda el clasificador, sin volver a parsear ningún email
+Uso: python what_if_scoring.py --weight cotizacion.cot_subject=40 --threshold primary=35
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from email_classifier import CATEGORIES, CLASSIFICATION_THRESHOLDS, FEATURE_MATRIX_FILENAME, SCORING_RULES
+
+# Tipos de la clasificación principal (índice 3 = sin clasificar)
+PRIMARY_TYPES = CATEGORIES + ['sin_clasificar']
+
+
+def load_feature_matrix(output_dir="output"):
+    """Cargar la matriz de reglas cumplidas generada por el clasificador"""
+    matrix_file = Path(output_dir) / "classification" / FEATURE_MATRIX_FILENAME
+    with np.load(matrix_file) as data:
+        matrix = {key: data[key] for key in data.files}
+
+    expected_rules = [f"{category}.{signal}" for category, signal, _, _ in SCORING_RULES]
+    if matrix['rules'].tolist() != expected_rules:
+        raise ValueError("La matriz de reglas no corresponde a SCORING_RULES; vuelva a clasificar")
+
+    return matrix
+
+
+def weight_matrix(weights=None):
+    """Matriz de pesos (reglas × categorías) con los valores por defecto y los cambios indicados"""
+    weights = weights or {}
+    matrix = np.zeros((len(SCORING_RULES), len(CATEGORIES)), dtype=np.int64)
+
+    for row, (category, signal, weight, _) in enumerate(SCORING_RULES):
+        matrix[row, CATEGORIES.index(category)] = weights.get(f"{category}.{signal}", weight)
+
+    return matrix
+
+
+def score_features(features, weights=None, thresholds=None):
+    """Aplicar pesos y umbrales a todo el corpus a la vez
+
+    Devuelve el índice del tipo principal por email (ver PRIMARY_TYPES),
+    las confianzas por categoría y la detección is_* por categoría.
+    """
+    thresholds = dict(CLASSIFICATION_THRESHOLDS, **(thresholds or {}))
+
+    scores = features.astype(np.int64) @ weight_matrix(weights)
+    confidences = np.minimum(100, scores)
+
+    # argmax devuelve la primera categoría empatada, igual que el orden estable de classify_email
+    best = np.argmax(confidences, axis=1)
+    best_confidence = confidences[np.arange(len(best)), best]
+    primary = np.where(best_confidence >= thresholds['primary'], best, len(CATEGORIES))
+
+    category_thresholds = np.array([thresholds[category] for category in CATEGORIES])
+    detected = scores >= category_thresholds
+
+    return primary, confidences, detected
+
+
+def what_if(matrix, weights=None, thresholds=None, max_changed=100):
+    """Conteos por categoría y emails que cambian con pesos/umbrales alternativos"""
+    rule_keys = {f"{category}.{signal}" for category, signal, _, _ in SCORING_RULES}
+    unknown = set(weights or {}) - rule_keys | set(thresholds or {}) - set(CLASSIFICATION_THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Reglas o umbrales desconocidos: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+
+    primary, _, detected = score_features(matrix['features'], weights, thresholds)
+    new_types = np.array(PRIMARY_TYPES)[primary]
+    current_types = matrix['primary_types']
+
+    changed = np.flatnonzero(new_types != current_types)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'total_emails': int(len(primary)),
+        'counts_before': {t: int(np.count_nonzero(current_types == t)) for t in PRIMARY_TYPES},
+        'counts_after': {t: int(np.count_nonzero(new_types == t)) for t in PRIMARY_TYPES},
+        'detections_after': {category: int(detected[:, i].sum()) for i, category in enumerate(CATEGORIES)},
+        'changed_total': int(len(changed)),
+        'changed': [
+            {
+                'email_id': str(matrix['email_ids'][i]),
+                'before': str(current_types[i]),
+                'after': str(new_types[i])
+            }
+            for i in changed[:max_changed]
+        ],
+        'elapsed_ms': round(elapsed_ms, 3)
+    }
+
+
+def parse_assignments(values, valid_keys, label):
+    """Convertir ['clave=valor', ...] a diccionario validando las claves"""
+    parsed = {}
+    for value in values or []:
+        key, _, number = value.partition('=')
+        if key not in valid_keys:
+            raise SystemExit(f"{label} desconocido: {key}. Opciones: {', '.join(valid_keys)}")
+        parsed[key] = int(number)
+    return parsed
+
+
+def main():
+    rule_keys = [f"{category}.{signal}" for category, signal, _, _ in SCORING_RULES]
+
+    parser = argparse.ArgumentParser(description="Análisis what-if de pesos y umbrales de clasificación")
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--weight', action='append', help="regla=peso, p. ej. cotizacion.cot_subject=40")
+    parser.add_argument('--threshold', action='append', help="umbral=valor, p. ej. primary=35")
+    parser.add_argument('--show-changed', type=int, default=20)
+    parser.add_argument('--list-rules', action='store_true')
+    args = parser.parse_args()
+
+    if args.list_rules:
+        for key, (_, _, weight, criterion) in zip(rule_keys, SCORING_RULES):
+            print(f"{key:45s} {weight:+4d}  {criterion}")
+        for key, value in CLASSIFICATION_THRESHOLDS.items():
+            print(f"umbral {key:38s} {value:4d}")
+        return
+
+    weights = parse_assignments(args.weight, rule_keys, "Regla")
+    thresholds = parse_assignments(args.threshold, list(CLASSIFICATION_THRESHOLDS), "Umbral")
+
+    try:
+        matrix = load_feature_matrix(args.output_dir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    result = what_if(matrix, weights, thresholds, args.show_changed)
+
+    print("🔬 ANÁLISIS WHAT-IF")
+    print("=" * 60)
+    print(f"Emails: {result['total_emails']} | Tiempo: {result['elapsed_ms']:.2f} ms")
+    print(f"\n{'Categoría':18s} {'Antes':>8s} {'Después':>8s} {'Cambio':>8s}")
+    for primary_type in PRIMARY_TYPES:
+        before = result['counts_before'][primary_type]
+        after = result['counts_after'][primary_type]
+        print(f"{primary_type:18s} {before:8d} {after:8d} {after - before:+8d}")
+
+    print(f"\n🔄 Emails que cambian: {result['changed_total']}")
+    for change in result['changed']:
+        print(f"  - {change['email_id']}: {change['before']} → {change['after']}")
+    if result['changed_total'] > len(result['changed']):
+        print(f"  ... y {result['changed_total'] - len(result['changed'])} más")
+
+
+if __name__ == "__main__":
+    main()